@@ -0,0 +1,28 @@
+"""
+Admin token check for the operational endpoints that look inside the process
+
+Admin requests carry `X-Weave-Admin-Token` matching config.ADMIN_TOKEN. With
+no token configured, nothing is admin: the admin routes answer 403 and
+profiling flags on requests are ignored.
+"""
+
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+import config
+
+ADMIN_HEADER = "X-Weave-Admin-Token"
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(config.ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode())
+
+
+def require_admin(x_weave_admin_token: Optional[str] = Header(None)):
+    """Route dependency: 403 unless the request carries the admin token"""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set WEAVE_ADMIN_TOKEN to enable them")
+    if not is_admin_token(x_weave_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
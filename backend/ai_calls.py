@@ -0,0 +1,235 @@
+"""
+Cancellable upstream calls: Claude messages, Flux renders and image downloads
+
+Each call takes an optional CancelToken (see cancellation.py) and checks it as
+results arrive: between streamed Claude text chunks, between Replicate
+prediction polls and between download chunks. On cancellation the upstream
+request is closed (or the prediction cancelled) and Cancelled is raised with
+any partial text.
+
+A Deadline (see deadlines.py), when given, bounds each call the same way:
+its timeouts come from the time left, and DeadlineExceeded is raised once the
+time runs out.
+
+Every call goes through resilience.with_retries, which retries transient
+provider errors and fails fast while the provider's circuit breaker is open.
+Claude calls wait for a turn from llm_scheduler first, and report the
+rate-limit headers, token usage and 429s they see back to it.
+
+Latency, token counts and image pipeline timings go to metrics.py. Calls
+made for a campaign are also added to its usage ledger (usage_ledger.py),
+under the feature the caller names, and completed calls are added to the
+request's trace while one is being recorded (turn_traces.py).
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import config
+from cancellation import Cancelled, CancelToken
+from deadlines import Deadline, DeadlineExceeded
+from llm_scheduler import Priority, estimate_input_tokens, scheduler
+from metrics import IMAGE_SECONDS, LLM_SECONDS, LLM_TOKENS
+from resilience import ProviderUnavailable, retry_after, with_retries
+import turn_traces
+import usage_ledger
+from lazy_imports import LazyModule
+
+# Imported on first use; see lazy_imports.py
+anthropic = LazyModule("anthropic")
+httpx = LazyModule("httpx")
+replicate = LazyModule("replicate")
+
+FLUX_MODEL = "black-forest-labs/flux-schnell"
+PREDICTION_POLL_SECONDS = 0.5
+_FINISHED = ("succeeded", "failed", "canceled")
+
+
+@contextmanager
+def _observed(histogram, **labels):
+    """Time the block into histogram, labelled with how it ended"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except Cancelled:
+        outcome = "cancelled"
+        raise
+    except DeadlineExceeded:
+        outcome = "timeout"
+        raise
+    except ProviderUnavailable:
+        outcome = "unavailable"
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started, outcome=outcome, **labels)
+
+
+def _record_usage(model: str, usage):
+    for kind, field in (
+        ("input", "input_tokens"),
+        ("output", "output_tokens"),
+        ("cache_read", "cache_read_input_tokens"),
+        ("cache_write", "cache_creation_input_tokens"),
+    ):
+        count = getattr(usage, field, None)
+        if count:
+            LLM_TOKENS.inc(count, model=model, kind=kind)
+
+
+def claude_message(
+    token: Optional[CancelToken] = None,
+    priority: Priority = Priority.INTERACTIVE,
+    deadline: Optional[Deadline] = None,
+    campaign_id: Optional[str] = None,
+    feature: str = "",
+    **kwargs,
+) -> str:
+    """
+    Text of a Claude reply to messages.create(**kwargs), streamed so it can stop early.
+
+    With a campaign_id, the call's token usage is added to that campaign's
+    ledger under feature.
+    """
+    token = token or CancelToken()
+    token.raise_if_cancelled()
+    estimate = estimate_input_tokens(kwargs.get("system"), kwargs.get("messages", []))
+    model = kwargs.get("model", "")
+    chunks = []
+
+    def attempt() -> str:
+        chunks.clear()
+        started = time.perf_counter()
+        with scheduler.slot(priority, estimate, kwargs.get("max_tokens", 0), token, deadline) as slot:
+            # Retries are ours (resilience.with_retries), so they respect the deadline and breaker
+            client = anthropic.Anthropic(max_retries=0, base_url=config.ANTHROPIC_BASE_URL or None)
+            if deadline is not None:
+                kwargs["timeout"] = deadline.timeout()
+            try:
+                # Leaving the block early closes the HTTP response, which ends generation upstream
+                with _observed(LLM_SECONDS, model=model), client.messages.stream(**kwargs) as stream:
+                    slot.observe(headers=stream.response.headers)
+                    for chunk in stream.text_stream:
+                        chunks.append(chunk)
+                        token.raise_if_cancelled("".join(chunks))
+                        if deadline is not None:
+                            deadline.check("claude", "".join(chunks))
+                    usage = stream.get_final_message().usage
+                    slot.observe(usage=usage)
+                    _record_usage(model, usage)
+                    elapsed = time.perf_counter() - started
+            except anthropic.RateLimitError as e:
+                slot.rate_limited(retry_after(e))
+                raise
+            except anthropic.APITimeoutError:
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded("claude", "".join(chunks)) from None
+                raise
+        # Outside the slot, so the next queued call is not held up by the write
+        usage_ledger.record_claude(campaign_id, feature, model, usage, elapsed)
+        turn_traces.capture(
+            "anthropic", elapsed,
+            feature=feature,
+            request={name: kwargs.get(name) for name in ("model", "max_tokens", "system", "messages")},
+            response="".join(chunks),
+            usage={field: getattr(usage, field, 0) or 0 for field in turn_traces.USAGE_FIELDS},
+        )
+        return "".join(chunks)
+
+    # Once text has streamed, a retry would repeat it: only errors before the first chunk are retried
+    return with_retries("anthropic", attempt, token, deadline, can_retry=lambda: not chunks)
+
+
+def _replicate():
+    """The Replicate client: the SDK's default one, or one for WEAVE_REPLICATE_BASE_URL"""
+    if config.REPLICATE_BASE_URL:
+        return replicate.Client(base_url=config.REPLICATE_BASE_URL)
+    return replicate
+
+
+def render_image(
+    input: dict,
+    token: Optional[CancelToken] = None,
+    deadline: Optional[Deadline] = None,
+    campaign_id: Optional[str] = None,
+    feature: str = "image",
+) -> Optional[str]:
+    """
+    Run a Flux prediction and return the first output URL, cancelling it upstream if asked.
+
+    A finished render is added to campaign_id's usage ledger under feature.
+    """
+    started = time.perf_counter()
+    with _observed(IMAGE_SECONDS, step="render"):
+        url = _render_image(input, token or CancelToken(), deadline)
+    elapsed = time.perf_counter() - started
+    usage_ledger.record_render(campaign_id, feature, FLUX_MODEL, elapsed)
+    turn_traces.capture("replicate", elapsed, feature=feature, input=input, output=url)
+    return url
+
+
+def _render_image(input: dict, token: CancelToken, deadline: Optional[Deadline]) -> Optional[str]:
+    token.raise_if_cancelled()
+    if deadline is not None:
+        deadline.check("render")
+    prediction = with_retries(
+        "replicate",
+        lambda: _replicate().models.predictions.create(model=FLUX_MODEL, input=input),
+        token,
+        deadline,
+    )
+    while prediction.status not in _FINISHED:
+        if token.cancelled:
+            prediction.cancel()
+            raise Cancelled()
+        if deadline is not None and deadline.expired:
+            prediction.cancel()
+            raise DeadlineExceeded("render")
+        time.sleep(deadline.timeout(PREDICTION_POLL_SECONDS) if deadline is not None else PREDICTION_POLL_SECONDS)
+        with_retries("replicate", prediction.reload, token, deadline)
+    if prediction.status != "succeeded":
+        raise RuntimeError(prediction.error or f"Prediction {prediction.status}")
+    output = prediction.output
+    return str(output[0]) if output else None
+
+
+def fetch_bytes(
+    url: str,
+    token: Optional[CancelToken] = None,
+    timeout: float = 30.0,
+    deadline: Optional[Deadline] = None,
+) -> bytes:
+    """
+    GET url in chunks, stopping if the token is cancelled or the deadline passes.
+
+    Only used for Replicate outputs, so it shares Replicate's breaker.
+    """
+    token = token or CancelToken()
+
+    def attempt() -> bytes:
+        chunks = []
+        request_timeout = timeout
+        if deadline is not None:
+            deadline.check("download")
+            request_timeout = deadline.timeout(timeout)
+        try:
+            with httpx.stream("GET", url, timeout=request_timeout) as response:
+                response.raise_for_status()
+                for chunk in response.iter_bytes():
+                    chunks.append(chunk)
+                    token.raise_if_cancelled()
+                    if deadline is not None:
+                        deadline.check("download")
+        except httpx.TimeoutException:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded("download") from None
+            raise
+        return b"".join(chunks)
+
+    started = time.perf_counter()
+    with _observed(IMAGE_SECONDS, step="download"):
+        content = with_retries("replicate", attempt, token, deadline)
+    turn_traces.capture("download", time.perf_counter() - started, url=url, bytes=len(content))
+    return content
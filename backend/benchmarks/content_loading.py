@@ -0,0 +1,57 @@
+"""
+Benchmark for loading campaign.json
+
+Compares a cold load_campaign_content (read, parse, validate) with a load
+served from the validated-content cache while the file is unchanged. Run from
+backend/:
+
+    python -m benchmarks.content_loading [--iterations 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import config
+import helpers
+import campaign_logic
+from campaign_schema import EXAMPLE_CAMPAIGN
+from schema_migrations import stamp_document
+
+
+def _time(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        config.DATA_DIR = helpers.DATA_DIR = data_dir
+        campaign_dir = os.path.join(data_dir, "campaigns", "bench")
+        os.makedirs(campaign_dir)
+        with open(os.path.join(campaign_dir, "campaign.json"), "w") as f:
+            json.dump(stamp_document("campaign", EXAMPLE_CAMPAIGN), f, indent=2)
+
+        def cold():
+            campaign_logic._content_cache.clear()
+            campaign_logic.load_campaign_content("bench")
+
+        cold_us = _time(cold, args.iterations)
+        campaign_logic.load_campaign_content("bench")
+        cached_us = _time(lambda: campaign_logic.load_campaign_content("bench"), args.iterations)
+
+    print(f"load_campaign_content: cold {cold_us:.1f}us, cached {cached_us:.1f}us ({cold_us / cached_us:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
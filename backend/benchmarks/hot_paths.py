@@ -0,0 +1,215 @@
+"""
+Micro-benchmarks for the pure-Python hot paths, with scaling curves
+
+Times get_available_beats, build_dm_context, build_dm_system_injection,
+build_rules_reference, format_author_notes_for_dm, build_prep_coach_context
+and validate_campaign_content at a range of input sizes. Size n means n NPCs,
+locations and beats, 4n known facts, n/2 beats hit and locations visited,
+4n author notes and n species; content past the schema's limit of 10 is
+built with model_construct, since the point is to see how the code scales.
+validate_campaign_content stops at the limit (larger content fails it).
+
+For each function the growth exponent k (time ~ n^k) is fitted over its three
+largest sizes. The run fails if any k is over --max-exponent, which catches
+quadratic work such as list membership scans inside loops whatever machine
+it runs on. A baseline (benchmarks/hot_paths_baseline.json unless
+--baseline) of per-size timings is compared against when present: the run
+also fails if a timing is more than --threshold slower. --save-baseline
+replaces it with this run. Run from backend/:
+
+    python -m benchmarks.hot_paths [--sizes 5,10,20,40,80,160] [--save-baseline] [--json curves.json]
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import sys
+import time
+
+from campaign_logic import build_dm_context, get_available_beats
+from campaign_schema import (
+    BLOOMBURROW_SYSTEM,
+    Beat,
+    CampaignContent,
+    CampaignState,
+    CharacterArc,
+    Location,
+    NPC,
+    Threat,
+    validate_campaign_content,
+)
+from dm_context_builder import build_dm_system_injection, build_rules_reference, format_author_notes_for_dm
+from loadtest.synthetic import MAX_CONTENT_ITEMS, synthetic_content, synthetic_prep, synthetic_roster, synthetic_session, synthetic_state
+from prep_coach_builder import build_prep_coach_context
+
+DEFAULT_SIZES = (5, 10, 20, 40, 80, 160)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hot_paths_baseline.json")
+# Linear work fits around 1.0; fixed overheads pull small sizes below it
+MAX_EXPONENT = 1.5
+
+
+def _content_model(data: dict) -> CampaignContent:
+    """CampaignContent without the list length limits, so sizes can go past them"""
+    return CampaignContent.model_construct(
+        name=data["name"],
+        premise=data["premise"],
+        tone=data["tone"],
+        threat=Threat(**data["threat"]),
+        npcs=[NPC(**npc) for npc in data["npcs"]],
+        locations=[Location(**location) for location in data["locations"]],
+        beats=[Beat(**beat) for beat in data["beats"]],
+        character_arcs=[CharacterArc(**arc) for arc in data["character_arcs"]],
+    )
+
+
+def _system(n: int) -> dict:
+    species = BLOOMBURROW_SYSTEM["species"]
+    return {
+        **BLOOMBURROW_SYSTEM,
+        "species": [{**species[i % len(species)], "name": f"{species[i % len(species)]['name']} {i}"} for i in range(n)],
+    }
+
+
+def _inputs(n: int) -> dict:
+    data = synthetic_content(npcs=n, locations=n, beats=n, seed=n)
+    content = _content_model(data)
+    state_data = synthetic_state(data, beats_hit=n // 2, facts=4 * n, seed=n)
+    state_data["locations_visited"] = [location["name"] for location in data["locations"][: n // 2]]
+    state = CampaignState(**state_data)
+    dm_context = build_dm_context(content, state, {"description": "The party follows the river", "hints": ["mist"]})
+    roster = synthetic_roster(4, seed=n)
+    prep = synthetic_prep(notes=4 * n, seed=n)
+    return {
+        "data": data,
+        "content": content,
+        "state": state,
+        "state_data": state_data,
+        "dm_context": dm_context,
+        "party_status": synthetic_session(roster, log_entries=0, seed=n),
+        "prep": prep,
+        "notes": prep["author_notes"],
+        "system": _system(n),
+    }
+
+
+# name -> (function of the inputs for one size, largest size it supports)
+CASES = {
+    "get_available_beats": (lambda i: lambda: get_available_beats(i["content"], i["state"]), None),
+    "build_dm_context": (lambda i: lambda: build_dm_context(i["content"], i["state"], {}), None),
+    "build_dm_system_injection": (
+        lambda i: lambda: build_dm_system_injection(i["dm_context"], i["party_status"], i["notes"]), None,
+    ),
+    "build_rules_reference": (lambda i: lambda: build_rules_reference(i["system"]), None),
+    "format_author_notes_for_dm": (lambda i: lambda: format_author_notes_for_dm(i["notes"]), None),
+    "build_prep_coach_context": (
+        lambda i: lambda: build_prep_coach_context(i["data"], i["state_data"], i["prep"], i["system"]), None,
+    ),
+    "validate_campaign_content": (lambda i: lambda: validate_campaign_content(i["data"]), MAX_CONTENT_ITEMS),
+}
+
+
+def _time(fn, rounds: int, min_seconds: float = 0.02) -> float:
+    """Best per-call time in microseconds over several rounds of at least min_seconds each"""
+    fn()
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        if time.perf_counter() - start >= min_seconds:
+            break
+        iterations *= 2
+    best = float("inf")
+    # As timeit does: a collection landing in one round would skew it
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return best / iterations * 1e6
+
+
+def growth_exponent(curve: dict) -> float:
+    """Least-squares slope of log(time) against log(size) over the three largest sizes"""
+    points = sorted((int(size), us) for size, us in curve.items())[-3:]
+    if len(points) < 2:
+        return 0.0
+    xs = [math.log(size) for size, _ in points]
+    ys = [math.log(us) for _, us in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+def run(sizes: list, rounds: int = 5, cases: dict = CASES) -> dict:
+    """function name -> {size: best microseconds per call}"""
+    curves = {name: {} for name in cases}
+    for n in sizes:
+        inputs = _inputs(n)
+        for name, (make, max_size) in cases.items():
+            if max_size is None or n <= max_size:
+                curves[name][str(n)] = round(_time(make(inputs), rounds), 2)
+    return curves
+
+
+def regressions(curves: dict, baseline: dict, threshold: float) -> list:
+    """(function, size) timings more than threshold (a fraction) slower than the baseline's"""
+    found = []
+    for name, curve in curves.items():
+        for size, us in curve.items():
+            before = baseline.get(name, {}).get(size)
+            if before and us > before * (1 + threshold):
+                found.append(f"{name} n={size}: {before:g}us -> {us:g}us")
+    return found
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated input sizes")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--only", help="Comma-separated function names to run")
+    parser.add_argument("--max-exponent", type=float, default=MAX_EXPONENT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown over the baseline (0.25 = 25%%)")
+    parser.add_argument("--json", dest="json_path", help="Also write the curves and exponents as JSON to this path")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    cases = {name: CASES[name] for name in args.only.split(",")} if args.only else CASES
+    curves = run(sizes, args.rounds, cases)
+    exponents = {name: round(growth_exponent(curve), 2) for name, curve in curves.items()}
+
+    print(f"{'function (us per call)':28}" + "".join(f"{'n=' + str(n):>10}" for n in sizes) + f"{'growth':>8}")
+    for name, curve in curves.items():
+        cells = "".join(f"{curve[str(n)] if str(n) in curve else '-':>10}" for n in sizes)
+        print(f"{name:28}{cells}{'n^' + format(exponents[name], 'g'):>8}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"curves": curves, "exponents": exponents}, f, indent=2)
+
+    failures = [
+        f"{name} grows as n^{k:g} (limit n^{args.max_exponent:g})"
+        for name, k in exponents.items() if k > args.max_exponent
+    ]
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"sizes": sizes, "curves": curves}, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            failures += regressions(curves, json.load(f)["curves"], args.threshold)
+
+    for line in failures:
+        print(f"FAIL: {line}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
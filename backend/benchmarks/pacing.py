@@ -0,0 +1,45 @@
+"""
+Benchmark for the pacing simulator
+
+Times simulate_pacing on the example campaign at the default run count and
+fails if the best of several rounds exceeds the one-second budget. Run from
+backend/:
+
+    python -m benchmarks.pacing [--rounds 5] [--runs 20000]
+"""
+
+import argparse
+import sys
+import time
+
+from campaign_schema import CampaignContent, EXAMPLE_CAMPAIGN
+from pacing_simulator import DEFAULT_RUNS, simulate_pacing
+
+BUDGET_SECONDS = 1.0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    args = parser.parse_args(argv)
+
+    content = CampaignContent(**EXAMPLE_CAMPAIGN)
+    simulate_pacing(content, runs=100, seed=0)  # warm up imports and NumPy
+
+    timings = []
+    for round_number in range(args.rounds):
+        start = time.perf_counter()
+        simulate_pacing(content, runs=args.runs, seed=round_number)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"simulate_pacing runs={args.runs}: best {best:.3f}s, worst {max(timings):.3f}s over {args.rounds} rounds")
+    if best > BUDGET_SECONDS:
+        print(f"FAIL: over the {BUDGET_SECONDS:.1f}s budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
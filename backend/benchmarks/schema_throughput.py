@@ -0,0 +1,79 @@
+"""
+Benchmark for schema load and save throughput
+
+Times the storage round trip for realistic campaign.json, state and
+dm_prep.json documents: load (json text -> validated model), save (model ->
+indented json text, as helpers.save_campaign_json writes it) and the deep
+copy campaign actors hand out. Run from backend/:
+
+    python -m benchmarks.schema_throughput [--iterations 3000]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from campaign_schema import (
+    CampaignState,
+    DMPrepData,
+    EXAMPLE_CAMPAIGN,
+    NPCState,
+    CONTENT_ADAPTER,
+    STATE_ADAPTER,
+    DM_PREP_ADAPTER,
+)
+
+
+def _documents() -> list:
+    content = CONTENT_ADAPTER.validate_python(EXAMPLE_CAMPAIGN)
+    state = CampaignState(
+        threat_stage=2,
+        episodes_completed=6,
+        beats_hit=[b.id for b in content.beats[:3]],
+        facts_known=[f"Fact number {i} about the blight" for i in range(40)],
+        npcs={npc.name.lower().replace(" ", "_"): NPCState(met=True, secrets_revealed=["a"]) for npc in content.npcs},
+        locations_visited=[loc.name for loc in content.locations],
+    )
+    prep = DMPrepData(
+        author_notes=[
+            {"id": f"n{i}", "content": f"Note {i}: keep the pace brisk", "created_at": "2024-01-01T00:00:00Z"}
+            for i in range(50)
+        ],
+        conversation=[{"role": "user", "content": "x" * 200} for _ in range(40)],
+    )
+    return [
+        ("CampaignContent", content, CONTENT_ADAPTER),
+        ("CampaignState", state, STATE_ADAPTER),
+        ("DMPrepData", prep, DM_PREP_ADAPTER),
+    ]
+
+
+def _time(fn, iterations: int, rounds: int = 5) -> float:
+    """Best per-call time in microseconds over several rounds"""
+    fn()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=3000)
+    args = parser.parse_args(argv)
+
+    for name, instance, adapter in _documents():
+        text = json.dumps(instance.model_dump(), indent=2)
+        load = _time(lambda: adapter.validate_python(json.loads(text)), args.iterations)
+        save = _time(lambda: json.dumps(instance.model_dump(), indent=2), args.iterations)
+        copy = _time(lambda: instance.model_copy(deep=True), args.iterations)
+        print(f"{name:16} load {load:7.1f}us  save {save:7.1f}us  deep copy {copy:7.1f}us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Benchmark for cold start: how long `import main` takes, and what it pulls in
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and
+reports the slowest imports by cumulative time, grouped by top-level package
+(the same numbers -X importtime prints, summed per package). Fails if the
+best of several rounds goes over the budget, or if one of the lazily loaded
+SDKs (lazy_imports.py) got imported at startup after all. Run from backend/:
+
+    python -m benchmarks.startup [--rounds 3] [--top 15]
+
+tests/test_startup.py checks the deterministic half of this (no SDK imported,
+module count within MODULE_BUDGET) on every test run.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_SECONDS = 1.5
+# Modules loaded by `import main`, from a fresh interpreter (about 490 when
+# this was set; importing the SDKs and NumPy eagerly brought it to about 3,000)
+MODULE_BUDGET = 800
+# Loaded on first use or by the pre-warm after startup, never by `import main`
+LAZY_MODULES = ("anthropic", "replicate", "httpx", "yaml", "numpy")
+
+
+def measure_imports(target: str = "main") -> list:
+    """(module, self seconds, cumulative seconds, nesting depth) per import in a fresh `import target`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:       123 |       4567 |     package.module", indented two spaces per level
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        imports.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return imports
+
+
+def loaded_modules(target: str = "main") -> set:
+    """Names in sys.modules after a fresh `import target`"""
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys, {target}; print('\\n'.join(sys.modules))"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    return set(result.stdout.split())
+
+
+def by_package(imports: list) -> dict:
+    """Top-level package -> seconds spent importing it (self time of it and its submodules)"""
+    totals: dict = {}
+    for name, self_seconds, _, _ in imports:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0.0) + self_seconds
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    runs = [measure_imports() for _ in range(args.rounds)]
+    totals = [next(cumulative for name, _, cumulative, _ in imports if name == "main") for imports in runs]
+    best = runs[totals.index(min(totals))]
+
+    print(f"import main: best {min(totals):.3f}s, worst {max(totals):.3f}s over {args.rounds} rounds")
+    for package, seconds in list(by_package(best).items())[: args.top]:
+        print(f"  {package:32} {seconds * 1000:8.1f}ms")
+
+    failures = []
+    if min(totals) > BUDGET_SECONDS:
+        failures.append(f"over the {BUDGET_SECONDS:.1f}s budget")
+    eager = sorted(set(LAZY_MODULES) & {name for name, _, _, _ in best})
+    if eager:
+        failures.append(f"imported at startup: {', '.join(eager)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
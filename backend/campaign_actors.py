@@ -0,0 +1,356 @@
+"""
+Opt-in per-campaign actors that keep hot play documents in memory
+
+With WEAVE_CAMPAIGN_ACTORS=1, each campaign in play gets one asyncio task that
+owns current_session.json and roster.json. Routes send it reads and mutations
+through a mailbox; they are applied one at a time to the in-memory copy, which
+is checkpointed to disk on an interval, when the actor goes idle, and when the
+session ends. The actor also caches the campaign state between event appends.
+Actors live in one process, so this mode needs a single worker.
+
+Without actors (the default) the same read_doc/update_doc calls go straight
+to disk, serialized per campaign within the process.
+"""
+
+import asyncio
+import concurrent.futures
+import copy
+import threading
+import time
+from typing import Callable, Optional
+
+import config
+from memory_report import register_cache
+from helpers import load_campaign_json, save_campaign_json
+from schema_migrations import migration, upgrade_document, stamp_document, unstamped
+
+SESSION_FILE = "current_session.json"
+ROSTER_FILE = "roster.json"
+
+# Documents the actors own, by schema type; they are held in memory unstamped
+_DOC_TYPES = {SESSION_FILE: "session", ROSTER_FILE: "roster"}
+
+# Checkpoint and stop an actor that has had no messages for this long
+IDLE_TIMEOUT_SECONDS = 30 * 60
+
+_STOP = object()
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_actors: dict = {}
+_registry_lock = threading.Lock()
+_file_locks: dict = {}
+
+
+class CampaignActor:
+    """Owns one campaign's play documents; every access runs on the event loop, in order"""
+
+    def __init__(self, campaign_id: str):
+        self.campaign_id = campaign_id
+        self.docs: dict = {}
+        self.dirty: set = set()
+        self.mailbox: asyncio.Queue = asyncio.Queue()
+        self.state = None
+        self.state_generation = 0
+        self.stopped = False
+        self.last_checkpoint = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+
+    def deliver(self, message):
+        """Queue a message (runs on the loop). Messages for a retired actor go to its successor."""
+        if self.stopped:
+            _actor_for(self.campaign_id).deliver(message)
+        else:
+            self.mailbox.put_nowait(message)
+
+    async def run(self):
+        interval = config.CAMPAIGN_ACTOR_CHECKPOINT_SECONDS
+        while True:
+            if self.dirty:
+                timeout = max(0.0, interval - (time.monotonic() - self.last_checkpoint))
+            else:
+                timeout = IDLE_TIMEOUT_SECONDS
+            try:
+                message = await asyncio.wait_for(self.mailbox.get(), timeout)
+            except asyncio.TimeoutError:
+                if self.dirty:
+                    await self.checkpoint()
+                    continue
+                if self._retire_if_idle():
+                    return
+                continue
+
+            filename, fn, writes, future = message
+            if filename is _STOP:
+                # Checkpoint before retiring so a successor never loads stale files
+                if writes:
+                    await self.checkpoint()
+                self._retire()
+                future.set_result(None)
+                self._forward_pending()
+                return
+
+            try:
+                if filename not in self.docs:
+                    self.docs[filename], upgraded = await asyncio.to_thread(_load_doc, self.campaign_id, filename)
+                    if upgraded:
+                        self.dirty.add(filename)
+                doc = self.docs[filename]
+                if writes:
+                    check, mutate, returns = fn
+                    if check is not None:
+                        check(doc)
+                    try:
+                        changed = mutate(doc) is not False
+                    except BaseException:
+                        # mutate should not raise (validation belongs in check); if it does,
+                        # whatever it changed is what readers now see, so it must reach disk too
+                        self.dirty.add(filename)
+                        raise
+                    if changed:
+                        self.dirty.add(filename)
+                    result = copy.deepcopy(doc) if returns else None
+                else:
+                    result = fn(doc)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+            if self.dirty and time.monotonic() - self.last_checkpoint >= interval:
+                await self.checkpoint()
+
+    async def checkpoint(self):
+        """Write dirty documents to disk"""
+        pending = {filename: copy.deepcopy(self.docs[filename]) for filename in self.dirty}
+        self.dirty.clear()
+        self.last_checkpoint = time.monotonic()
+        if not pending:
+            return
+        try:
+            await asyncio.to_thread(_write_docs, self.campaign_id, pending)
+        except Exception as e:
+            # Keep the documents dirty and try again at the next checkpoint
+            print(f"Checkpoint failed for campaign {self.campaign_id}: {e}")
+            self.dirty.update(pending)
+
+    def _retire(self):
+        with _registry_lock:
+            self.stopped = True
+            if _actors.get(self.campaign_id) is self:
+                del _actors[self.campaign_id]
+
+    def _retire_if_idle(self) -> bool:
+        with _registry_lock:
+            if not self.mailbox.empty():
+                return False
+            self.stopped = True
+            if _actors.get(self.campaign_id) is self:
+                del _actors[self.campaign_id]
+            return True
+
+    def _forward_pending(self):
+        """Hand messages that raced a stop to the next actor"""
+        while not self.mailbox.empty():
+            self.deliver(self.mailbox.get_nowait())
+
+
+@migration("session", 1)
+def _upgrade_session_v1(data: dict) -> dict:
+    """First stamped version; nothing to change"""
+    return data
+
+
+@migration("roster", 1)
+def _upgrade_roster_v1(data: dict) -> dict:
+    """First stamped version; nothing to change"""
+    return data
+
+
+def _load_doc(campaign_id: str, filename: str) -> tuple:
+    """Load a document upgraded to the current schema, without its stamp. Returns (data, upgraded)."""
+    data = load_campaign_json(campaign_id, filename)
+    doc_type = _DOC_TYPES.get(filename)
+    if not data or doc_type is None:
+        return data, False
+    data, upgraded = upgrade_document(doc_type, data)
+    return unstamped(data), upgraded
+
+
+def _save_doc(campaign_id: str, filename: str, data: dict):
+    doc_type = _DOC_TYPES.get(filename)
+    save_campaign_json(campaign_id, filename, stamp_document(doc_type, data) if doc_type else data)
+
+
+def _write_docs(campaign_id: str, docs: dict):
+    for filename, data in docs.items():
+        _save_doc(campaign_id, filename, data)
+
+
+def _actor_for(campaign_id: str) -> CampaignActor:
+    """Get or start the campaign's actor. Must run on the actor loop."""
+    with _registry_lock:
+        actor = _actors.get(campaign_id)
+        if actor is None:
+            actor = CampaignActor(campaign_id)
+            actor.task = _loop.create_task(actor.run())
+            _actors[campaign_id] = actor
+        return actor
+
+
+def _file_lock(campaign_id: str) -> threading.Lock:
+    with _registry_lock:
+        return _file_locks.setdefault(campaign_id, threading.Lock())
+
+
+def _send(campaign_id: str, filename, fn: Optional[Callable], writes: bool):
+    """Send a message to the campaign's actor from a worker thread and wait for the reply"""
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is _loop:
+        raise RuntimeError("Campaign actors must be called from a worker thread, not the event loop")
+    future = concurrent.futures.Future()
+    message = (filename, fn, writes, future)
+    _loop.call_soon_threadsafe(lambda: _actor_for(campaign_id).deliver(message))
+    return future.result()
+
+
+# === Lifecycle ===
+
+def start(loop: asyncio.AbstractEventLoop):
+    """Register the event loop actors run on (called at app startup)"""
+    global _loop
+    _loop = loop
+
+
+async def shutdown():
+    """Checkpoint and stop every actor (called at app shutdown)"""
+    global _loop
+    with _registry_lock:
+        actors = list(_actors.values())
+    for actor in actors:
+        future = concurrent.futures.Future()
+        actor.deliver((_STOP, None, True, future))
+        await asyncio.wrap_future(future)
+    _loop = None
+
+
+def actors_enabled() -> bool:
+    return config.CAMPAIGN_ACTORS and _loop is not None and not _loop.is_closed()
+
+
+def has_actor(campaign_id: str) -> bool:
+    with _registry_lock:
+        return campaign_id in _actors
+
+
+def release(campaign_id: str):
+    """Checkpoint and stop the campaign's actor, e.g. when a session ends. The next access starts a fresh one."""
+    if actors_enabled() and has_actor(campaign_id):
+        _send(campaign_id, _STOP, None, True)
+
+
+def discard(campaign_id: str):
+    """Stop the campaign's actor without writing anything (the campaign is being deleted)"""
+    if actors_enabled() and has_actor(campaign_id):
+        _send(campaign_id, _STOP, None, False)
+
+
+# === Documents ===
+
+def read_doc(campaign_id: str, filename: str, project: Optional[Callable[[dict], object]] = None):
+    """
+    Return a copy of a campaign document, from its actor when enabled.
+    project picks out the part the caller needs, so only that part is copied.
+    """
+    if not actors_enabled():
+        data = _load_doc(campaign_id, filename)[0]
+        return project(data) if project else data
+    if project is None:
+        return _send(campaign_id, filename, copy.deepcopy, False)
+    return _send(campaign_id, filename, lambda doc: copy.deepcopy(project(doc)), False)
+
+
+def peek_doc(campaign_id: str, filename: str, project: Optional[Callable[[dict], object]] = None):
+    """Like read_doc, but never starts an actor (for listings that touch every campaign)"""
+    if actors_enabled() and has_actor(campaign_id):
+        return read_doc(campaign_id, filename, project)
+    data = _load_doc(campaign_id, filename)[0]
+    return project(data) if project else data
+
+
+def update_doc(
+    campaign_id: str,
+    filename: str,
+    mutate: Callable[[dict], Optional[bool]],
+    check: Optional[Callable[[dict], None]] = None,
+    returns: bool = True,
+) -> Optional[dict]:
+    """
+    Apply mutate to the current document and return a copy of the result.
+
+    Mutations for one campaign never interleave. check runs first and may
+    raise (e.g. HTTPException) to reject the update before anything changes;
+    mutate should not raise. mutate may return False to say it changed
+    nothing, so nothing is written. With returns=False nothing is copied and
+    None is returned.
+    """
+    if not actors_enabled():
+        with _file_lock(campaign_id):
+            data, upgraded = _load_doc(campaign_id, filename)
+            if check is not None:
+                check(data)
+            if mutate(data) is not False or upgraded:
+                _save_doc(campaign_id, filename, data)
+            return data if returns else None
+    return _send(campaign_id, filename, (check, mutate, returns), True)
+
+
+def write_doc(campaign_id: str, filename: str, data: dict):
+    """Replace a campaign document"""
+    def replace(doc: dict):
+        doc.clear()
+        doc.update(copy.deepcopy(data))
+
+    update_doc(campaign_id, filename, replace, returns=False)
+
+
+# === State cache ===
+
+def cached_state(campaign_id: str) -> tuple:
+    """
+    Return (state, generation) from the campaign's actor, or (None, None) when
+    there is no actor. state is None on a miss; pass generation to remember_state.
+    """
+    if not actors_enabled():
+        return None, None
+    with _registry_lock:
+        actor = _actors.get(campaign_id)
+        if actor is None:
+            return None, None
+        if actor.state is not None:
+            return actor.state.model_copy(deep=True), actor.state_generation
+        return None, actor.state_generation
+
+
+def remember_state(campaign_id: str, state, generation: Optional[int]):
+    """Cache state loaded from disk, unless it changed since the load began"""
+    if generation is None:
+        return
+    with _registry_lock:
+        actor = _actors.get(campaign_id)
+        if actor is not None and actor.state_generation == generation:
+            actor.state = state.model_copy(deep=True)
+
+
+def on_state_saved(campaign_id: str):
+    with _registry_lock:
+        actor = _actors.get(campaign_id)
+        if actor is not None:
+            actor.state = None
+            actor.state_generation += 1
+
+
+register_cache("campaign_actors", lambda: {campaign_id: (actor.docs, actor.state) for campaign_id, actor in dict(_actors).items()})
+register_cache("actor_file_locks", lambda: dict(_file_locks))
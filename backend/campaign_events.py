@@ -0,0 +1,323 @@
+"""
+Append-only campaign state event log with periodic snapshots
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Optional, Union
+
+from campaign_schema import CampaignState, NPCState, STATE_ADAPTER
+from helpers import get_campaign_dir, load_campaign_json, save_campaign_json
+from schema_migrations import migration, upgrade_document, stamp_document
+from memory_report import register_cache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+EVENTS_FILE = "events.jsonl"
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_INDEX = os.path.join(SNAPSHOT_DIR, "index.json")
+
+# Write a full-state snapshot every N events so reads replay at most N-1 events
+SNAPSHOT_EVERY = 50
+
+# Events that carry a complete state and replace whatever came before
+BASE_EVENTS = ("state_initialized", "state_reset", "state_replaced", "state_restored")
+
+_locks: dict = {}
+_locks_guard = threading.Lock()
+
+
+@migration("event", 1)
+def _upgrade_event_v1(data: dict) -> dict:
+    """First stamped version; nothing to change"""
+    return data
+
+
+@migration("snapshot", 1)
+def _upgrade_snapshot_v1(data: dict) -> dict:
+    """First stamped version; nothing to change"""
+    return data
+
+
+def _state_payload(state: CampaignState) -> dict:
+    """A full state as stored inside base events and snapshots"""
+    return stamp_document("state", state.model_dump())
+
+
+def _state_from_payload(data: dict) -> CampaignState:
+    data, _ = upgrade_document("state", data)
+    return STATE_ADAPTER.validate_python(data)
+
+
+def _campaign_lock(campaign_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(campaign_id, threading.Lock())
+
+
+def _events_path(campaign_id: str) -> str:
+    return os.path.join(get_campaign_dir(campaign_id), EVENTS_FILE)
+
+
+def has_event_log(campaign_id: str) -> bool:
+    return os.path.exists(_events_path(campaign_id))
+
+
+# === Reducer ===
+
+def apply_event(state: CampaignState, event: dict) -> CampaignState:
+    """Apply one event to a state. Base events return a new state; others mutate in place."""
+    event_type = event["type"]
+    data = event.get("data", {})
+
+    if event_type in BASE_EVENTS:
+        return _state_from_payload(data["state"])
+
+    if event_type == "beat_hit":
+        if data["beat_id"] not in state.beats_hit:
+            state.beats_hit.append(data["beat_id"])
+    elif event_type == "beat_expired":
+        if data["beat_id"] not in state.beats_expired:
+            state.beats_expired.append(data["beat_id"])
+    elif event_type == "fact_learned":
+        if data["fact"] not in state.facts_known:
+            state.facts_known.append(data["fact"])
+    elif event_type == "npc_added":
+        state.npcs.setdefault(data["npc_key"], NPCState())
+    elif event_type == "npc_met":
+        state.npcs.setdefault(data["npc_key"], NPCState()).met = True
+    elif event_type == "threat_advanced":
+        state.threat_stage = data["stage"]
+    elif event_type == "episode_completed":
+        state.episodes_completed = data.get("episodes_completed", state.episodes_completed + 1)
+    elif event_type == "location_visited":
+        if data["location"] not in state.locations_visited:
+            state.locations_visited.append(data["location"])
+    # xp_awarded, session_ended and unknown types are history only
+
+    return state
+
+
+# === Log I/O ===
+
+def _read_last_event(path: str) -> Optional[dict]:
+    """Read the final line of the log without scanning the whole file"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if end == 0:
+            return None
+        chunk = b""
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step) + chunk
+            lines = chunk.rstrip(b"\n").split(b"\n")
+            if len(lines) > 1 or pos == 0:
+                return json.loads(lines[-1])
+    return None
+
+
+def _iter_events(path: str, offset: int = 0):
+    """Yield (event, end_offset) from a byte offset onward"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                event, _ = upgrade_document("event", json.loads(line))
+                yield event, f.tell()
+
+
+def _load_snapshot_index(campaign_id: str) -> list:
+    return load_campaign_json(campaign_id, SNAPSHOT_INDEX).get("snapshots", [])
+
+
+def _write_snapshot(campaign_id: str, state: CampaignState, seq: int, offset: int):
+    """Store state as of seq, with the log offset to resume replay from"""
+    snapshots = _load_snapshot_index(campaign_id)
+    filename = os.path.join(SNAPSHOT_DIR, f"state_{seq:08d}.json")
+    save_campaign_json(campaign_id, filename, stamp_document("snapshot", {"seq": seq, "state": _state_payload(state)}))
+    snapshots.append({"seq": seq, "offset": offset, "file": filename})
+    save_campaign_json(campaign_id, SNAPSHOT_INDEX, {"snapshots": snapshots})
+
+
+def append_events(campaign_id: str, events: Union[list, Callable[[CampaignState], list]],
+                  base_state: Optional[CampaignState] = None) -> tuple:
+    """
+    Append events to the campaign log; returns (resulting state, seq of the
+    first event appended for the caller).
+
+    Each event is {"type", "data"}; seq, timestamp, episode tag, and batch are
+    added here. base_state seeds a brand-new log (e.g. from a legacy state.json).
+    events may instead be a function of the current state, called while the log
+    is locked, so checks against that state hold until its events are written.
+    Whatever it raises propagates and nothing is appended.
+    """
+    path = _events_path(campaign_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with _campaign_lock(campaign_id):
+        with open(path, "a+b") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                last = _read_last_event(path)
+                state = load_state(campaign_id) if last else None
+                seq = last["seq"] if last else 0
+
+                seed = []
+                if state is None and base_state is not None:
+                    seed = [{"type": "state_initialized", "data": {"state": _state_payload(base_state)}}]
+                if callable(events):
+                    events = events(state if state is not None else base_state or CampaignState())
+                events = seed + list(events)
+                if state is None:
+                    state = CampaignState()
+
+                now = datetime.utcnow().isoformat() + "Z"
+                batch = seq + 1
+                first = batch + len(seed)
+                for event in events:
+                    seq += 1
+                    record = stamp_document("event", {
+                        "seq": seq,
+                        "type": event["type"],
+                        "at": now,
+                        # episodes_completed when the event happened
+                        "episode": state.episodes_completed,
+                        "batch": batch,
+                        "data": event.get("data", {}),
+                    })
+                    f.write((json.dumps(record) + "\n").encode())
+                    state = apply_event(state, record)
+                    if seq % SNAPSHOT_EVERY == 0:
+                        f.flush()
+                        _write_snapshot(campaign_id, state, seq, f.tell())
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    return state, first
+
+
+def _episode_marks(path: str) -> list:
+    """
+    [seq, episodes_completed] points along the current timeline, oldest first.
+
+    Each base event starts a new timeline at its state's episode count, so
+    episode numbers restart after a reset. A state_restored event carries on the
+    timeline it restored from, up to restored_to. An episode_completed mark sits
+    at the end of its batch, so expiries recorded with the episode are included.
+    """
+    marks = [[0, 0]]
+    timelines = {0: marks}
+    batch = None
+    for event, _ in _iter_events(path):
+        data = event.get("data", {})
+        if event["type"] in BASE_EVENTS:
+            episodes = data["state"].get("episodes_completed", 0)
+            restored_to = data.get("restored_to")
+            if event["type"] == "state_restored" and restored_to is not None:
+                origin = max(seq for seq in timelines if seq <= restored_to)
+                marks = [m for m in timelines[origin] if m[0] <= restored_to]
+            else:
+                marks = []
+            marks.append([event["seq"], episodes])
+            timelines[event["seq"]] = marks
+            batch = None
+        elif event["type"] == "episode_completed":
+            marks.append([event["seq"], data["episodes_completed"]])
+            batch = event.get("batch")
+        elif batch is not None and event.get("batch") == batch:
+            marks[-1][0] = event["seq"]
+    return marks
+
+
+def episode_end_seq(campaign_id: str, episode: int) -> Optional[int]:
+    """
+    Seq at which the current timeline first had episode episodes completed, or
+    None if it has not got there yet. When the timeline starts later (e.g.
+    seeded from a legacy state), its first point is the best available.
+    """
+    path = _events_path(campaign_id)
+    if not os.path.exists(path):
+        return None
+    for seq, episodes in _episode_marks(path):
+        if episodes >= episode:
+            return seq
+    return None
+
+
+def load_state(campaign_id: str, as_of_seq: Optional[int] = None, as_of_episode: Optional[int] = None) -> Optional[CampaignState]:
+    """
+    Rebuild state from the nearest snapshot plus the events after it.
+
+    as_of_seq stops after that event. as_of_episode returns the state once
+    episode N had been completed on the current timeline (see
+    episode_end_seq). Returns None if there is no log.
+    """
+    path = _events_path(campaign_id)
+    if not os.path.exists(path):
+        return None
+
+    if as_of_episode is not None:
+        end = episode_end_seq(campaign_id, as_of_episode)
+        if end is not None:
+            as_of_seq = end if as_of_seq is None else min(as_of_seq, end)
+
+    state = CampaignState()
+    offset = 0
+    for snap in reversed(_load_snapshot_index(campaign_id)):
+        if as_of_seq is not None and snap["seq"] > as_of_seq:
+            continue
+        snapshot, _ = upgrade_document("snapshot", load_campaign_json(campaign_id, snap["file"]))
+        state = _state_from_payload(snapshot["state"])
+        offset = snap["offset"]
+        break
+
+    for event, _ in _iter_events(path, offset):
+        if as_of_seq is not None and event["seq"] > as_of_seq:
+            break
+        state = apply_event(state, event)
+    return state
+
+
+def list_events(campaign_id: str, after_seq: int = 0, limit: int = 100) -> list:
+    """Events with seq > after_seq, oldest first"""
+    path = _events_path(campaign_id)
+    offset = 0
+    for snap in reversed(_load_snapshot_index(campaign_id)):
+        if snap["seq"] <= after_seq:
+            offset = snap["offset"]
+            break
+    events = []
+    for event, _ in _iter_events(path, offset):
+        if event["seq"] <= after_seq:
+            continue
+        events.append(event)
+        if len(events) >= limit:
+            break
+    return events
+
+
+def last_seq(campaign_id: str) -> int:
+    path = _events_path(campaign_id)
+    if not os.path.exists(path):
+        return 0
+    last = _read_last_event(path)
+    return last["seq"] if last else 0
+
+
+register_cache("event_log_locks", lambda: dict(_locks))
@@ -2,13 +2,27 @@
 Campaign content, state, and beat management logic
 """
 
+import os
+import pickle
+import threading
+from typing import Optional
+
 from campaign_schema import (
     CampaignContent,
     CampaignState,
     NPCState,
     DMPrepData,
+    CONTENT_ADAPTER,
+    STATE_ADAPTER,
+    DM_PREP_ADAPTER,
 )
-from helpers import load_campaign_json, save_campaign_json
+from helpers import get_campaign_dir, load_campaign_json, save_campaign_json
+from schema_migrations import migration, upgrade_document, stamp_document
+from content_index import on_content_saved, on_prep_saved
+from campaign_events import has_event_log, load_state, append_events
+from campaign_actors import cached_state, remember_state, on_state_saved
+from metrics import cache_lookup
+from memory_report import register_cache
 
 
 def _migrate_campaign_data(data: dict) -> dict:
@@ -98,50 +112,165 @@ def _migrate_state_data(data: dict) -> dict:
     return migrated
 
 
+def _has_legacy_content(data: dict) -> bool:
+    threat = data.get("threat")
+    return "anchor_runs" in data or "filler_seeds" in data or (isinstance(threat, dict) and "advance_on" in threat)
+
+
+# === Schema migrations (see schema_migrations.py) ===
+
+@migration("campaign", 1)
+def _upgrade_campaign_v1(data: dict) -> dict:
+    """anchor_runs → beats, threat.advance_on → advances_each_episode_unless_beat_hit"""
+    return _migrate_campaign_data(data) if _has_legacy_content(data) else data
+
+
+@migration("draft", 1)
+def _upgrade_draft_v1(data: dict) -> dict:
+    """Unwrap old {content: {...}, system: {...}} drafts, then migrate like content"""
+    if "content" in data and isinstance(data["content"], dict) and "name" in data["content"]:
+        data = dict(data["content"])
+    return _upgrade_campaign_v1(data)
+
+
+@migration("state", 1)
+def _upgrade_state_v1(data: dict) -> dict:
+    """runs → episodes, anchor runs → beats"""
+    if "runs_completed" in data or "anchor_runs_completed" in data:
+        return _migrate_state_data(data)
+    return data
+
+
+@migration("dm_prep", 1)
+def _upgrade_dm_prep_v1(data: dict) -> dict:
+    """First stamped version; nothing to change"""
+    return data
+
+
+# campaign_id -> (file identity, pickled validated CampaignContent) for campaign.json.
+# Kept pickled so no caller ever holds the cached object: each load unpickles
+# its own deep copy, about half the cost of model_copy(deep=True).
+_content_cache: dict = {}
+_content_cache_lock = threading.Lock()
+
+
+def _file_identity(path: str):
+    """(mtime_ns, size, inode) of path, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
 def load_campaign_content(campaign_id: str):
-    """Load authored campaign content"""
+    """
+    Load authored campaign content, upgrading and saving older documents once.
+
+    A campaign.json this process already validated is not parsed or validated
+    again while it is unchanged on disk. Every caller gets its own copy, so
+    changing one cannot change what later loads return.
+    """
+    path = os.path.join(get_campaign_dir(campaign_id), "campaign.json")
+    identity = _file_identity(path)
+    with _content_cache_lock:
+        cached = _content_cache.get(campaign_id)
+        if identity is None:
+            _content_cache.pop(campaign_id, None)
+        elif cached is not None and cached[0] == identity:
+            cache_lookup("content", hit=True)
+            return pickle.loads(cached[1])
+    if identity is not None:
+        cache_lookup("content", hit=False)
+
     data = load_campaign_json(campaign_id, "campaign.json")
     if not data:
         return None
+    data, upgraded = upgrade_document("campaign", data)
     try:
-        return CampaignContent(**data)
+        content = CONTENT_ADAPTER.validate_python(data)
     except Exception:
-        # Try migrating from old schema
-        try:
-            migrated = _migrate_campaign_data(data)
-            content = CampaignContent(**migrated)
-            # Save migrated data back so future loads work directly
-            save_campaign_json(campaign_id, "campaign.json", content.dict())
-            return content
-        except Exception:
-            return None
-
-def load_campaign_state(campaign_id: str) -> CampaignState:
-    """Load runtime campaign state"""
+        return None
+    if upgraded:
+        save_campaign_content(campaign_id, content)
+        identity = _file_identity(path)
+    cached = pickle.dumps(content, pickle.HIGHEST_PROTOCOL)
+    with _content_cache_lock:
+        _content_cache[campaign_id] = (identity, cached)
+    return content
+
+def save_campaign_content(campaign_id: str, content: CampaignContent):
+    """Save authored campaign content and refresh the search index"""
+    save_campaign_json(campaign_id, "campaign.json", stamp_document("campaign", content.model_dump()))
+    on_content_saved(campaign_id, content)
+
+def _load_legacy_state(campaign_id: str) -> CampaignState:
+    """Load state.json, written before campaigns had an event log"""
     data = load_campaign_json(campaign_id, "state.json")
     if not data:
         return CampaignState()
-    # Auto-migrate old state format
-    if "runs_completed" in data or "anchor_runs_completed" in data:
-        data = _migrate_state_data(data)
+    data, upgraded = upgrade_document("state", data)
+    if upgraded:
         save_campaign_json(campaign_id, "state.json", data)
-    return CampaignState(**data)
-
-def save_campaign_state(campaign_id: str, state: CampaignState):
-    """Save runtime campaign state"""
-    save_campaign_json(campaign_id, "state.json", state.dict())
+    return STATE_ADAPTER.validate_python(data)
+
+def load_campaign_state(campaign_id: str, as_of_seq: Optional[int] = None, as_of_episode: Optional[int] = None) -> CampaignState:
+    """Load runtime campaign state, optionally as it was at an earlier event or episode"""
+    if as_of_seq is not None or as_of_episode is not None:
+        return load_state(campaign_id, as_of_seq=as_of_seq, as_of_episode=as_of_episode) or _load_legacy_state(campaign_id)
+
+    state, generation = cached_state(campaign_id)
+    if generation is not None:
+        cache_lookup("state", hit=state is not None)
+    if state is not None:
+        return state
+    if has_event_log(campaign_id):
+        state = load_state(campaign_id)
+    else:
+        state = _load_legacy_state(campaign_id)
+    remember_state(campaign_id, state, generation)
+    return state
+
+def has_campaign_state(campaign_id: str) -> bool:
+    return has_event_log(campaign_id) or bool(load_campaign_json(campaign_id, "state.json"))
+
+def record_state_events(campaign_id: str, events) -> tuple:
+    """
+    Append state change events; returns (new state, seq of the first event).
+    events is a list, or a function of the current state called under the log
+    lock (see append_events). The first write seeds the log from state.json.
+    """
+    base_state = None if has_event_log(campaign_id) else _load_legacy_state(campaign_id)
+    state, first_seq = append_events(campaign_id, events, base_state=base_state)
+    on_state_saved(campaign_id)
+    return state, first_seq
+
+def save_campaign_state(campaign_id: str, state: CampaignState, event_type: str = "state_replaced",
+                        restored_to: Optional[int] = None):
+    """
+    Record a whole-state replacement (initialize, reset, restore) as a single
+    event. restored_to is the seq a rollback restored, so episode history
+    carries on from there.
+    """
+    data = {"state": stamp_document("state", state.model_dump())}
+    if restored_to is not None:
+        data["restored_to"] = restored_to
+    append_events(campaign_id, [{"type": event_type, "data": data}])
+    on_state_saved(campaign_id)
 
 
 def get_available_beats(content: CampaignContent, state: CampaignState) -> list:
     """Get currently available beats (not hit/expired, prerequisites met, unlocked)"""
+    beats_hit = set(state.beats_hit)
+    beats_expired = set(state.beats_expired)
     available = []
     for beat in content.beats:
         # Skip already hit or expired
-        if beat.id in state.beats_hit or beat.id in state.beats_expired:
+        if beat.id in beats_hit or beat.id in beats_expired:
             continue
 
         # Check prerequisites
-        if not all(prereq in state.beats_hit for prereq in beat.prerequisites):
+        if not all(prereq in beats_hit for prereq in beat.prerequisites):
             continue
 
         # Check unlocked_by (e.g. "episode:3")
@@ -178,18 +307,43 @@ def advance_threat(content: CampaignContent, state: CampaignState, beat_hit_this
     return True
 
 
+def complete_episode(campaign_id: str, content: CampaignContent) -> CampaignState:
+    """Record the end of an episode: advance the threat if no beat was hit, bump the count, expire beats"""
+    state = load_campaign_state(campaign_id)
+    if has_event_log(campaign_id):
+        episode_start = load_campaign_state(campaign_id, as_of_episode=state.episodes_completed)
+        beat_hit_this_episode = bool(set(state.beats_hit) - set(episode_start.beats_hit))
+    else:
+        beat_hit_this_episode = False
+
+    events = []
+    if advance_threat(content, state, beat_hit_this_episode):
+        events.append({"type": "threat_advanced", "data": {"stage": state.threat_stage}})
+    state.episodes_completed += 1
+    events.append({"type": "episode_completed", "data": {"episodes_completed": state.episodes_completed}})
+    for beat in content.beats:
+        if beat.id not in state.beats_hit and beat.id not in state.beats_expired and check_beat_expiry(beat, state):
+            events.append({"type": "beat_expired", "data": {"beat_id": beat.id}})
+
+    state, _ = record_state_events(campaign_id, events)
+    return state
+
+
 def build_dm_context(content: CampaignContent, state: CampaignState, episode_details: dict) -> dict:
     """Build full context for the DM"""
     party_knows = list(state.facts_known)
+    # Sets for the membership checks; the lists above keep their order for the prompt
+    known = set(party_knows)
+    beats_hit = set(state.beats_hit)
     party_does_not_know = []
 
     for npc in content.npcs:
-        if npc.secret not in party_knows:
+        if npc.secret not in known:
             party_does_not_know.append(f"{npc.name}'s secret: {npc.secret}")
 
     for beat in content.beats:
-        if beat.id not in state.beats_hit and beat.revelation:
-            if beat.revelation not in party_knows:
+        if beat.id not in beats_hit and beat.revelation:
+            if beat.revelation not in known:
                 party_does_not_know.append(f"Beat reveal ({beat.id}): {beat.revelation}")
 
     npc_states = {}
@@ -236,9 +390,16 @@ def load_dm_prep_data(campaign_id: str) -> DMPrepData:
     data = load_campaign_json(campaign_id, "dm_prep.json")
     if not data:
         return DMPrepData()
-    return DMPrepData(**data)
+    data, upgraded = upgrade_document("dm_prep", data)
+    if upgraded:
+        save_campaign_json(campaign_id, "dm_prep.json", data)
+    return DM_PREP_ADAPTER.validate_python(data)
 
 
 def save_dm_prep_data(campaign_id: str, prep_data: DMPrepData):
     """Save DM prep data for a campaign"""
-    save_campaign_json(campaign_id, "dm_prep.json", prep_data.dict())
+    save_campaign_json(campaign_id, "dm_prep.json", stamp_document("dm_prep", prep_data.model_dump()))
+    on_prep_saved(campaign_id, prep_data)
+
+
+register_cache("content", lambda: {campaign_id: entry[1] for campaign_id, entry in dict(_content_cache).items()})
@@ -3,12 +3,16 @@ Campaign Schema and Validation
 Defines the structure for authored campaign content
 """
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, TypeAdapter, ValidationInfo, field_validator
 from typing import Optional, Literal
 from enum import Enum
-import yaml
 import json
 
+from lazy_imports import LazyModule
+
+# Only the YAML import/export helpers need it
+yaml = LazyModule("yaml")
+
 
 class Species(str, Enum):
     MOUSEFOLK = "Mousefolk"
@@ -44,16 +48,17 @@ class SpeciesDefinition(BaseModel):
 
 class StatConfig(BaseModel):
     """Configuration for the stat system"""
-    names: list[str] = Field(..., min_items=2, max_items=6, description="Stat names (e.g., Brave, Clever, Kind)")
-    colors: list[str] = Field(default_factory=list, description="Hex colors for UI display")
+    names: list[str] = Field(..., min_length=2, max_length=6, description="Stat names (e.g., Brave, Clever, Kind)")
+    colors: list[str] = Field(default_factory=list, validate_default=True, description="Hex colors for UI display")
     starting_pool: int = Field(5, ge=3, le=20, description="Total stat points to distribute at creation")
     min_per_stat: int = Field(1, ge=0, le=5, description="Minimum value for each stat")
     max_per_stat: int = Field(3, ge=1, le=10, description="Maximum value for each stat at creation")
 
-    @validator('colors', always=True)
-    def fill_colors(cls, v, values):
+    @field_validator('colors')
+    @classmethod
+    def fill_colors(cls, v, info: ValidationInfo):
         """Ensure colors array matches names length"""
-        names = values.get('names', [])
+        names = info.data.get('names', [])
         if len(v) < len(names):
             # Fill with default colors
             default_colors = ["#c75050", "#5090c7", "#50c770", "#c7a050", "#a050c7", "#50c7a0"]
@@ -94,11 +99,12 @@ class LevelReward(BaseModel):
 class LevelingConfig(BaseModel):
     """Configuration for the leveling system"""
     max_level: int = Field(5, ge=2, le=20)
-    thresholds: list[int] = Field(..., min_items=1, description="XP needed for each level (starting at level 2)")
+    thresholds: list[int] = Field(..., min_length=1, description="XP needed for each level (starting at level 2)")
     rewards: dict[str, LevelReward] = Field(default_factory=dict, description="Rewards keyed by level number")
 
-    @validator('thresholds')
-    def validate_thresholds(cls, v, values):
+    @field_validator('thresholds')
+    @classmethod
+    def validate_thresholds(cls, v):
         """Ensure thresholds are ascending"""
         for i in range(1, len(v)):
             if v[i] <= v[i-1]:
@@ -139,7 +145,7 @@ class CampaignSystem(BaseModel):
     player_context: str = Field("players", max_length=200, description="Who the players are (for DM prompt)")
 
     # Character creation
-    species: list[SpeciesDefinition] = Field(..., min_items=2, max_items=20)
+    species: list[SpeciesDefinition] = Field(..., min_length=2, max_length=20)
     stats: StatConfig
 
     # Resources
@@ -359,14 +365,14 @@ class Location(BaseModel):
     """A key location in the campaign"""
     name: str = Field(..., min_length=1, max_length=50)
     vibe: str = Field(..., min_length=1, max_length=200, description="One sentence atmosphere")
-    contains: list[str] = Field(..., min_items=1, description="Tags for what can be found here")
+    contains: list[str] = Field(..., min_length=1, description="Tags for what can be found here")
 
 
 class Beat(BaseModel):
     """A story beat that advances the campaign narrative"""
     id: str = Field(..., pattern=r'^[a-z][a-z0-9_]*$', max_length=30, description="Unique identifier")
     description: str = Field(..., min_length=10, max_length=300, description="What this beat is about")
-    hints: list[str] = Field(default_factory=list, max_items=5, description="Things AI must weave in")
+    hints: list[str] = Field(default_factory=list, max_length=5, description="Things AI must weave in")
     revelation: str = Field(..., min_length=5, max_length=300, description="What party learns when beat is hit")
     prerequisites: list[str] = Field(default_factory=list, description="Beat IDs that must be hit first")
     unlocked_by: Optional[str] = Field(None, description="e.g. 'episode:3' — unlocked after N episodes")
@@ -377,10 +383,11 @@ class Beat(BaseModel):
 class Threat(BaseModel):
     """The campaign's escalating threat"""
     name: str = Field(..., min_length=1, max_length=50)
-    stages: list[str] = Field(..., min_items=3, max_items=6, description="Escalating threat states")
+    stages: list[str] = Field(..., min_length=3, max_length=6, description="Escalating threat states")
     advances_each_episode_unless_beat_hit: bool = Field(True, description="Threat advances each episode unless a beat was hit")
 
-    @validator('stages')
+    @field_validator('stages')
+    @classmethod
     def validate_stages(cls, v):
         for stage in v:
             if len(stage) < 5 or len(stage) > 150:
@@ -397,7 +404,7 @@ class CharacterArc(BaseModel):
     id: str = Field(..., pattern=r'^[a-z][a-z0-9_]*$', max_length=30)
     name: str = Field(..., min_length=1, max_length=50)
     suggested_for: list[str] = Field(default_factory=list)
-    milestones: list[str] = Field(..., min_items=2, max_items=5)
+    milestones: list[str] = Field(..., min_length=2, max_length=5)
     reward: ArcReward
 
 
@@ -408,13 +415,14 @@ class CampaignContent(BaseModel):
     tone: str = Field(..., min_length=3, max_length=100, description="Short phrase or comma-separated tags")
 
     threat: Threat
-    npcs: list[NPC] = Field(..., min_items=2, max_items=10)
-    locations: list[Location] = Field(..., min_items=2, max_items=10)
-    beats: list[Beat] = Field(..., min_items=3, max_items=10)
+    npcs: list[NPC] = Field(..., min_length=2, max_length=10)
+    locations: list[Location] = Field(..., min_length=2, max_length=10)
+    beats: list[Beat] = Field(..., min_length=3, max_length=10)
     character_arcs: list[CharacterArc] = Field(default_factory=list)
 
-    @validator('beats')
-    def validate_beat_prerequisites(cls, v, values):
+    @field_validator('beats')
+    @classmethod
+    def validate_beat_prerequisites(cls, v):
         """Ensure prerequisites reference valid beat IDs"""
         beat_ids = {beat.id for beat in v}
         for beat in v:
@@ -480,6 +488,12 @@ class CampaignState(BaseModel):
         }
 
 
+# Compiled once at import; use these on hot load paths instead of Model(**data)
+CONTENT_ADAPTER = TypeAdapter(CampaignContent)
+STATE_ADAPTER = TypeAdapter(CampaignState)
+DM_PREP_ADAPTER = TypeAdapter(DMPrepData)
+
+
 # === Validation Helpers ===
 
 class ValidationResult(BaseModel):
@@ -528,24 +542,24 @@ def validate_campaign_content(data: dict) -> ValidationResult:
 
 def content_to_yaml(content: CampaignContent) -> str:
     """Serialize campaign content to YAML"""
-    data = content.dict()
+    data = content.model_dump()
     return yaml.dump(data, default_flow_style=False, allow_unicode=True, sort_keys=False)
 
 
 def content_from_yaml(yaml_str: str) -> CampaignContent:
     """Deserialize campaign content from YAML"""
     data = yaml.safe_load(yaml_str)
-    return CampaignContent(**data)
+    return CONTENT_ADAPTER.validate_python(data)
 
 
 def content_to_json(content: CampaignContent) -> str:
     """Serialize campaign content to JSON"""
-    return content.json(indent=2)
+    return content.model_dump_json(indent=2)
 
 
 def content_from_json(json_str: str) -> CampaignContent:
     """Deserialize campaign content from JSON"""
-    return CampaignContent.parse_raw(json_str)
+    return CONTENT_ADAPTER.validate_json(json_str)
 
 
 # === Example Content ===
@@ -0,0 +1,93 @@
+"""
+Cancel in-flight model and image calls when the client goes away
+
+Routes that make upstream calls run their sync work through
+run_until_disconnect, which polls the ASGI connection and cancels a
+CancelToken when the client disconnects. The work passes the token down to
+ai_calls, which checks it between streamed chunks and prediction polls and
+aborts the upstream request. Work that was cut short raises Cancelled,
+carrying whatever partial text was produced so the route can record it.
+"""
+
+import asyncio
+import threading
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+DISCONNECT_POLL_SECONDS = 0.25
+
+# Non-standard (nginx) status for "client closed request"; nobody is there to read it
+CLIENT_CLOSED_REQUEST = 499
+
+
+class Cancelled(BaseException):
+    """
+    The upstream call was abandoned because nobody is waiting for its result.
+
+    A BaseException, like asyncio.CancelledError, so the broad
+    `except Exception` fallbacks around model calls let it through.
+    """
+
+    def __init__(self, partial: str = ""):
+        super().__init__("cancelled: client disconnected")
+        self.partial = partial
+
+
+class CancelToken:
+    """Set when the request that owns it has disconnected"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self, partial: str = ""):
+        if self.cancelled:
+            raise Cancelled(partial)
+
+
+class SharedCancelToken(CancelToken):
+    """
+    Cancelled only once every attached request has disconnected, for work whose
+    result several requests are waiting on (see idempotency.run_idempotent).
+    """
+
+    def __init__(self, token: Optional[CancelToken] = None):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._tokens = [token or CancelToken()]
+
+    def attach(self, token: Optional[CancelToken]):
+        with self._lock:
+            self._tokens.append(token or CancelToken())
+
+    @property
+    def cancelled(self) -> bool:
+        with self._lock:
+            return self._event.is_set() or all(t.cancelled for t in self._tokens)
+
+
+async def run_until_disconnect(request: Request, fn: Callable[[CancelToken], object]):
+    """
+    Run fn(token) in the threadpool, cancelling the token if the client disconnects.
+
+    A cancelled call answers 499; the client is gone, so the status only shows
+    up in access logs.
+    """
+    token = CancelToken()
+    work = asyncio.ensure_future(run_in_threadpool(fn, token))
+    while not work.done():
+        await asyncio.wait({work}, timeout=DISCONNECT_POLL_SECONDS)
+        if not work.done() and not token.cancelled and await request.is_disconnected():
+            token.cancel()
+    try:
+        return await work
+    except Cancelled:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
@@ -4,10 +4,62 @@ Path constants and directory initialization for Weave
 
 import os
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+# WEAVE_DATA_DIR moves campaign data elsewhere (e.g. a volume, or a load test's temp directory)
+DATA_DIR = os.getenv("WEAVE_DATA_DIR") or os.path.join(os.path.dirname(__file__), "data")
 PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "prompts")
 IMAGES_DIR = os.path.join(DATA_DIR, "images")
-TEMPLATES_DIR = os.path.join(DATA_DIR, "templates")
+# Templates ship with the code, so they stay put when DATA_DIR moves
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "data", "templates")
 
 # Ensure images directory exists
 os.makedirs(IMAGES_DIR, exist_ok=True)
+
+# Opt-in: keep active campaigns' session, roster and state in per-campaign
+# in-memory actors (see campaign_actors.py). Requires a single worker process.
+CAMPAIGN_ACTORS = os.getenv("WEAVE_CAMPAIGN_ACTORS", "").lower() in ("1", "true", "yes")
+CAMPAIGN_ACTOR_CHECKPOINT_SECONDS = float(os.getenv("WEAVE_CAMPAIGN_ACTOR_CHECKPOINT_SECONDS", "5"))
+
+# Opt-in: ending a session of an authored campaign also completes an episode
+# (advance the threat if no beat was hit, bump the count, expire beats)
+ADVANCE_EPISODE_ON_SESSION_END = os.getenv("WEAVE_ADVANCE_EPISODE_ON_SESSION_END", "").lower() in ("1", "true", "yes")
+
+# Encoding for documents written through helpers (see storage_codec.py):
+# "pretty" (indented JSON), "json" (compact), "msgpack" or "zstd". Existing
+# files are read whatever they were written with.
+STORAGE_CODEC = os.getenv("WEAVE_STORAGE_CODEC", "pretty")
+# Per-file overrides by file name pattern, e.g. "current_session.json=zstd,archive/*=msgpack"
+STORAGE_CODEC_OVERRIDES = os.getenv("WEAVE_STORAGE_CODEC_OVERRIDES", "")
+
+# How long a finished request's result is replayed for a retried Idempotency-Key
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("WEAVE_IDEMPOTENCY_TTL_SECONDS", "600"))
+
+# Claude call scheduling (see llm_scheduler.py). Concurrency is the most calls
+# in flight at once; it shrinks on 429s and grows back to this. The token
+# budgets (per minute) apply until the API's rate-limit headers report the
+# real ones; 0 means no limit until then.
+LLM_MAX_CONCURRENCY = int(os.getenv("WEAVE_LLM_MAX_CONCURRENCY", "4"))
+LLM_INPUT_TOKENS_PER_MINUTE = float(os.getenv("WEAVE_LLM_INPUT_TOKENS_PER_MINUTE", "0"))
+LLM_OUTPUT_TOKENS_PER_MINUTE = float(os.getenv("WEAVE_LLM_OUTPUT_TOKENS_PER_MINUTE", "0"))
+
+# Time budget for a whole DM turn: the reply, then the optional illustration
+# (image prompt, render, download), which is skipped when too little is left
+DM_TURN_BUDGET_SECONDS = float(os.getenv("WEAVE_DM_TURN_BUDGET_SECONDS", "20"))
+
+# Requests slower than this log a JSON line with their stage timings (see metrics.py)
+SLOW_REQUEST_SECONDS = float(os.getenv("WEAVE_SLOW_REQUEST_SECONDS", "10"))
+
+# Opt-in: write a replayable trace of every DM turn, prep coach message and
+# field generation under this directory (see turn_traces.py)
+RECORD_TRACES_DIR = os.getenv("WEAVE_RECORD_TRACES_DIR", "")
+
+# Provider API endpoints, for pointing the backend at stand-ins such as
+# fake_providers.py; empty means the SDK defaults
+ANTHROPIC_BASE_URL = os.getenv("WEAVE_ANTHROPIC_BASE_URL", "")
+REPLICATE_BASE_URL = os.getenv("WEAVE_REPLICATE_BASE_URL", "")
+
+# Token for the admin endpoints (profiling; see admin_auth.py). Empty disables them.
+ADMIN_TOKEN = os.getenv("WEAVE_ADMIN_TOKEN", "")
+# Opt-in: sample every route's stacks every this many milliseconds from startup (see profiling.py); 0 is off
+PROFILE_CONTINUOUS_MS = float(os.getenv("WEAVE_PROFILE_CONTINUOUS_MS", "0"))
+# Import the lazily loaded SDKs on a background thread once the app is up (see lazy_imports.py)
+PREWARM_IMPORTS = os.getenv("WEAVE_PREWARM_IMPORTS", "1").lower() in ("1", "true", "yes")
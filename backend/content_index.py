@@ -0,0 +1,292 @@
+"""
+In-memory inverted index over a campaign's authored content and DM prep notes
+"""
+
+import bisect
+import os
+import re
+import threading
+from typing import Optional
+
+from campaign_schema import CampaignContent, DMPrepData, DMPrepNote
+from helpers import get_campaign_dir
+from metrics import cache_lookup
+from memory_report import register_cache
+
+_TERM_RE = re.compile(r"[\w']+", re.UNICODE)
+
+# Matches in a document's title count for more than matches in its body
+TITLE_WEIGHT = 3
+
+
+def tokenize(text: str) -> list:
+    return _TERM_RE.findall(text.lower())
+
+
+def _content_documents(content: CampaignContent) -> list:
+    """Flatten authored content into searchable documents"""
+    docs = []
+    threat = content.threat
+    docs.append({
+        "id": "threat",
+        "kind": "threat",
+        "category": "threat",
+        "related_to": threat.name,
+        "title": threat.name,
+        "text": " ".join(threat.stages),
+    })
+    for npc in content.npcs:
+        docs.append({
+            "id": f"npc:{npc.name}",
+            "kind": "npc",
+            "category": "npc",
+            "related_to": npc.name,
+            "title": npc.name,
+            "text": f"{npc.species} {npc.role} {npc.wants} {npc.secret}",
+        })
+    for loc in content.locations:
+        docs.append({
+            "id": f"location:{loc.name}",
+            "kind": "location",
+            "category": "location",
+            "related_to": loc.name,
+            "title": loc.name,
+            "text": f"{loc.vibe} {' '.join(loc.contains)}",
+        })
+    for beat in content.beats:
+        docs.append({
+            "id": f"beat:{beat.id}",
+            "kind": "beat",
+            "category": "beat",
+            "related_to": beat.id,
+            "title": beat.id.replace("_", " "),
+            "text": f"{beat.description} {beat.revelation}",
+        })
+        for i, hint in enumerate(beat.hints):
+            docs.append({
+                "id": f"hint:{beat.id}:{i}",
+                "kind": "hint",
+                "category": "hint",
+                "related_to": beat.id,
+                "title": "",
+                "text": hint,
+            })
+    for arc in content.character_arcs:
+        docs.append({
+            "id": f"arc:{arc.id}",
+            "kind": "character_arc",
+            "category": "character_arc",
+            "related_to": arc.id,
+            "title": arc.name,
+            "text": f"{' '.join(arc.milestones)} {arc.reward.name} {arc.reward.description}",
+        })
+    return docs
+
+
+def _note_document(note: DMPrepNote, pinned: bool) -> dict:
+    return {
+        "id": f"{'pin' if pinned else 'note'}:{note.id}",
+        "kind": "pin" if pinned else "note",
+        "category": note.category,
+        "related_to": note.related_to,
+        "title": "",
+        "text": note.content,
+        "note_id": note.id,
+        "created_at": note.created_at,
+    }
+
+
+class CampaignSearchIndex:
+    """Inverted index with prefix lookup over one campaign's content and notes"""
+
+    def __init__(self):
+        self.docs: dict = {}
+        self.postings: dict = {}
+        self.terms: list = []  # sorted, for prefix lookup
+        self.mtimes: dict = {}
+
+    def _add(self, doc: dict):
+        self.docs[doc["id"]] = doc
+        weights: dict = {}
+        for term in tokenize(doc["title"]):
+            weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(doc["text"]):
+            weights[term] = weights.get(term, 0) + 1
+        doc["_terms"] = weights
+        for term, weight in weights.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                bisect.insort(self.terms, term)
+            self.postings[term][doc["id"]] = weight
+
+    def _remove(self, doc_id: str):
+        doc = self.docs.pop(doc_id, None)
+        if not doc:
+            return
+        for term in doc["_terms"]:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+                self.terms.pop(bisect.bisect_left(self.terms, term))
+
+    def set_content(self, content: Optional[CampaignContent]):
+        """Replace every content document (notes are left alone)"""
+        for doc_id in [d for d, doc in self.docs.items() if doc["kind"] not in ("note", "pin")]:
+            self._remove(doc_id)
+        if content:
+            for doc in _content_documents(content):
+                self._add(doc)
+
+    def set_notes(self, prep_data: DMPrepData):
+        """Sync note documents with prep data, touching only notes that were added, edited, or deleted"""
+        wanted = {}
+        for note in prep_data.author_notes:
+            doc = _note_document(note, pinned=False)
+            wanted[doc["id"]] = doc
+        for note in prep_data.pinned:
+            doc = _note_document(note, pinned=True)
+            wanted[doc["id"]] = doc
+
+        for doc_id in [d for d, doc in self.docs.items() if doc["kind"] in ("note", "pin") and d not in wanted]:
+            self._remove(doc_id)
+        for doc_id, doc in wanted.items():
+            current = self.docs.get(doc_id)
+            if current and all(current[k] == doc[k] for k in ("text", "category", "related_to")):
+                continue
+            self._remove(doc_id)
+            self._add(doc)
+
+    def _expand(self, prefix: str) -> dict:
+        """Merge postings for every indexed term starting with prefix"""
+        matches: dict = {}
+        i = bisect.bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            for doc_id, weight in self.postings[self.terms[i]].items():
+                # Exact term matches outrank prefix completions
+                score = weight * 2 if self.terms[i] == prefix else weight
+                matches[doc_id] = max(matches.get(doc_id, 0), score)
+            i += 1
+        return matches
+
+    def search(
+        self,
+        query: str = "",
+        kind: Optional[str] = None,
+        category: Optional[str] = None,
+        related_to: Optional[str] = None,
+    ) -> list:
+        """
+        Return matching documents, best first.
+
+        Every query term must match (as a prefix) somewhere in the document.
+        An empty query returns all documents that pass the filters, notes
+        oldest first. Ties are broken by creation time.
+        """
+        terms = tokenize(query)
+        if terms:
+            scores = self._expand(terms[0])
+            for term in terms[1:]:
+                matches = self._expand(term)
+                scores = {doc_id: score + matches[doc_id] for doc_id, score in scores.items() if doc_id in matches}
+                if not scores:
+                    break
+        else:
+            scores = {doc_id: 0 for doc_id in self.docs}
+
+        related = related_to.lower() if related_to else None
+        results = []
+        for doc_id, score in scores.items():
+            doc = self.docs[doc_id]
+            if kind and doc["kind"] != kind:
+                continue
+            if category and doc["category"] != category:
+                continue
+            if related and (doc["related_to"] or "").lower() != related:
+                continue
+            result = {k: v for k, v in doc.items() if not k.startswith("_")}
+            result["score"] = score
+            results.append(result)
+
+        results.sort(key=lambda r: (-r["score"], r.get("created_at") or "", r["id"]))
+        return results
+
+
+# === Per-campaign registry ===
+
+_indexes: dict = {}
+_lock = threading.Lock()
+
+_SOURCE_FILES = ("campaign.json", "dm_prep.json")
+
+
+def _source_mtimes(campaign_id: str) -> dict:
+    mtimes = {}
+    for filename in _SOURCE_FILES:
+        path = os.path.join(get_campaign_dir(campaign_id), filename)
+        mtimes[path] = os.path.getmtime(path) if os.path.exists(path) else None
+    return mtimes
+
+
+def get_campaign_index(campaign_id: str) -> CampaignSearchIndex:
+    """
+    Return the campaign's index, building it on first use.
+
+    The index is rebuilt if campaign.json or dm_prep.json changed on disk since it
+    was last synced (e.g. written by another worker process). A campaign with
+    neither file gets an empty index that is not cached, so lookups of unknown
+    campaign ids do not grow the cache.
+    """
+    # Imported here to avoid a cycle: campaign_logic calls back into this module on save
+    from campaign_logic import load_campaign_content, load_dm_prep_data
+
+    mtimes = _source_mtimes(campaign_id)
+    if all(mtime is None for mtime in mtimes.values()):
+        with _lock:
+            _indexes.pop(campaign_id, None)
+        return CampaignSearchIndex()
+    with _lock:
+        index = _indexes.get(campaign_id)
+        if index is not None and index.mtimes == mtimes:
+            cache_lookup("search_index", hit=True)
+            return index
+    cache_lookup("search_index", hit=False)
+
+    # Load outside the lock: loading may upgrade and save a document, which calls back into on_*_saved
+    index = CampaignSearchIndex()
+    index.set_content(load_campaign_content(campaign_id))
+    index.set_notes(load_dm_prep_data(campaign_id))
+    index.mtimes = mtimes
+    with _lock:
+        _indexes[campaign_id] = index
+    return index
+
+
+def _with_loaded_index(campaign_id: str, update):
+    """Apply an incremental update if the index is in memory; otherwise it is built lazily on next search"""
+    with _lock:
+        index = _indexes.get(campaign_id)
+        if index is None:
+            return
+        update(index)
+        index.mtimes = _source_mtimes(campaign_id)
+
+
+def on_content_saved(campaign_id: str, content: CampaignContent):
+    _with_loaded_index(campaign_id, lambda index: index.set_content(content))
+
+
+def on_prep_saved(campaign_id: str, prep_data: DMPrepData):
+    _with_loaded_index(campaign_id, lambda index: index.set_notes(prep_data))
+
+
+def drop_campaign_index(campaign_id: str):
+    with _lock:
+        _indexes.pop(campaign_id, None)
+
+
+register_cache("search_index", lambda: {
+    campaign_id: (index.docs, index.postings, index.terms) for campaign_id, index in dict(_indexes).items()
+})
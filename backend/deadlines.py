@@ -0,0 +1,54 @@
+"""
+Time budgets for requests that chain several upstream calls
+
+A DM turn can make four blocking calls in a row: the Claude reply, the Haiku
+image prompt, the Flux render and the image download. They share one
+Deadline, started when the turn starts. Each call takes its timeout from the
+time left and raises DeadlineExceeded once it runs out. Optional stages are
+skipped when too little time is left to finish them. The stages that were
+skipped or cut short are recorded on the deadline, so the response can say
+what it is missing.
+"""
+
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """A stage ran out of budget. partial holds any text it produced first."""
+
+    def __init__(self, stage: str, partial: str = ""):
+        super().__init__(f"{stage} ran out of time")
+        self.stage = stage
+        self.partial = partial
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.degraded: list = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, seconds: float) -> bool:
+        """Whether a stage expected to take `seconds` can still finish in time"""
+        return self.remaining() >= seconds
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Timeout for the next blocking call: the time left, no more than cap"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(cap, remaining)
+
+    def check(self, stage: str, partial: str = ""):
+        if self.expired:
+            raise DeadlineExceeded(stage, partial)
+
+    def degrade(self, stage: str):
+        """Record that stage was skipped or cut short"""
+        if stage not in self.degraded:
+            self.degraded.append(stage)
@@ -261,6 +261,38 @@ def format_author_notes_for_dm(notes: list) -> str:
     return section
 
 
+def format_play_memory_for_dm(moments: list, latest_recap: Optional[dict] = None, max_moment_chars: int = 400) -> str:
+    """
+    Format recalled moments from earlier episodes for the gameplay DM context.
+
+    Args:
+        moments: Moment dicts from play_memory.recall_moments()
+        latest_recap: Optional {"episode", "recap"} for the previous episode
+        max_moment_chars: Per-moment cap that keeps the section at a fixed token cost
+
+    Returns:
+        Formatted markdown string for DM system prompt
+    """
+    if not moments and not latest_recap:
+        return ""
+
+    section = "## From Earlier Episodes\n\n*Stay consistent with what already happened at the table:*\n"
+
+    if latest_recap:
+        section += f"\n**Last time (episode {latest_recap['episode']}):** {latest_recap['recap']}\n"
+
+    if moments:
+        section += "\n### Relevant Past Moments\n"
+        for moment in moments:
+            text = moment['text']
+            if len(text) > max_moment_chars:
+                text = text[:max_moment_chars].rstrip() + "..."
+            text = text.replace("\n", " / ")
+            section += f"- *(episode {moment['episode']})* {text}\n"
+
+    return section
+
+
 def build_dm_system_injection(dm_context: dict, party_status: Optional[dict] = None, author_notes: Optional[list] = None) -> str:
     """
     Build the campaign-specific portion of the DM system prompt.
@@ -348,8 +380,9 @@ def build_dm_system_injection(dm_context: dict, party_status: Optional[dict] = N
     # Locations
     if campaign.get('locations'):
         loc_section = "## Key Locations\n"
+        locations_visited = set(dm_context.get('locations_visited', []))
         for loc in campaign['locations']:
-            visited = "✓ visited" if loc['name'] in dm_context.get('locations_visited', []) else ""
+            visited = "✓ visited" if loc['name'] in locations_visited else ""
             loc_section += f"\n### {loc['name']} {visited}\n*{loc['vibe']}*\nContains: {', '.join(loc['contains'])}\n"
         sections.append(loc_section)
     
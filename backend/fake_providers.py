@@ -0,0 +1,266 @@
+"""
+Local stand-ins for the Anthropic Messages API and Replicate predictions, for offline load tests
+
+Serves the subset of both APIs the backend uses:
+
+    POST /v1/messages                              Messages API, streamed (SSE) or not, with usage
+    POST /v1/models/{owner}/{name}/predictions     start a prediction
+    GET  /v1/predictions/{id}                      poll it; it succeeds once its render time is up
+    POST /v1/predictions/{id}/cancel
+    GET  /files/{name}.webp                        the rendered image
+
+Replies are made up from the request, so the same request always gets the same
+text, and the same prompt always renders the same image bytes. Latencies are
+drawn from a log-normal distribution around the configured medians
+(latency_sigma 0 makes them fixed), and a share of requests can be failed
+with a 429 (rate limited, with Retry-After) or a 5xx.
+
+Point the backend at it with WEAVE_ANTHROPIC_BASE_URL and
+WEAVE_REPLICATE_BASE_URL (e.g. http://127.0.0.1:8090). The Anthropic SDK
+still wants ANTHROPIC_API_KEY set; any value does. Run from backend/:
+
+    python fake_providers.py [--port 8090] [--first-token-ms 400] [--tokens-per-second 80] [--error-rate 0.02] ...
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+
+CHARS_PER_TOKEN = 4
+
+_WORDS = (
+    "the", "moss", "lantern", "heron", "glows", "softly", "over", "a", "quiet", "pond", "where",
+    "reeds", "whisper", "and", "old", "roots", "twist", "beneath", "amber", "light", "your",
+    "party", "hears", "distant", "bells", "as", "mist", "curls", "around", "stones", "of", "the",
+    "hollow", "path", "toward", "an", "ancient", "willow",
+)
+
+
+class FakeProviderSettings(BaseModel):
+    seed: int = Field(0, description="Seed for latencies and injected errors")
+    first_token_ms: float = Field(400, description="Median time to the first streamed token")
+    tokens_per_second: float = Field(80, description="Output token rate once streaming")
+    output_tokens: int = Field(250, description="Reply length in tokens (capped by max_tokens)")
+    chunk_tokens: int = Field(4, description="Tokens per streamed text delta")
+    render_ms: float = Field(1500, description="Median time for a prediction to succeed")
+    latency_sigma: float = Field(0.4, description="Log-normal spread of every latency (0: fixed)")
+    error_rate: float = Field(0.0, description="Share of requests failed with a 5xx")
+    rate_limit_rate: float = Field(0.0, description="Share of requests failed with a 429")
+    retry_after_seconds: float = Field(1.0, description="Retry-After sent with a 429")
+    scene_rate: float = Field(0.5, description="Share of replies to system-prompted calls ending in a [SCENE: ...] tag")
+    image_bytes: int = Field(48_000, description="Size of each rendered image")
+
+
+def _latency(rng: random.Random, median_ms: float, sigma: float) -> float:
+    """Seconds, log-normally distributed around median_ms"""
+    return median_ms / 1000 * (rng.lognormvariate(0, sigma) if sigma > 0 else 1)
+
+
+def _input_tokens(body: dict) -> int:
+    system = body.get("system") or ""
+    chars = len(system if isinstance(system, str) else json.dumps(system))
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        chars += len(content if isinstance(content, str) else json.dumps(content))
+    return chars // CHARS_PER_TOKEN + 1
+
+
+def _reply_words(body: dict, settings: FakeProviderSettings) -> list:
+    """The reply to a Messages request, as word-sized chunks; the same request always gets the same reply"""
+    rng = random.Random(hashlib.sha256(json.dumps(body, sort_keys=True).encode()).digest())
+    prompt = json.dumps(body.get("messages", []))
+    if "JSON object" in prompt:
+        # Field generation parses the reply; an empty object generates nothing but is valid
+        return ["{}"]
+    count = max(1, min(settings.output_tokens, body.get("max_tokens", settings.output_tokens)))
+    words = [rng.choice(_WORDS) + " " for _ in range(count)]
+    if body.get("system") and rng.random() < settings.scene_rate and count > 12:
+        words[-10:] = ["[SCENE: "] + [rng.choice(_WORDS) + " " for _ in range(8)] + ["]"]
+    return words
+
+
+def image_bytes(prompt: str, size: int, seed: int = 0) -> bytes:
+    """A WebP-framed blob of size bytes, the same for the same prompt"""
+    digest = hashlib.sha256(f"{seed}:{prompt}".encode()).digest()
+    body = bytearray()
+    while len(body) < size - 16:
+        digest = hashlib.sha256(digest).digest()
+        body.extend(digest)
+    body = bytes(body[: max(size - 16, 0)])
+    return b"RIFF" + (len(body) + 8).to_bytes(4, "little") + b"WEBPVP8 " + body
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def create_app(settings: Optional[FakeProviderSettings] = None) -> FastAPI:
+    settings = settings or FakeProviderSettings()
+    rng = random.Random(settings.seed)
+    predictions: dict = {}
+    # image name -> the prompt it was rendered from
+    images: dict = {}
+    app = FastAPI(title="Weave fake providers")
+
+    def injected_error(kind: str) -> Optional[Response]:
+        """A 429 or 5xx for this request, at the configured rates"""
+        roll = rng.random()
+        if roll < settings.rate_limit_rate:
+            status, error_type = 429, "rate_limit_error"
+        elif roll < settings.rate_limit_rate + settings.error_rate:
+            status, error_type = (529, "overloaded_error") if kind == "anthropic" else (500, "api_error")
+        else:
+            return None
+        headers = {"retry-after": f"{settings.retry_after_seconds:g}"} if status == 429 else {}
+        if kind == "anthropic":
+            content = {"type": "error", "error": {"type": error_type, "message": "Injected by fake_providers"}}
+        else:
+            content = {"title": error_type, "detail": "Injected by fake_providers", "status": status}
+        return JSONResponse(content, status_code=status, headers=headers)
+
+    # === Anthropic ===
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        error = injected_error("anthropic")
+        if error is not None:
+            return error
+        body = await request.json()
+        words = _reply_words(body, settings)
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+        usage = {
+            "input_tokens": _input_tokens(body),
+            "output_tokens": len(words),
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+        }
+        message = {
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", ""),
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+        }
+        first_token = _latency(rng, settings.first_token_ms, settings.latency_sigma)
+        chunk_seconds = settings.chunk_tokens / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token + chunk_seconds * len(words) / settings.chunk_tokens)
+            return {**message, "content": [{"type": "text", "text": "".join(words)}], "usage": usage}
+
+        async def events():
+            await asyncio.sleep(first_token)
+            yield _sse("message_start", {"type": "message_start", "message": {
+                **message, "content": [], "stop_reason": None, "usage": {**usage, "output_tokens": 1},
+            }})
+            yield _sse("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            for start in range(0, len(words), settings.chunk_tokens):
+                text = "".join(words[start:start + settings.chunk_tokens])
+                yield _sse("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}})
+                await asyncio.sleep(chunk_seconds)
+            yield _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield _sse("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": len(words)},
+            })
+            yield _sse("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"request-id": message_id})
+
+    # === Replicate ===
+
+    def prediction_json(prediction: dict, request: Request) -> dict:
+        if prediction["status"] in ("starting", "processing") and time.monotonic() >= prediction["ready_at"]:
+            prediction.update(status="succeeded", completed_at=datetime.utcnow().isoformat() + "Z")
+        base = str(request.base_url).rstrip("/")
+        data = {key: value for key, value in prediction.items() if key not in ("ready_at", "image")}
+        data["urls"] = {
+            "get": f"{base}/v1/predictions/{prediction['id']}",
+            "cancel": f"{base}/v1/predictions/{prediction['id']}/cancel",
+        }
+        data["output"] = [f"{base}/files/{prediction['image']}.webp"] if prediction["status"] == "succeeded" else None
+        return data
+
+    @app.post("/v1/models/{owner}/{name}/predictions", status_code=201)
+    async def create_prediction(owner: str, name: str, request: Request):
+        error = injected_error("replicate")
+        if error is not None:
+            return error
+        body = await request.json()
+        prompt = str(body.get("input", {}).get("prompt", ""))
+        prediction = {
+            "id": uuid.uuid4().hex[:20],
+            "model": f"{owner}/{name}",
+            "version": "fake",
+            "status": "starting",
+            "input": body.get("input"),
+            "output": None,
+            "logs": "",
+            "error": None,
+            "metrics": {},
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "started_at": None,
+            "completed_at": None,
+            "ready_at": time.monotonic() + _latency(rng, settings.render_ms, settings.latency_sigma),
+            # Images are named by prompt, so the same prompt serves the same bytes
+            "image": hashlib.sha256(f"{settings.seed}:{prompt}".encode()).hexdigest()[:24],
+        }
+        predictions[prediction["id"]] = prediction
+        images[prediction["image"]] = prompt
+        return prediction_json(prediction, request)
+
+    @app.get("/v1/predictions/{prediction_id}")
+    async def get_prediction(prediction_id: str, request: Request):
+        prediction = predictions.get(prediction_id)
+        if prediction is None:
+            return JSONResponse({"detail": "Not found"}, status_code=404)
+        return prediction_json(prediction, request)
+
+    @app.post("/v1/predictions/{prediction_id}/cancel")
+    async def cancel_prediction(prediction_id: str, request: Request):
+        prediction = predictions.get(prediction_id)
+        if prediction is None:
+            return JSONResponse({"detail": "Not found"}, status_code=404)
+        if prediction["status"] in ("starting", "processing"):
+            prediction["status"] = "canceled"
+        return prediction_json(prediction, request)
+
+    @app.get("/files/{name}.webp")
+    async def image_file(name: str):
+        prompt = images.get(name)
+        if prompt is None:
+            return JSONResponse({"detail": "Not found"}, status_code=404)
+        return Response(image_bytes(prompt, settings.image_bytes, settings.seed), media_type="image/webp")
+
+    return app
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve fake Anthropic and Replicate APIs for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    for name, field in FakeProviderSettings.model_fields.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=field.annotation, default=field.default, help=field.description)
+    args = vars(parser.parse_args(argv))
+    host, port = args.pop("host"), args.pop("port")
+
+    import uvicorn
+    uvicorn.run(create_app(FakeProviderSettings(**args)), host=host, port=port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
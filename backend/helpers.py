@@ -2,26 +2,22 @@
 File I/O and campaign data helpers
 """
 
-import json
 import os
 
 from config import DATA_DIR, PROMPTS_DIR
+from storage_codec import codec_for, read_document, write_document
 
 
 def load_json(filename: str) -> dict:
     filepath = os.path.join(DATA_DIR, filename)
     if os.path.exists(filepath):
-        with open(filepath, "r") as f:
-            return json.load(f)
+        return read_document(filepath)
     return {}
 
 def save_json(filename: str, data: dict):
     filepath = os.path.join(DATA_DIR, filename)
-    temp_filepath = filepath + ".tmp"
     # Atomic write: write to temp file, then rename
-    with open(temp_filepath, "w") as f:
-        json.dump(data, f, indent=2)
-    os.replace(temp_filepath, filepath)
+    write_document(filepath, data, codec_for(filename))
 
 def load_prompt(filename: str) -> str:
     filepath = os.path.join(PROMPTS_DIR, filename)
@@ -38,22 +34,18 @@ def get_campaign_dir(campaign_id: str) -> str:
     return os.path.join(DATA_DIR, "campaigns", campaign_id)
 
 def load_campaign_json(campaign_id: str, filename: str) -> dict:
-    """Load JSON from a campaign's data directory"""
+    """Load a document from a campaign's data directory, in whichever codec it was saved"""
     filepath = os.path.join(get_campaign_dir(campaign_id), filename)
     if os.path.exists(filepath):
-        with open(filepath, "r") as f:
-            return json.load(f)
+        return read_document(filepath)
     return {}
 
 def save_campaign_json(campaign_id: str, filename: str, data: dict):
-    """Save JSON to a campaign's data directory"""
-    campaign_dir = get_campaign_dir(campaign_id)
-    os.makedirs(campaign_dir, exist_ok=True)
-    filepath = os.path.join(campaign_dir, filename)
-    temp_filepath = filepath + ".tmp"
-    with open(temp_filepath, "w") as f:
-        json.dump(data, f, indent=2)
-    os.replace(temp_filepath, filepath)
+    """Save a document to a campaign's data directory with the codec configured for filename"""
+    filepath = os.path.join(get_campaign_dir(campaign_id), filename)
+    # filename may include a subdirectory (e.g. archive/episode_001.json)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    write_document(filepath, data, codec_for(filename))
 
 def get_campaign_images_dir(campaign_id: str) -> str:
     """Get the images directory path for a campaign"""
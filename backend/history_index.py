@@ -0,0 +1,178 @@
+"""
+SQLite FTS5 index over archived session logs
+"""
+
+import html
+import os
+import re
+import sqlite3
+from typing import Optional
+
+from helpers import get_campaign_dir
+
+HISTORY_DB_FILE = "history.db"
+
+# Counting every match of a very common term costs more than ranking a page,
+# so totals above this are reported as a lower bound
+MAX_COUNTED_MATCHES = 1000
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "did", "do", "does", "for", "from",
+    "had", "has", "have", "he", "her", "his", "how", "i", "if", "in", "into", "is", "it", "its",
+    "me", "my", "of", "on", "or", "our", "she", "so", "that", "the", "their", "them", "then",
+    "there", "they", "this", "to", "up", "was", "we", "were", "what", "when", "where", "which",
+    "who", "why", "will", "with", "you", "your",
+}
+
+_TERM_RE = re.compile(r"[\w']+", re.UNICODE)
+
+# snippet() marks matches with these control characters; the text is HTML-escaped
+# before they become <mark> tags, so archived chat can't inject markup
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    text,
+    kind UNINDEXED,
+    role UNINDEXED,
+    episode UNINDEXED,
+    position UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS indexed_episodes (
+    episode INTEGER PRIMARY KEY
+);
+"""
+
+
+def _connect(campaign_id: str) -> sqlite3.Connection:
+    campaign_dir = get_campaign_dir(campaign_id)
+    os.makedirs(campaign_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(campaign_dir, HISTORY_DB_FILE))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def has_history_index(campaign_id: str) -> bool:
+    return os.path.exists(os.path.join(get_campaign_dir(campaign_id), HISTORY_DB_FILE))
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Turn free text ("when did we meet the heron?") into a safe FTS5 MATCH expression.
+
+    Terms are quoted so punctuation can't break the query syntax, OR-ed so bm25
+    ranks rows matching more terms first, and the last term matches as a prefix.
+    """
+    terms = [t for t in _TERM_RE.findall(query.lower()) if t not in STOPWORDS]
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " OR ".join(quoted)
+
+
+def extract_entries(record: dict) -> list:
+    """Searchable rows from an archived session: chat turns, roll purposes, and scene prompts"""
+    entries = []
+    for position, entry in enumerate(record.get("log", [])):
+        if entry.get("type") == "chat" and entry.get("content"):
+            entries.append(("chat", entry.get("role", ""), entry["content"], position))
+        elif entry.get("type") == "roll" and entry.get("purpose"):
+            threshold = f" ({entry['threshold']})" if entry.get("threshold") else ""
+            text = f"Rolled {entry.get('die', '')} for {entry['purpose']}: {entry.get('total', '')}{threshold}"
+            entries.append(("roll", "", text, position))
+    for position, image in enumerate(record.get("images", [])):
+        if image.get("prompt"):
+            entries.append(("scene", "", image["prompt"], position))
+    return entries
+
+
+def index_episode(campaign_id: str, record: dict) -> int:
+    """Add one archived episode to the index. Idempotent; returns rows added."""
+    episode = record["episode"]
+    conn = _connect(campaign_id)
+    try:
+        with conn:
+            already = conn.execute("SELECT 1 FROM indexed_episodes WHERE episode = ?", (episode,)).fetchone()
+            if already:
+                return 0
+            rows = [(text, kind, role, episode, position) for kind, role, text, position in extract_entries(record)]
+            conn.executemany(
+                "INSERT INTO history_fts (text, kind, role, episode, position) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("INSERT INTO indexed_episodes (episode) VALUES (?)", (episode,))
+            return len(rows)
+    finally:
+        conn.close()
+
+
+def _highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def indexed_episodes(campaign_id: str) -> set:
+    if not has_history_index(campaign_id):
+        return set()
+    conn = _connect(campaign_id)
+    try:
+        return {row[0] for row in conn.execute("SELECT episode FROM indexed_episodes")}
+    finally:
+        conn.close()
+
+
+def search_history(campaign_id: str, query: str, limit: int = 20, offset: int = 0, kind: Optional[str] = None) -> dict:
+    """
+    Ranked full-text search over archived sessions.
+
+    Returns {"total", "total_capped", "results"} where each result has episode,
+    kind, role, position, an HTML-escaped snippet with matches in <mark>, the
+    raw text, and its bm25 rank. A campaign with no index has no results.
+    """
+    match = build_match_query(query)
+    if not match or not has_history_index(campaign_id):
+        return {"total": 0, "total_capped": False, "results": []}
+
+    where = "history_fts MATCH ?"
+    params: list = [match]
+    if kind:
+        where += " AND kind = ?"
+        params.append(kind)
+
+    conn = _connect(campaign_id)
+    try:
+        total = conn.execute(
+            f"SELECT count(*) FROM (SELECT 1 FROM history_fts WHERE {where} LIMIT ?)",
+            params + [MAX_COUNTED_MATCHES + 1]
+        ).fetchone()[0]
+        rows = conn.execute(
+            f"""SELECT episode, kind, role, position, text,
+                       snippet(history_fts, 0, ?, ?, '…', 16),
+                       bm25(history_fts)
+                FROM history_fts WHERE {where}
+                ORDER BY bm25(history_fts)
+                LIMIT ? OFFSET ?""",
+            [_MARK_START, _MARK_END] + params + [limit, offset]
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return {
+        "total": min(total, MAX_COUNTED_MATCHES),
+        "total_capped": total > MAX_COUNTED_MATCHES,
+        "results": [
+            {
+                "episode": episode,
+                "kind": row_kind,
+                "role": role or None,
+                "position": position,
+                "snippet": _highlight(snippet),
+                "text": text,
+                "rank": rank,
+            }
+            for episode, row_kind, role, position, text, snippet, rank in rows
+        ],
+    }
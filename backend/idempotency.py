@@ -0,0 +1,131 @@
+"""
+Idempotency keys for endpoints that spend money on a model or image call
+
+A client that sends an Idempotency-Key header can retry a request safely:
+- a retry that arrives while the original is still running waits for it and
+  gets its result
+- a retry after it finished gets the stored result back, for
+  IDEMPOTENCY_TTL_SECONDS
+- a failed request is not stored, so the next retry runs it again
+
+Keys are scoped per campaign and kept in this process's memory, so they do
+not survive a restart and are not shared between worker processes. Reusing a
+key with a different request body is rejected with 422.
+
+The work is cancelled on disconnect only once the original request and every
+duplicate waiting on it have gone (cancellation.SharedCancelToken).
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+from fastapi import Header, HTTPException, Response
+
+import config
+from cancellation import Cancelled, CancelToken, SharedCancelToken
+from metrics import cache_lookup
+from memory_report import register_cache
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEYS_PER_SCOPE = 256
+
+
+class _Entry:
+    def __init__(self, fingerprint, token: Optional[CancelToken]):
+        self.fingerprint = fingerprint
+        self.token = SharedCancelToken(token)
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.expires_at: Optional[float] = None  # set when the result is stored
+
+
+# scope (campaign id, or "" for campaign-less endpoints) -> {key: _Entry}
+_scopes: dict = {}
+_lock = threading.Lock()
+
+
+def idempotency_key(idempotency_key: Optional[str] = Header(None, max_length=255)) -> Optional[str]:
+    """FastAPI dependency reading the optional Idempotency-Key header"""
+    return idempotency_key or None
+
+
+def _prune(entries: dict, now: float):
+    for key in [k for k, e in entries.items() if e.expires_at is not None and e.expires_at <= now]:
+        del entries[key]
+    # Oldest finished entries go first if a client floods the scope with keys
+    finished = sorted((e.expires_at, k) for k, e in entries.items() if e.expires_at is not None)
+    for _, key in finished[:max(0, len(entries) - MAX_KEYS_PER_SCOPE)]:
+        del entries[key]
+
+
+def run_idempotent(
+    scope: str,
+    key: Optional[str],
+    fingerprint,
+    fn: Callable[[CancelToken], object],
+    response: Optional[Response] = None,
+    token: Optional[CancelToken] = None,
+):
+    """
+    Run fn(cancel_token) once per (scope, key) and return its result.
+
+    fingerprint identifies the request (endpoint and body); a key reused with
+    a different fingerprint raises 422. Without a key, fn simply runs with
+    token. When the result is served to a duplicate, response gets an
+    Idempotent-Replayed header.
+    """
+    if key is None:
+        return fn(token or CancelToken())
+
+    while True:
+        with _lock:
+            entries = _scopes.setdefault(scope, {})
+            _prune(entries, time.monotonic())
+            entry = entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = entries[key] = _Entry(fingerprint, token)
+            elif entry.fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            else:
+                entry.token.attach(token)
+        cache_lookup("idempotency", hit=not owner)
+        if owner:
+            break
+        entry.done.wait()
+        if isinstance(entry.error, Cancelled) and not (token and token.cancelled):
+            # Every client had gone when the original was cancelled, then this one arrived: run it again
+            continue
+        if entry.error is not None:
+            raise entry.error
+        if response is not None:
+            response.headers[REPLAYED_HEADER] = "true"
+        return entry.result
+
+    try:
+        entry.result = fn(entry.token)
+    except BaseException as e:
+        entry.error = e
+        with _lock:
+            # Not stored: the next retry runs the request again
+            if _scopes.get(scope, {}).get(key) is entry:
+                del _scopes[scope][key]
+        raise
+    finally:
+        if entry.error is None:
+            entry.expires_at = time.monotonic() + config.IDEMPOTENCY_TTL_SECONDS
+        entry.done.set()
+    return entry.result
+
+
+def drop_campaign_keys(campaign_id: str):
+    with _lock:
+        _scopes.pop(campaign_id, None)
+
+
+# Sized by stored results; the entries' tokens and events are small
+register_cache("idempotency", lambda: {
+    scope: {key: entry.result for key, entry in dict(entries).items()} for scope, entries in dict(_scopes).items()
+})
@@ -0,0 +1,75 @@
+"""
+Heavy SDKs loaded on first use instead of at startup
+
+`anthropic = LazyModule("anthropic")` stands in for the module: the first
+attribute read imports it, and every read after that goes to the real module.
+Attribute writes go to the real module too, so tests that patch
+`ai_calls.anthropic.Anthropic` patch the SDK exactly as they did with a plain
+import.
+
+Together these SDKs (the Anthropic SDK above all) take most of the time
+`import main` takes. Code that only needs to recognise their exceptions
+checks `.loaded` first: an error from a module that was never imported
+cannot be one of its errors.
+
+prewarm() imports every lazy module; main.py runs it on a background thread
+once the app is up (config.PREWARM_IMPORTS), so the first DM turn does not pay
+for the import. See benchmarks/startup.py for the import-time report.
+"""
+
+import importlib
+import logging
+import sys
+import threading
+
+log = logging.getLogger(__name__)
+
+_registered: list = []
+
+
+class LazyModule:
+    """A module imported on first attribute access"""
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+        if name not in _registered:
+            _registered.append(name)
+
+    @property
+    def loaded(self) -> bool:
+        return self._name in sys.modules
+
+    def _module(self):
+        module = self.__dict__.get("_imported")
+        if module is None:
+            module = importlib.import_module(self._name)
+            object.__setattr__(self, "_imported", module)
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._module(), attr)
+
+    def __setattr__(self, attr: str, value):
+        setattr(self._module(), attr, value)
+
+    def __delattr__(self, attr: str):
+        delattr(self._module(), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}{' (loaded)' if self.loaded else ''}>"
+
+
+def prewarm():
+    """Import every lazy module now"""
+    for name in list(_registered):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            log.warning("Pre-warm could not import %s", name, exc_info=True)
+
+
+def start_prewarm() -> threading.Thread:
+    """prewarm() on a daemon thread, so startup does not wait for it"""
+    thread = threading.Thread(target=prewarm, name="weave-prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,254 @@
+"""
+Process-wide scheduler for Claude calls
+
+Every Claude request goes through scheduler.slot(), which admits calls in
+priority order:
+
+    INTERACTIVE  live play: DM turns and the image prompts they need
+    AUTHORING    Prep Coach chats and generate-fields
+    BACKGROUND   episode recaps and other work nobody is waiting on
+
+Admission is limited by
+- a concurrency window that halves on every 429 and grows back by one slot
+  per window's worth of successes (additive increase, multiplicative
+  decrease). The last slot is kept for interactive calls.
+- token buckets for input and output tokens per minute. Their size and level
+  come from the anthropic-ratelimit-* response headers once a response has
+  been seen, or from config until then. A call reserves its estimated input
+  and max_tokens output up front. The reservation is settled against actual
+  usage when the call ends.
+- a pause after a 429, for as long as its retry-after asks.
+
+A caller with a Deadline (see deadlines.py) stops waiting when it expires.
+"""
+
+import enum
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import config
+from cancellation import Cancelled, CancelToken
+from deadlines import Deadline
+from metrics import register_collector
+
+WAIT_POLL_SECONDS = 0.25
+# Rough size of a token in characters, for estimating a request before it is sent
+CHARS_PER_TOKEN = 4
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0
+    AUTHORING = 1
+    BACKGROUND = 2
+
+
+class TokenBucket:
+    """Tokens per minute, refilled continuously. capacity None means unlimited."""
+
+    def __init__(self, capacity: Optional[float] = None):
+        self.capacity = capacity
+        self.level = capacity or 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def can_take(self, amount: float, now: float) -> bool:
+        self._refill(now)
+        # A request larger than the whole bucket goes through once the bucket is full
+        return not self.capacity or self.level >= min(amount, self.capacity)
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= amount
+
+    def observe(self, limit: Optional[str], remaining: Optional[str], now: float):
+        """Resize and refill from anthropic-ratelimit-*-limit / -remaining headers"""
+        try:
+            if limit is not None:
+                self.capacity = float(limit)
+            if remaining is not None and self.capacity:
+                self._refill(now)
+                self.level = min(self.level, float(remaining))
+        except ValueError:
+            pass
+
+
+class _Ticket:
+    def __init__(self, priority: Priority, input_tokens: int, output_tokens: int):
+        self.priority = priority
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class Slot:
+    """An admitted call. Report what the response said so the scheduler can adapt."""
+
+    def __init__(self, scheduler: "LLMScheduler", ticket: _Ticket):
+        self._scheduler = scheduler
+        self._ticket = ticket
+        self.usage: Optional[tuple] = None  # (input_tokens, output_tokens) once known
+
+    def observe(self, headers=None, usage=None):
+        if usage is not None:
+            self.usage = (getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0)
+        if headers is not None:
+            self._scheduler.observe_headers(headers)
+
+    def rate_limited(self, retry_after: Optional[float] = None):
+        self._scheduler.on_rate_limited(retry_after)
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int,
+        input_tokens_per_minute: Optional[float] = None,
+        output_tokens_per_minute: Optional[float] = None,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.window = float(self.max_concurrency)
+        self.in_flight = 0
+        self.input_bucket = TokenBucket(input_tokens_per_minute)
+        self.output_bucket = TokenBucket(output_tokens_per_minute)
+        self.paused_until = 0.0
+        self.rate_limited_total = 0
+        self.admitted_total = {p.name.lower(): 0 for p in Priority}
+        self._waiting: list = []  # heap of (priority, seq, ticket)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    # --- admission ---
+
+    def _limit_for(self, priority: Priority) -> int:
+        window = max(1, int(self.window))
+        if priority == Priority.INTERACTIVE or window == 1:
+            return window
+        return window - 1
+
+    def _can_admit(self, ticket: _Ticket, now: float) -> bool:
+        if now < self.paused_until or self._waiting[0][2] is not ticket:
+            return False
+        if self.in_flight >= self._limit_for(ticket.priority):
+            return False
+        return self.input_bucket.can_take(ticket.input_tokens, now) and self.output_bucket.can_take(ticket.output_tokens, now)
+
+    @contextmanager
+    def slot(
+        self,
+        priority: Priority,
+        input_tokens: int,
+        output_tokens: int,
+        token: Optional[CancelToken] = None,
+        deadline: Optional[Deadline] = None,
+    ):
+        """Wait for a turn (in priority order, then arrival order) and hold it for the call"""
+        ticket = _Ticket(priority, input_tokens, output_tokens)
+        with self._cond:
+            heapq.heappush(self._waiting, (priority, next(self._seq), ticket))
+            try:
+                while not self._can_admit(ticket, time.monotonic()):
+                    if token is not None and token.cancelled:
+                        raise Cancelled()
+                    if deadline is not None:
+                        deadline.check("queue")
+                        self._cond.wait(deadline.timeout(WAIT_POLL_SECONDS))
+                    else:
+                        self._cond.wait(WAIT_POLL_SECONDS)
+            finally:
+                self._waiting.remove(next(w for w in self._waiting if w[2] is ticket))
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+            self.in_flight += 1
+            self.admitted_total[priority.name.lower()] += 1
+            self.input_bucket.take(input_tokens)
+            self.output_bucket.take(output_tokens)
+
+        slot = Slot(self, ticket)
+        try:
+            yield slot
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                if slot.usage is not None:
+                    # Settle the reservation against what the call actually used
+                    self.input_bucket.take(slot.usage[0] - input_tokens)
+                    self.output_bucket.take(slot.usage[1] - output_tokens)
+                    self.window = min(self.max_concurrency, self.window + 1 / self.window)
+                self._cond.notify_all()
+
+    # --- feedback ---
+
+    def observe_headers(self, headers):
+        now = time.monotonic()
+        with self._cond:
+            self.input_bucket.observe(
+                headers.get("anthropic-ratelimit-input-tokens-limit"),
+                headers.get("anthropic-ratelimit-input-tokens-remaining"),
+                now,
+            )
+            self.output_bucket.observe(
+                headers.get("anthropic-ratelimit-output-tokens-limit"),
+                headers.get("anthropic-ratelimit-output-tokens-remaining"),
+                now,
+            )
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        with self._cond:
+            self.rate_limited_total += 1
+            self.window = max(1.0, self.window / 2)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            waiting = {p.name.lower(): 0 for p in Priority}
+            for priority, _, _ in self._waiting:
+                waiting[Priority(priority).name.lower()] += 1
+            return {
+                "window": round(self.window, 2),
+                "in_flight": self.in_flight,
+                "waiting": waiting,
+                "admitted_total": dict(self.admitted_total),
+                "rate_limited_total": self.rate_limited_total,
+                "input_tokens_available": None if not self.input_bucket.capacity else round(self.input_bucket.level),
+                "output_tokens_available": None if not self.output_bucket.capacity else round(self.output_bucket.level),
+                "paused_seconds": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            }
+
+
+def estimate_input_tokens(system: Optional[str], messages: list) -> int:
+    chars = len(system or "")
+    for message in messages:
+        content = message.get("content", "")
+        chars += len(content) if isinstance(content, str) else sum(len(str(part)) for part in content)
+    return chars // CHARS_PER_TOKEN + 1
+
+
+scheduler = LLMScheduler(
+    config.LLM_MAX_CONCURRENCY,
+    config.LLM_INPUT_TOKENS_PER_MINUTE or None,
+    config.LLM_OUTPUT_TOKENS_PER_MINUTE or None,
+)
+
+
+def _collect_metrics() -> list:
+    state = scheduler.snapshot()
+    return [
+        ("weave_llm_concurrency_window", "gauge", "Claude calls the scheduler currently lets run at once", [({}, state["window"])]),
+        ("weave_llm_in_flight", "gauge", "Claude calls running", [({}, state["in_flight"])]),
+        ("weave_llm_waiting", "gauge", "Claude calls queued by priority",
+         [({"priority": priority}, count) for priority, count in state["waiting"].items()]),
+        ("weave_llm_admitted_total", "counter", "Claude calls admitted by priority",
+         [({"priority": priority}, count) for priority, count in state["admitted_total"].items()]),
+        ("weave_llm_rate_limited_total", "counter", "429 responses from the Claude API", [({}, state["rate_limited_total"])]),
+    ]
+
+
+register_collector(_collect_metrics)
@@ -0,0 +1,273 @@
+"""
+HTTP load test: many tables playing synthetic campaigns against a running backend
+
+Generates synthetic campaigns (see synthetic.py) into a temporary data
+directory, starts the fake providers (fake_providers.py) and the backend
+under uvicorn, then runs --tables concurrent tables for --duration seconds.
+Each table plays one campaign, picking requests from a weighted mix of
+session, dice, DM, town and content traffic with a random think time between
+them. Reports throughput and p50/p95/p99 latency per route.
+
+A baseline (loadtest/baseline.json unless --baseline) is compared against
+when present: the run fails if a route's p95 is more than --threshold worse.
+--save-baseline replaces it with this run. Run from backend/:
+
+    python -m loadtest.run [--tables 50] [--duration 60] [--log-entries 200] [--workers 2] [--save-baseline]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+class Action:
+    def __init__(self, method: str, path: str, weight: float, body: Optional[Callable[[random.Random], dict]] = None):
+        self.method = method
+        self.path = path
+        self.weight = weight
+        self.body = body
+
+    @property
+    def route(self) -> str:
+        return f"{self.method} {self.path}"
+
+
+def _dm_message(rng: random.Random) -> dict:
+    return {"message": "I search the hollow for tracks", "includeState": True, "requestIllustration": rng.random() < 0.2}
+
+
+def _dice_roll(rng: random.Random) -> dict:
+    return {"dieType": "d20", "result": rng.randint(1, 20), "modifier": rng.randint(0, 2), "purpose": "load test"}
+
+
+# A table at play: mostly session reads and dice, a DM turn every few requests
+MIX = [
+    Action("GET", "/campaigns/{campaign_id}/session", 20),
+    Action("POST", "/campaigns/{campaign_id}/dice/roll", 15, _dice_roll),
+    Action("POST", "/campaigns/{campaign_id}/dm/message", 10, _dm_message),
+    Action("GET", "/campaigns/{campaign_id}/town", 6),
+    Action("PUT", "/campaigns/{campaign_id}/town", 2, lambda rng: {"seeds": rng.randint(0, 100)}),
+    Action("GET", "/campaigns/{campaign_id}/characters", 5),
+    Action("GET", "/campaigns/{campaign_id}/content", 6),
+    Action("GET", "/campaigns/{campaign_id}/state", 5),
+    Action("GET", "/campaigns/{campaign_id}/available-beats", 5),
+    Action("GET", "/campaigns/{campaign_id}/dm-context", 3),
+    Action("GET", "/campaigns/{campaign_id}/search?q=moss", 3),
+]
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+
+async def _table(client: httpx.AsyncClient, campaign_id: str, mix: list, until: float, think_seconds: float, rng: random.Random, results: list):
+    weights = [action.weight for action in mix]
+    while time.monotonic() < until:
+        action = rng.choices(mix, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await client.request(
+                action.method,
+                action.path.format(campaign_id=campaign_id),
+                json=action.body(rng) if action.body else None,
+            )
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        results.append((action.route, status, time.perf_counter() - started))
+        if think_seconds:
+            await asyncio.sleep(rng.expovariate(1 / think_seconds))
+
+
+async def drive(
+    base_url: str,
+    campaign_ids: list,
+    tables: int,
+    duration: float,
+    think_seconds: float = 0.5,
+    mix: Optional[list] = None,
+    seed: int = 0,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> list:
+    """Run tables concurrent tables (round-robin over campaign_ids); returns (route, status, seconds) per request"""
+    results = []
+    until = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=tables, max_keepalive_connections=tables)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits, transport=transport) as client:
+        await asyncio.gather(*(
+            _table(client, campaign_ids[n % len(campaign_ids)], mix or MIX, until, think_seconds, random.Random(seed + n), results)
+            for n in range(tables)
+        ))
+    return results
+
+
+def report(results: list, duration: float) -> dict:
+    """Per route and overall: requests, errors (5xx or no response), requests/s and latency percentiles in ms"""
+    by_route: dict = {}
+    for route, status, seconds in results:
+        by_route.setdefault(route, []).append((status, seconds))
+    by_route["total"] = [(status, seconds) for _, status, seconds in results]
+
+    summary = {}
+    for route, samples in by_route.items():
+        latencies = sorted(seconds * 1000 for _, seconds in samples)
+        summary[route] = {
+            "requests": len(samples),
+            "errors": sum(1 for status, _ in samples if status == 0 or status >= 500),
+            "rps": round(len(samples) / duration, 2),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+        }
+    return summary
+
+
+def regressions(summary: dict, baseline: dict, threshold: float) -> list:
+    """Routes whose p95 is more than threshold (a fraction) above the baseline's"""
+    found = []
+    for route, stats in summary.items():
+        before = baseline.get(route, {}).get("p95_ms")
+        if before and stats["p95_ms"] > before * (1 + threshold):
+            found.append(f"{route}: p95 {before:g}ms -> {stats['p95_ms']:g}ms")
+    return found
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout:g}s")
+
+
+def _print_report(summary: dict, baseline: dict):
+    print(f"{'route':52} {'req':>6} {'err':>5} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'p95 was':>8}")
+    for route, stats in sorted(summary.items(), key=lambda item: (item[0] == "total", item[0])):
+        was = baseline.get(route, {}).get("p95_ms")
+        print(
+            f"{route:52} {stats['requests']:>6} {stats['errors']:>5} {stats['rps']:>7} "
+            f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} {was if was is not None else '-':>8}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tables", type=int, default=50)
+    parser.add_argument("--campaigns", type=int, default=0, help="Campaigns to spread the tables over (default: one per table)")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of traffic")
+    parser.add_argument("--think-ms", type=float, default=500, help="Mean pause between a table's requests")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765, help="Backend port; the fake providers use the next one")
+    parser.add_argument("--seed", type=int, default=0)
+    sizes = parser.add_argument_group("campaign size")
+    sizes.add_argument("--npcs", type=int, default=6)
+    sizes.add_argument("--locations", type=int, default=5)
+    sizes.add_argument("--beats", type=int, default=8)
+    sizes.add_argument("--roster", type=int, default=4)
+    sizes.add_argument("--log-entries", type=int, default=200)
+    sizes.add_argument("--notes", type=int, default=10)
+    sizes.add_argument("--archived-episodes", type=int, default=2)
+    providers = parser.add_argument_group("fake providers")
+    providers.add_argument("--first-token-ms", type=float, default=400)
+    providers.add_argument("--tokens-per-second", type=float, default=80)
+    providers.add_argument("--render-ms", type=float, default=1500)
+    providers.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed p95 increase over the baseline (0.25 = 25%%)")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    import config
+    import helpers
+    from loadtest.synthetic import write_campaign
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        config.DATA_DIR = helpers.DATA_DIR = data_dir
+        campaign_ids = [
+            write_campaign(
+                f"load_{n:03d}",
+                npcs=args.npcs, locations=args.locations, beats=args.beats, roster=args.roster,
+                log_entries=args.log_entries, notes=args.notes, archived_episodes=args.archived_episodes,
+                seed=args.seed + n,
+            )
+            for n in range(args.campaigns or args.tables)
+        ]
+
+        providers_url = f"http://127.0.0.1:{args.port + 1}"
+        env = {
+            **os.environ,
+            "WEAVE_DATA_DIR": data_dir,
+            "WEAVE_ANTHROPIC_BASE_URL": providers_url,
+            "WEAVE_REPLICATE_BASE_URL": providers_url,
+            "ANTHROPIC_API_KEY": "fake",
+        }
+        processes = [
+            subprocess.Popen([
+                sys.executable, "fake_providers.py", "--port", str(args.port + 1), "--seed", str(args.seed),
+                "--first-token-ms", str(args.first_token_ms), "--tokens-per-second", str(args.tokens_per_second),
+                "--render-ms", str(args.render_ms), "--error-rate", str(args.error_rate),
+            ], cwd=BACKEND_DIR, env=env),
+            subprocess.Popen([
+                sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+                "--workers", str(args.workers), "--log-level", "warning",
+            ], cwd=BACKEND_DIR, env=env),
+        ]
+        try:
+            _wait_until_up(f"{providers_url}/docs", processes[0])
+            _wait_until_up(f"http://127.0.0.1:{args.port}/", processes[1])
+            print(f"{args.tables} tables over {len(campaign_ids)} campaigns for {args.duration:g}s...")
+            results = asyncio.run(drive(
+                f"http://127.0.0.1:{args.port}", campaign_ids, args.tables, args.duration, args.think_ms / 1000, seed=args.seed,
+            ))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    summary = report(results, args.duration)
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["routes"]
+    _print_report(summary, baseline)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "json_path")},
+                       "routes": summary}, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    slower = regressions(summary, baseline, args.threshold)
+    for line in slower:
+        print(f"REGRESSION {line}")
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Synthetic campaigns of configurable size, for load tests and benchmarks
+
+Documents are built from a seeded RNG, so the same sizes and seed give the
+same campaign. write_campaign stores one under the current DATA_DIR the way
+the app would: stamped documents through the storage helpers, an entry in
+campaigns.json, and archived episodes through play_memory (which also
+indexes them for recall).
+
+write_campaign caps NPCs, locations and beats at the schema's maximum of 10.
+The document builders take any size, for benchmarks that time behaviour past
+the limits.
+"""
+
+import random
+import zlib
+from datetime import datetime
+from typing import Optional
+
+from campaign_schema import BLOOMBURROW_SYSTEM
+
+# CampaignContent's limits on npcs, locations and beats
+MAX_CONTENT_ITEMS = 10
+
+_WORDS = (
+    "moss", "lantern", "heron", "bramble", "willow", "ember", "thistle", "burrow", "acorn", "mist",
+    "hollow", "river", "stone", "thorn", "feather", "root", "amber", "shadow", "meadow", "bell",
+)
+_SPECIES = [s["name"] for s in BLOOMBURROW_SYSTEM.get("species", [])] or ["Mousefolk"]
+_LOCATION_TAGS = ["boss", "danger", "secret", "treasure", "exposition", "ally"]
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(count))
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(_WORDS).title()}{rng.choice(_WORDS)}"
+
+
+def synthetic_content(npcs: int = 6, locations: int = 5, beats: int = 8, arcs: int = 2, seed: int = 0) -> dict:
+    """A campaign.json document; beats form chains of three (each needs the one before)"""
+    rng = random.Random(seed)
+    beat_list = []
+    for i in range(beats):
+        beat_list.append({
+            "id": f"beat_{i:03d}",
+            "description": f"The party must {_words(rng, 8)}",
+            "hints": [_words(rng, 6) for _ in range(3)],
+            "revelation": f"They learn that {_words(rng, 10)}",
+            "prerequisites": [f"beat_{i - 1:03d}"] if i % 3 else [],
+            "closes_after_episodes": rng.choice([None, None, 3, 5]),
+            "is_finale": i == beats - 1,
+        })
+    return {
+        "name": f"The {rng.choice(_WORDS).title()} Blight",
+        "premise": f"A sickness spreads through the {_words(rng, 12)}. The heroes must find its source.",
+        "tone": "creeping dread, mystery",
+        "threat": {
+            "name": "The Blight",
+            "stages": [f"Stage {n}: {_words(rng, 4)}" for n in range(5)],
+            "advances_each_episode_unless_beat_hit": True,
+        },
+        "npcs": [
+            {
+                "name": f"{_name(rng)} {i}",
+                "species": rng.choice(_SPECIES),
+                "role": _words(rng, 4),
+                "wants": _words(rng, 8),
+                "secret": _words(rng, 12),
+            }
+            for i in range(npcs)
+        ],
+        "locations": [
+            {"name": f"{_name(rng)} {i}", "vibe": _words(rng, 8), "contains": rng.sample(_LOCATION_TAGS, 2)}
+            for i in range(locations)
+        ],
+        "beats": beat_list,
+        "character_arcs": [
+            {
+                "id": f"arc_{i:03d}",
+                "name": _name(rng),
+                "suggested_for": [],
+                "milestones": [_words(rng, 6) for _ in range(3)],
+                "reward": {"name": _name(rng), "description": _words(rng, 8)},
+            }
+            for i in range(arcs)
+        ],
+    }
+
+
+def synthetic_state(content: dict, beats_hit: int = 2, facts: int = 4, seed: int = 0) -> dict:
+    """A state.json document partway through content"""
+    rng = random.Random(seed)
+    hit = [beat["id"] for beat in content["beats"][:beats_hit]]
+    return {
+        "threat_stage": 1,
+        "episodes_completed": beats_hit,
+        "beats_hit": hit,
+        "beats_expired": [],
+        "facts_known": [f"They learn that {_words(rng, 10)}" for _ in range(facts)],
+        "npcs": {
+            npc["name"].lower().replace(" ", "_"): {"met": rng.random() < 0.5, "disposition": "unknown", "secrets_revealed": []}
+            for npc in content["npcs"]
+        },
+        "locations_visited": [location["name"] for location in content["locations"][:2]],
+    }
+
+
+def synthetic_roster(size: int = 4, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    return {"characters": [
+        {
+            "id": f"char_{i:03d}",
+            "name": _name(rng),
+            "species": rng.choice(_SPECIES),
+            "level": 1,
+            "xp": 0,
+            "stats": {"Brave": rng.randint(1, 3), "Clever": rng.randint(1, 3), "Kind": rng.randint(1, 3)},
+            "maxHearts": 5,
+            "maxThreads": 3,
+            "gear": [_words(rng, 2)],
+            "weavesKnown": [],
+            "notes": "",
+        }
+        for i in range(size)
+    ]}
+
+
+def synthetic_session(roster: dict, log_entries: int = 100, seed: int = 0) -> dict:
+    """An active current_session.json with the whole roster in the party and log_entries log lines"""
+    rng = random.Random(seed)
+    log = []
+    for i in range(log_entries):
+        if i % 5 == 4:
+            result = rng.randint(1, 20)
+            log.append({"type": "roll", "die": "d20", "result": result, "modifier": 0, "total": result, "purpose": _words(rng, 2)})
+        else:
+            role = "player" if len(log) % 2 == 0 else "dm"
+            log.append({"type": "chat", "role": role, "content": _words(rng, 12 if role == "player" else 60)})
+    return {
+        "active": True,
+        "runState": "exploration",
+        "quest": _words(rng, 5),
+        "location": _words(rng, 3),
+        "roomNumber": 1,
+        "roomsTotal": 4,
+        "party": [
+            {
+                "characterId": char["id"],
+                "name": char["name"],
+                "species": char["species"],
+                "stats": char["stats"],
+                "maxHearts": char["maxHearts"],
+                "maxThreads": char["maxThreads"],
+                "currentHearts": char["maxHearts"],
+                "currentThreads": char["maxThreads"],
+                "gear": char["gear"],
+                "conditions": [],
+            }
+            for char in roster["characters"]
+        ],
+        "enemies": [],
+        "lootCollected": [],
+        "log": log,
+    }
+
+
+def synthetic_prep(notes: int = 10, seed: int = 0) -> dict:
+    """A dm_prep.json with notes author notes"""
+    rng = random.Random(seed)
+    now = datetime.utcnow().isoformat() + "Z"
+    return {
+        "author_notes": [
+            {"id": f"note_{i:04d}", "content": _words(rng, 20), "category": rng.choice(["reminder", "voice", "pacing", "secret", "general"]),
+             "related_to": None, "created_at": now}
+            for i in range(notes)
+        ],
+        "conversation": [],
+        "pinned": [],
+        "last_accessed": now,
+    }
+
+
+def write_campaign(
+    campaign_id: str,
+    npcs: int = 6,
+    locations: int = 5,
+    beats: int = 8,
+    roster: int = 4,
+    log_entries: int = 100,
+    notes: int = 10,
+    archived_episodes: int = 0,
+    seed: Optional[int] = None,
+) -> str:
+    """Write a synthetic campaign under DATA_DIR; returns its id"""
+    from helpers import load_json, save_campaign_json, save_json
+    from play_memory import archive_session
+    from schema_migrations import stamp_document
+
+    seed = seed if seed is not None else zlib.crc32(campaign_id.encode())
+    content = synthetic_content(
+        min(npcs, MAX_CONTENT_ITEMS), min(locations, MAX_CONTENT_ITEMS), min(beats, MAX_CONTENT_ITEMS), seed=seed,
+    )
+    roster_doc = synthetic_roster(roster, seed)
+
+    save_campaign_json(campaign_id, "system.json", BLOOMBURROW_SYSTEM)
+    save_campaign_json(campaign_id, "campaign.json", stamp_document("campaign", content))
+    save_campaign_json(campaign_id, "state.json", stamp_document("state", synthetic_state(content, seed=seed)))
+    save_campaign_json(campaign_id, "roster.json", stamp_document("roster", roster_doc))
+    save_campaign_json(campaign_id, "dm_prep.json", stamp_document("dm_prep", synthetic_prep(notes, seed)))
+    save_campaign_json(campaign_id, "town.json", {"name": "Meadowdale", "seeds": 25, "buildings": {"generalStore": True}})
+    save_campaign_json(campaign_id, "stash.json", {"items": []})
+    for episode in range(archived_episodes):
+        archive_session(campaign_id, synthetic_session(roster_doc, log_entries, seed + episode + 1), "victory")
+    save_campaign_json(campaign_id, "current_session.json", stamp_document("session", synthetic_session(roster_doc, log_entries, seed)))
+
+    campaigns = load_json("campaigns.json") or {"activeCampaignId": None, "campaigns": []}
+    campaigns["campaigns"].append({
+        "id": campaign_id,
+        "name": content["name"],
+        "description": content["premise"],
+        "bannerImage": None,
+        "currencyName": "Seeds",
+        "lastPlayed": None,
+        "createdAt": datetime.utcnow().isoformat() + "Z",
+        "isDraft": False,
+    })
+    save_json("campaigns.json", campaigns)
+    return campaign_id
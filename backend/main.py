@@ -3,18 +3,39 @@ Weave - Backend Server
 FastAPI application for managing game state and AI DM integration
 """
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 
-from config import IMAGES_DIR
-from routes import templates, campaigns, campaign_content, dm_prep, characters, town, sessions, dm_ai, generate
+import campaign_actors
+import lazy_imports
+import profiling
+from metrics import MetricsMiddleware
+from profiling import ProfilingMiddleware
+from config import IMAGES_DIR, PREWARM_IMPORTS, PROFILE_CONTINUOUS_MS
+from routes import templates, campaigns, campaign_content, dm_prep, characters, town, sessions, dm_ai, generate, history, search, pacing, status, usage, admin
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(title="Weave", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    campaign_actors.start(asyncio.get_running_loop())
+    if PROFILE_CONTINUOUS_MS > 0:
+        profiling.start_continuous(PROFILE_CONTINUOUS_MS)
+    if PREWARM_IMPORTS:
+        lazy_imports.start_prewarm()
+    yield
+    # Checkpoint any campaigns still held in memory
+    await campaign_actors.shutdown()
+
+
+app = FastAPI(title="Weave", version="1.0.0", lifespan=lifespan)
 
 # CORS for frontend
 app.add_middleware(
@@ -24,6 +45,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Marks each request for the sampling profiler
+app.add_middleware(ProfilingMiddleware)
+# Outermost, so request timings include everything below
+app.add_middleware(MetricsMiddleware)
 
 # Mount static files for serving images
 app.mount("/images", StaticFiles(directory=IMAGES_DIR), name="images")
@@ -38,6 +63,12 @@ app.include_router(town.router)
 app.include_router(sessions.router)
 app.include_router(dm_ai.router)
 app.include_router(generate.router)
+app.include_router(history.router)
+app.include_router(search.router)
+app.include_router(pacing.router)
+app.include_router(status.router)
+app.include_router(usage.router)
+app.include_router(admin.router)
 
 
 @app.get("/")
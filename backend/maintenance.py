@@ -0,0 +1,251 @@
+"""
+Maintenance runner: apply one migration or maintenance task to every campaign in parallel
+
+Usage:
+    python maintenance.py list
+    python maintenance.py run <task> [--workers N] [--dry-run] [--restart] [--campaign ID ...] [--data-dir PATH]
+
+Campaigns are discovered under DATA_DIR/campaigns and processed across a
+process pool. Each finished campaign is appended to a checkpoint file
+(DATA_DIR/maintenance/<task>.jsonl), so an interrupted run picks up where it
+stopped; --restart ignores the checkpoint. --dry-run reports what would
+change without writing anything, checkpoint included.
+
+Run it while the server is stopped, or at least while no campaign is held by
+an in-memory actor (WEAVE_CAMPAIGN_ACTORS): actors would overwrite the
+session and roster files at their next checkpoint.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Optional
+
+import config
+
+MAINTENANCE_DIR = "maintenance"
+
+# task name -> (function(campaign_id, dry_run) -> detail string, description)
+TASKS: dict = {}
+
+
+def task(name: str, description: str):
+    """Register the decorated function as a per-campaign maintenance task"""
+    def register(fn: Callable[[str, bool], str]) -> Callable[[str, bool], str]:
+        if name in TASKS:
+            raise ValueError(f"Duplicate maintenance task {name}")
+        TASKS[name] = (fn, description)
+        return fn
+    return register
+
+
+# === Tasks ===
+
+@task("upgrade-documents", "Upgrade every stored document to the current schema_version and write it back")
+def upgrade_documents(campaign_id: str, dry_run: bool) -> str:
+    from helpers import load_campaign_json, save_campaign_json
+    from schema_migrations import upgrade_document
+    from campaign_actors import SESSION_FILE, ROSTER_FILE
+    from play_memory import list_archived_episodes, _archive_filename
+
+    documents = [
+        ("campaign.json", "campaign"),
+        ("draft.json", "draft"),
+        ("state.json", "state"),
+        ("dm_prep.json", "dm_prep"),
+        (SESSION_FILE, "session"),
+        (ROSTER_FILE, "roster"),
+    ] + [(_archive_filename(episode), "archive") for episode in list_archived_episodes(campaign_id)]
+
+    found = upgraded = 0
+    for filename, doc_type in documents:
+        data = load_campaign_json(campaign_id, filename)
+        if not data:
+            continue
+        found += 1
+        data, changed = upgrade_document(doc_type, data)
+        if changed:
+            upgraded += 1
+            if not dry_run:
+                save_campaign_json(campaign_id, filename, data)
+    # events.jsonl is append-only and upgraded as it is read
+    verb = "would upgrade" if dry_run else "upgraded"
+    return f"{verb} {upgraded} of {found} documents"
+
+
+@task("reindex-history", "Add archived episodes missing from the history search index")
+def reindex_history(campaign_id: str, dry_run: bool) -> str:
+    from history_index import indexed_episodes
+    from play_memory import list_archived_episodes, reindex_history as reindex
+
+    if dry_run:
+        missing = set(list_archived_episodes(campaign_id)) - indexed_episodes(campaign_id)
+        return f"would index {len(missing)} episodes"
+    return f"indexed {reindex(campaign_id)} episodes"
+
+
+@task("episodes", "Convert a run-based campaign to episodes (migrate_episodes.py; backs the campaign up first)")
+def migrate_episodes_task(campaign_id: str, dry_run: bool) -> str:
+    import migrate_episodes
+    from helpers import get_campaign_dir, load_campaign_json
+
+    state = load_campaign_json(campaign_id, "state.json")
+    content = load_campaign_json(campaign_id, "campaign.json")
+    if "runs_completed" not in state and "anchor_runs" not in content:
+        return "already episode-based"
+    if dry_run:
+        return "would migrate"
+    # migrate_episodes narrates with print(); keep worker output out of the progress report
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate_episodes.migrate_campaign(get_campaign_dir(campaign_id), campaign_id)
+    return "migrated"
+
+
+# === Runner ===
+
+def discover_campaigns(data_dir: str) -> list:
+    """Campaign ids under data_dir/campaigns, skipping backups left by migrations"""
+    campaigns_dir = os.path.join(data_dir, "campaigns")
+    if not os.path.isdir(campaigns_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(campaigns_dir)
+        if os.path.isdir(os.path.join(campaigns_dir, name)) and "_backup_" not in name
+    )
+
+
+def _checkpoint_path(data_dir: str, task_name: str) -> str:
+    return os.path.join(data_dir, MAINTENANCE_DIR, f"{task_name}.jsonl")
+
+
+def load_checkpoint(data_dir: str, task_name: str) -> set:
+    """Campaign ids a previous run of task_name finished successfully"""
+    path = _checkpoint_path(data_dir, task_name)
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry["status"] == "done":
+                        done.add(entry["campaign_id"])
+    return done
+
+
+def _init_worker(data_dir: str):
+    """Point a pool worker at the data directory being maintained"""
+    import helpers
+    config.DATA_DIR = data_dir
+    helpers.DATA_DIR = data_dir
+
+
+def _run_one(task_name: str, campaign_id: str, dry_run: bool) -> dict:
+    fn, _ = TASKS[task_name]
+    start = time.perf_counter()
+    try:
+        detail = fn(campaign_id, dry_run)
+        status = "done"
+    except Exception as e:
+        detail = f"{type(e).__name__}: {e}"
+        status = "failed"
+    return {
+        "campaign_id": campaign_id,
+        "status": status,
+        "detail": detail,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def run_task(
+    task_name: str,
+    data_dir: Optional[str] = None,
+    workers: Optional[int] = None,
+    dry_run: bool = False,
+    restart: bool = False,
+    campaign_ids: Optional[list] = None,
+    report: Callable[[str], None] = print,
+) -> dict:
+    """
+    Run task_name over every campaign (or campaign_ids) and return a summary:
+    {"task", "dry_run", "total", "skipped", "done", "failed": [results], "results"}.
+    """
+    if task_name not in TASKS:
+        raise ValueError(f"Unknown maintenance task {task_name}")
+    data_dir = data_dir or config.DATA_DIR
+    campaigns = campaign_ids or discover_campaigns(data_dir)
+
+    done_before = set() if restart or dry_run else load_checkpoint(data_dir, task_name)
+    pending = [c for c in campaigns if c not in done_before]
+    checkpoint_path = _checkpoint_path(data_dir, task_name)
+    if not dry_run:
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+        if restart and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    report(f"{task_name}: {len(pending)} campaigns to process, {len(campaigns) - len(pending)} already done"
+           + (" (dry run)" if dry_run else ""))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_dir,)) as pool:
+        futures = [pool.submit(_run_one, task_name, campaign_id, dry_run) for campaign_id in pending]
+        for n, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            if not dry_run:
+                # Appended as each campaign finishes, so a killed run loses nothing it completed
+                with open(checkpoint_path, "a") as f:
+                    f.write(json.dumps({**result, "at": datetime.utcnow().isoformat() + "Z"}) + "\n")
+            report(f"[{n}/{len(pending)}] {result['campaign_id']}: {result['status']} - {result['detail']}")
+
+    failed = [r for r in results if r["status"] == "failed"]
+    return {
+        "task": task_name,
+        "dry_run": dry_run,
+        "total": len(campaigns),
+        "skipped": len(campaigns) - len(pending),
+        "done": len(results) - len(failed),
+        "failed": failed,
+        "results": results,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run a maintenance task across every campaign")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List available tasks")
+    run = sub.add_parser("run", help="Run a task")
+    run.add_argument("task", choices=sorted(TASKS))
+    run.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    run.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    run.add_argument("--restart", action="store_true", help="Ignore the checkpoint and process every campaign")
+    run.add_argument("--campaign", action="append", dest="campaigns", help="Only this campaign (repeatable)")
+    run.add_argument("--data-dir", default=config.DATA_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name, (_, description) in sorted(TASKS.items()):
+            print(f"{name:20} {description}")
+        return 0
+
+    summary = run_task(
+        args.task,
+        data_dir=args.data_dir,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        restart=args.restart,
+        campaign_ids=args.campaigns,
+    )
+    print(f"\n{summary['done']} done, {len(summary['failed'])} failed, {summary['skipped']} skipped of {summary['total']}")
+    for failure in summary["failed"]:
+        print(f"  FAILED {failure['campaign_id']}: {failure['detail']}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
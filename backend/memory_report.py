@@ -0,0 +1,198 @@
+"""
+Memory introspection for a running worker: caches, live objects, allocation sites
+
+For sizing workers and finding leaks from long-running sessions. Three views,
+served by the admin routes (routes/admin.py):
+
+- Caches: every in-process cache registers itself here with register_cache
+  (the way metrics collectors do), naming a function that returns its entries.
+  The report gives each cache's entry count and the deep size of what it
+  holds.
+- Objects: live counts of our own models (CampaignContent, CampaignState,
+  DMPrepData) and of session and system-config documents, found by walking
+  the garbage collector's objects. The walk is O(heap), so it runs only
+  when asked.
+- Allocation sites: tracemalloc snapshots, kept in memory and diffed by line,
+  file or traceback. Tracing slows allocation while it is on, so it is off
+  until start_tracing and should be stopped once done.
+"""
+
+import gc
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from typing import Callable, Optional
+
+MAX_SNAPSHOTS = 10
+# Objects visited per deep size before giving up and reporting a lower bound
+MAX_SIZE_OBJECTS = 2_000_000
+
+# Shared by everything that points at them, so not charged to any one cache
+_NOT_OWNED = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+    types.MethodType, types.CodeType, types.FrameType,
+)
+
+# Dict documents recognised by their keys
+DOCUMENT_SHAPES = {
+    "session document": frozenset({"party", "log", "enemies"}),
+    "system config": frozenset({"species", "stats", "mechanics"}),
+}
+
+_caches: dict = {}
+_lock = threading.Lock()
+# id -> (taken at, tracemalloc.Snapshot); ids count up from 1
+_snapshots: dict = {}
+_next_snapshot = 1
+
+
+def register_cache(name: str, entries: Callable[[], dict]):
+    """entries() returns the cache's contents as {key: data held for it}; the data is what gets sized"""
+    _caches[name] = entries
+
+
+def deep_sizeof(obj) -> tuple:
+    """(bytes, complete) for obj and everything it references, not counting types, modules and functions"""
+    seen = set()
+    pending = [obj]
+    total = 0
+    while pending:
+        if len(seen) >= MAX_SIZE_OBJECTS:
+            return total, False
+        item = pending.pop()
+        if id(item) in seen or isinstance(item, _NOT_OWNED):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        pending.extend(gc.get_referents(item))
+    return total, True
+
+
+def cache_report() -> dict:
+    report = {}
+    for name, entries in sorted(_caches.items()):
+        contents = entries()
+        size, complete = deep_sizeof(contents)
+        report[name] = {"entries": len(contents), "bytes": size, **({} if complete else {"truncated": True})}
+    return report
+
+
+def object_counts() -> dict:
+    from campaign_schema import CampaignContent, CampaignState, DMPrepData
+
+    models = (CampaignContent, CampaignState, DMPrepData)
+    counts = {model.__name__: 0 for model in models}
+    counts.update({shape: 0 for shape in DOCUMENT_SHAPES})
+    for obj in gc.get_objects():
+        if isinstance(obj, dict):
+            for shape, keys in DOCUMENT_SHAPES.items():
+                if keys <= obj.keys():
+                    counts[shape] += 1
+        elif isinstance(obj, models):
+            counts[type(obj).__name__] += 1
+    return counts
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def overview() -> dict:
+    """Process memory, tracemalloc status, live object counts and cache sizes"""
+    traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+    return {
+        "rss_bytes": _rss_bytes(),
+        "gc_counts": gc.get_count(),
+        "tracemalloc": {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+            "traced_bytes": traced,
+            "peak_bytes": peak,
+            "snapshots": list_snapshots(),
+        },
+        "objects": object_counts(),
+        "caches": cache_report(),
+    }
+
+
+# === tracemalloc snapshots ===
+
+def start_tracing(frames: int = 1):
+    """Start tracing allocations, keeping frames stack frames per allocation; snapshots taken before are dropped"""
+    with _lock:
+        _snapshots.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    tracemalloc.start(frames)
+
+
+def stop_tracing():
+    with _lock:
+        _snapshots.clear()
+    tracemalloc.stop()
+
+
+def take_snapshot() -> int:
+    """Snapshot the traced allocations; returns its id. Only the last MAX_SNAPSHOTS are kept."""
+    global _next_snapshot
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not tracing; start it first")
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+    with _lock:
+        snapshot_id = _next_snapshot
+        _next_snapshot += 1
+        _snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            del _snapshots[min(_snapshots)]
+    return snapshot_id
+
+
+def list_snapshots() -> list:
+    with _lock:
+        return [{"id": snapshot_id, "taken_at": taken_at} for snapshot_id, (taken_at, _) in sorted(_snapshots.items())]
+
+
+def _site(stat, group_by: str) -> dict:
+    if group_by == "filename":
+        return {"site": stat.traceback[0].filename}
+    frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    return {"site": frames if group_by == "traceback" else frames[0]}
+
+
+def top_allocations(snapshot_id: int, group_by: str = "lineno", limit: int = 25) -> list:
+    """The snapshot's largest allocation sites"""
+    snapshot = _get(snapshot_id)
+    return [
+        {**_site(stat, group_by), "bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+
+
+def diff(base_id: int, head_id: int, group_by: str = "lineno", limit: int = 25) -> list:
+    """Allocation sites that changed most between two snapshots, by absolute change in bytes"""
+    head, base = _get(head_id), _get(base_id)
+    return [
+        {**_site(stat, group_by), "bytes": stat.size, "bytes_diff": stat.size_diff, "count": stat.count, "count_diff": stat.count_diff}
+        for stat in head.compare_to(base, group_by)[:limit]
+    ]
+
+
+def _get(snapshot_id: int) -> tracemalloc.Snapshot:
+    with _lock:
+        entry = _snapshots.get(snapshot_id)
+    if entry is None:
+        raise KeyError(snapshot_id)
+    return entry[1]
@@ -0,0 +1,247 @@
+"""
+Prometheus metrics and per-request stage timings
+
+GET /metrics serves everything registered here in the Prometheus text format.
+The format is small enough to write directly, so prometheus_client is not
+needed. Counters and histograms are kept in this process's memory: with
+several workers, each is scraped (or aggregated) separately.
+
+Requests are timed by MetricsMiddleware, per route template. Inside a
+request, code marks its stages with `with stage("claude"):`. The middleware
+then records each stage's time under the request's route. A request slower
+than config.SLOW_REQUEST_SECONDS also logs one JSON line with its stage
+breakdown. Stages inside a request should not nest; a stage that runs twice
+(two file loads, say) adds up.
+
+Values read at scrape time (breaker state, scheduler queue) come from
+collectors registered with register_collector.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import config
+from memory_report import register_cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+STORAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+slow_request_log = logging.getLogger("weave.slow_requests")
+
+_metrics: list = []
+_collectors: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labels), 0)
+
+    def samples(self) -> list:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in sorted(self._values.items())]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # label values -> [bucket counts..., sum, count]
+        self._series: dict = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labels))
+        return series[-1] if series else 0
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> list:
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+def register_collector(collect: Callable[[], list]):
+    """
+    Add metrics read at scrape time. collect() returns
+    [(name, type, help, [(labels dict, value), ...]), ...].
+    """
+    _collectors.append(collect)
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# === Metrics recorded across the app ===
+
+REQUEST_SECONDS = Histogram("weave_request_seconds", "Request latency by route", ("method", "route", "status"))
+STAGE_SECONDS = Histogram("weave_request_stage_seconds", "Time spent in each stage of a request", ("route", "stage"))
+LLM_SECONDS = Histogram("weave_llm_request_seconds", "Claude call latency by model", ("model", "outcome"))
+LLM_TOKENS = Counter("weave_llm_tokens_total", "Claude tokens by model and kind (input, output, cache_read, cache_write)", ("model", "kind"))
+IMAGE_SECONDS = Histogram("weave_image_seconds", "Image pipeline latency: Flux renders and downloads", ("step", "outcome"))
+STORAGE_SECONDS = Histogram("weave_storage_seconds", "Document read and write latency", ("op", "codec"), STORAGE_BUCKETS)
+CACHE_LOOKUPS = Counter("weave_cache_lookups_total", "In-memory cache lookups by cache and result (hit, miss)", ("cache", "result"))
+FALLBACKS = Counter("weave_fallbacks_total", "Optional steps that failed and fell back (prompt crafting, downloads, recaps)", ("step",))
+
+
+# Label combinations held per metric
+register_cache("metric_series", lambda: {
+    metric.name: dict(metric._series if isinstance(metric, Histogram) else metric._values) for metric in list(_metrics)
+})
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# === Per-request stage timing ===
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict = {}
+
+    def add(self, stage_name: str, seconds: float):
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+
+# Set by the middleware for the duration of a request; copied into threadpool work
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("weave_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current request (a no-op outside one)"""
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(name, time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request and its stages"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        reset = _current_trace.set(trace)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_trace.reset(reset)
+            elapsed = time.perf_counter() - trace.started
+            # The route template (set by the router), so ids don't explode the label space
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=status)
+            for name, seconds in trace.stages.items():
+                STAGE_SECONDS.observe(seconds, route=route, stage=name)
+            if elapsed >= config.SLOW_REQUEST_SECONDS:
+                slow_request_log.warning(json.dumps({
+                    "event": "slow_request",
+                    "method": scope["method"],
+                    "route": route,
+                    "path": scope.get("path"),
+                    "status": status,
+                    "seconds": round(elapsed, 3),
+                    "stages": {name: round(seconds, 3) for name, seconds in trace.stages.items()},
+                }))
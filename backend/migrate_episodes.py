@@ -7,12 +7,13 @@ Usage:
     If no campaign_id is given, migrates all campaigns.
 """
 
-import json
 import os
 import sys
 import shutil
 from datetime import datetime
 
+from storage_codec import codec_for, read_document, write_document
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
 DEFAULT_ARCS = [
@@ -43,16 +44,12 @@ DEFAULT_ARCS = [
 
 def load_json(filepath):
     if os.path.exists(filepath):
-        with open(filepath, "r") as f:
-            return json.load(f)
+        return read_document(filepath)
     return None
 
 
 def save_json(filepath, data):
-    temp = filepath + ".tmp"
-    with open(temp, "w") as f:
-        json.dump(data, f, indent=2)
-    os.replace(temp, filepath)
+    write_document(filepath, data, codec_for(os.path.basename(filepath)))
 
 
 def migrate_campaign(campaign_dir, campaign_id):
@@ -2,7 +2,7 @@
 Pydantic request/response models for API endpoints
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 
@@ -75,6 +75,20 @@ class BeatHitRequest(BaseModel):
     facts_learned: list = []
     npcs_met: list = []
 
+class PacingSimulationRequest(BaseModel):
+    """Request body for the pacing simulator. content simulates an unsaved draft."""
+    content: Optional[dict] = None
+    runs: int = Field(20000, ge=100, le=100000)
+    max_episodes: int = Field(20, ge=1, le=100)
+    hit_chance: float = Field(0.6, ge=0.0, le=1.0)
+    beats_per_episode: int = Field(1, ge=1, le=5)
+    from_current_state: bool = False
+    seed: Optional[int] = None
+
+class StateRollbackRequest(BaseModel):
+    """Request body for rolling state back to an earlier event"""
+    to_seq: int = Field(..., ge=1)
+
 
 # DM Prep request models
 class DMPrepMessageRequest(BaseModel):
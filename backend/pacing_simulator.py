@@ -0,0 +1,201 @@
+"""
+Monte Carlo pacing simulator for authored campaigns
+
+Plays thousands of randomized campaigns at once with NumPy, using the same
+rules as campaign_logic: beats become available once their prerequisites are
+hit and their unlocked_by episode has passed, close once closes_after_episodes
+episodes are done, and the threat advances at the end of any episode in which
+no beat was hit. A run ends when the finale (or every beat) is hit or the
+threat reaches its last stage.
+"""
+
+from typing import Optional
+
+from campaign_schema import CampaignContent, CampaignState
+from lazy_imports import LazyModule
+
+np = LazyModule("numpy")
+
+DEFAULT_RUNS = 20000
+DEFAULT_MAX_EPISODES = 20
+
+# Above these rates a beat or the finale is flagged as a pacing problem
+EXPIRY_WARNING_RATE = 0.5
+FINALE_WARNING_RATE = 0.5
+
+# np.iinfo(np.int32).max, spelled out so importing this module does not import NumPy
+_NEVER = 2**31 - 1
+
+
+def _unlock_episode(unlocked_by: Optional[str]) -> int:
+    """Episodes that must be completed before a beat unlocks ("episode:3" -> 3)"""
+    if unlocked_by and unlocked_by.startswith("episode:"):
+        return int(unlocked_by.split(":")[1])
+    return 0
+
+
+def simulate_pacing(
+    content: CampaignContent,
+    runs: int = DEFAULT_RUNS,
+    max_episodes: int = DEFAULT_MAX_EPISODES,
+    hit_chance: float = 0.6,
+    beats_per_episode: int = 1,
+    start_state: Optional[CampaignState] = None,
+    seed: Optional[int] = None,
+) -> dict:
+    """
+    Simulate runs playthroughs of up to max_episodes episodes.
+
+    Each episode the party gets beats_per_episode chances to hit a beat; each
+    chance succeeds with probability hit_chance and hits one currently
+    available beat chosen at random. start_state continues from a campaign's
+    current progress instead of a fresh start.
+    """
+    rng = np.random.default_rng(seed)
+    beats = content.beats
+    beat_ids = [b.id for b in beats]
+    index = {beat_id: i for i, beat_id in enumerate(beat_ids)}
+    n_beats = len(beats)
+    last_stage = len(content.threat.stages) - 1
+    advances = content.threat.advances_each_episode_unless_beat_hit
+
+    # Beat rules as arrays: prereqs[b, p] is True if p must be hit before b
+    prereqs = np.zeros((n_beats, n_beats), dtype=np.int32)
+    unknown_prereq = np.zeros(n_beats, dtype=bool)
+    for i, beat in enumerate(beats):
+        for prereq in beat.prerequisites:
+            if prereq in index:
+                prereqs[i, index[prereq]] = 1
+            else:
+                unknown_prereq[i] = True
+    prereq_counts = prereqs.sum(axis=1)
+    unlock_at = np.array([_unlock_episode(b.unlocked_by) for b in beats], dtype=np.int32)
+    closes_at = np.array([b.closes_after_episodes or _NEVER for b in beats], dtype=np.int32)
+    is_finale = np.array([b.is_finale for b in beats], dtype=bool)
+
+    # Per-run state
+    start = start_state or CampaignState()
+    hit = np.zeros((runs, n_beats), dtype=bool)
+    expired = np.zeros((runs, n_beats), dtype=bool)
+    hit[:, [index[b] for b in start.beats_hit if b in index]] = True
+    expired[:, [index[b] for b in start.beats_expired if b in index]] = True
+    threat = np.full(runs, start.threat_stage, dtype=np.int32)
+    episodes = np.full(runs, start.episodes_completed, dtype=np.int32)
+    done = np.zeros(runs, dtype=bool)
+    finale_episode = np.full(runs, -1, dtype=np.int32)
+    threat_max_episode = np.full(runs, -1, dtype=np.int32)
+    hit_episode = np.full((runs, n_beats), -1, dtype=np.int32)
+    ever_available = hit.copy()
+    peak_threat = threat.copy()
+
+    def available() -> np.ndarray:
+        prereqs_met = (hit.astype(np.int32) @ prereqs.T) == prereq_counts
+        open_now = (episodes[:, None] >= unlock_at) & (episodes[:, None] < closes_at)
+        return ~hit & ~expired & prereqs_met & open_now & ~unknown_prereq & ~done[:, None]
+
+    def finished() -> np.ndarray:
+        finale_hit = (hit & is_finale).any(axis=1) if is_finale.any() else np.zeros(runs, dtype=bool)
+        return finale_hit | hit.all(axis=1)
+
+    for _ in range(max_episodes):
+        active = ~done
+        if not active.any():
+            break
+
+        hit_this_episode = np.zeros(runs, dtype=bool)
+        for _ in range(beats_per_episode):
+            avail = available()
+            ever_available |= avail
+            # Pick one available beat per run uniformly at random
+            scores = np.where(avail, rng.random((runs, n_beats)), -1.0)
+            choice = scores.argmax(axis=1)
+            hits = avail.any(axis=1) & (rng.random(runs) < hit_chance)
+            rows = np.nonzero(hits)[0]
+            hit[rows, choice[rows]] = True
+            hit_episode[rows, choice[rows]] = episodes[rows] + 1
+            hit_this_episode |= hits
+
+            won = active & ~done & finished()
+            finale_episode[won] = episodes[won] + 1
+            done |= won
+
+        # End of episode: threat advances if no beat was hit, then closing beats expire
+        still_playing = active & ~done
+        if advances:
+            advance = still_playing & ~hit_this_episode & (threat < last_stage)
+            threat[advance] += 1
+        peak_threat = np.maximum(peak_threat, threat)
+        episodes[active] += 1
+        expired |= still_playing[:, None] & ~hit & (episodes[:, None] >= closes_at)
+
+        maxed = still_playing & (threat >= last_stage)
+        threat_max_episode[maxed] = episodes[maxed]
+        done |= maxed
+
+    result = _summarize(
+        beat_ids, runs, max_episodes, last_stage,
+        hit, expired, ever_available, hit_episode, finale_episode, threat_max_episode, peak_threat,
+    )
+    # Name the cause when a beat closes before it can ever open
+    for beat, unlock, closes in zip(beats, unlock_at, closes_at):
+        if closes <= unlock:
+            result["warnings"].insert(0, f"Beat '{beat.id}' closes after episode {closes} but unlocks after episode {unlock}")
+    return result
+
+
+def _distribution(values: "np.ndarray") -> dict:
+    """Histogram and percentiles for episode counts"""
+    if values.size == 0:
+        return {"histogram": {}, "mean": None, "p10": None, "p50": None, "p90": None}
+    episodes, counts = np.unique(values, return_counts=True)
+    return {
+        "histogram": {int(e): round(float(c) / values.size, 4) for e, c in zip(episodes, counts)},
+        "mean": round(float(values.mean()), 2),
+        "p10": int(np.percentile(values, 10)),
+        "p50": int(np.percentile(values, 50)),
+        "p90": int(np.percentile(values, 90)),
+    }
+
+
+def _summarize(beat_ids, runs, max_episodes, last_stage, hit, expired, ever_available,
+               hit_episode, finale_episode, threat_max_episode, peak_threat) -> dict:
+    reached_finale = finale_episode >= 0
+    threat_maxed = threat_max_episode >= 0
+
+    beats = []
+    warnings = []
+    for i, beat_id in enumerate(beat_ids):
+        hit_eps = hit_episode[:, i][hit_episode[:, i] >= 0]
+        stats = {
+            "id": beat_id,
+            "hit_rate": round(float(hit[:, i].mean()), 4),
+            "expiry_rate": round(float(expired[:, i].mean()), 4),
+            "never_available_rate": round(float((~ever_available[:, i]).mean()), 4),
+            "median_hit_episode": int(np.median(hit_eps)) if hit_eps.size else None,
+        }
+        beats.append(stats)
+        if stats["never_available_rate"] == 1.0:
+            warnings.append(f"Beat '{beat_id}' never became available")
+        elif stats["expiry_rate"] > EXPIRY_WARNING_RATE:
+            warnings.append(f"Beat '{beat_id}' expired in {stats['expiry_rate']:.0%} of runs")
+
+    finale_rate = float(reached_finale.mean())
+    if finale_rate < FINALE_WARNING_RATE:
+        warnings.append(f"Only {finale_rate:.0%} of runs reached the finale within {max_episodes} episodes")
+    maxed_eps = threat_max_episode[threat_maxed]
+    if maxed_eps.size and np.median(maxed_eps) <= 4:
+        warnings.append(f"When the threat maxes out it usually happens by episode {int(np.median(maxed_eps))}")
+
+    return {
+        "runs": runs,
+        "max_episodes": max_episodes,
+        "finale_rate": round(finale_rate, 4),
+        "threat_maxed_rate": round(float(threat_maxed.mean()), 4),
+        "unfinished_rate": round(float((~reached_finale & ~threat_maxed).mean()), 4),
+        "episodes_to_finale": _distribution(finale_episode[reached_finale]),
+        "episodes_to_threat_max": _distribution(maxed_eps),
+        # Probability the threat reaches at least each stage
+        "threat_stage_probability": [round(float((peak_threat >= stage).mean()), 4) for stage in range(last_stage + 1)],
+        "beats": beats,
+        "warnings": warnings,
+    }
@@ -0,0 +1,250 @@
+"""
+Long-term play memory: session archive, episode recaps, and retrieval of past moments
+"""
+
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Optional
+
+from ai_calls import claude_message
+from llm_scheduler import Priority
+from memory_report import register_cache
+from metrics import FALLBACKS
+from helpers import load_campaign_json, save_campaign_json, get_campaign_dir
+from schema_migrations import migration, upgrade_document, stamp_document, unstamped
+from history_index import index_episode, indexed_episodes, has_history_index, search_history
+
+ARCHIVE_DIR = "archive"
+# Recaps by episode, so prompts can read the latest one without loading whole archives
+RECAPS_FILE = os.path.join(ARCHIVE_DIR, "recaps.json")
+
+# Per-campaign locks held while picking the next episode number and writing its archive
+_archive_locks: dict = {}
+_archive_locks_guard = threading.Lock()
+
+
+# === Archive ===
+
+@migration("archive", 1)
+def _upgrade_archive_v1(data: dict) -> dict:
+    """First stamped version; nothing to change"""
+    return data
+
+
+def _archive_lock(campaign_id: str) -> threading.Lock:
+    with _archive_locks_guard:
+        return _archive_locks.setdefault(campaign_id, threading.Lock())
+
+
+def _archive_filename(episode: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"episode_{episode:03d}.json")
+
+
+def list_archived_episodes(campaign_id: str) -> list:
+    """Return archived episode numbers in ascending order"""
+    archive_dir = os.path.join(get_campaign_dir(campaign_id), ARCHIVE_DIR)
+    if not os.path.isdir(archive_dir):
+        return []
+    episodes = []
+    for filename in os.listdir(archive_dir):
+        match = re.match(r"^episode_(\d+)\.json$", filename)
+        if match:
+            episodes.append(int(match.group(1)))
+    return sorted(episodes)
+
+
+def load_archived_session(campaign_id: str, episode: int) -> dict:
+    """Load one archived session by episode number"""
+    data = load_campaign_json(campaign_id, _archive_filename(episode))
+    if not data:
+        return {}
+    data, _ = upgrade_document("archive", data)
+    return unstamped(data)
+
+
+def extract_moments(session: dict) -> list:
+    """
+    Split a session log into retrievable moments.
+
+    A player message and the DM reply that follows it form one moment; dice
+    rolls are their own moments.
+    """
+    moments = []
+    pending_player = None
+    for entry in session.get("log", []):
+        if entry.get("type") == "chat":
+            if entry.get("role") == "player":
+                if pending_player:
+                    moments.append({"kind": "chat", "text": f"Player: {pending_player}"})
+                pending_player = entry.get("content", "")
+            else:
+                text = f"DM: {entry.get('content', '')}"
+                if pending_player:
+                    text = f"Player: {pending_player}\n{text}"
+                    pending_player = None
+                moments.append({"kind": "chat", "text": text})
+        elif entry.get("type") == "roll":
+            purpose = entry.get("purpose") or "a roll"
+            threshold = f" ({entry['threshold']})" if entry.get("threshold") else ""
+            moments.append({
+                "kind": "roll",
+                "text": f"Rolled {entry.get('die', '')} for {purpose}: {entry.get('total', '')}{threshold}"
+            })
+    if pending_player:
+        moments.append({"kind": "chat", "text": f"Player: {pending_player}"})
+    return moments
+
+
+def archive_session(campaign_id: str, session: dict, outcome: str) -> Optional[dict]:
+    """
+    Archive a finished session and add it to the history index. Returns the archive record.
+
+    A session already carrying an archived_episode marker (its end was retried)
+    returns that episode's record instead of archiving it again.
+    """
+    if not session.get("active"):
+        return None
+    if session.get("archived_episode"):
+        record = load_archived_session(campaign_id, session["archived_episode"])
+        if record:
+            return record
+
+    # Held until the archive is written, so concurrent ends cannot both pick the same number
+    with _archive_lock(campaign_id):
+        existing = list_archived_episodes(campaign_id)
+        episode = existing[-1] + 1 if existing else 1
+
+        record = {
+            "episode": episode,
+            "ended_at": datetime.utcnow().isoformat() + "Z",
+            "outcome": outcome,
+            "quest": session.get("quest", ""),
+            "location": session.get("location", ""),
+            "party": [m.get("name", "") for m in session.get("party", [])],
+            "log": session.get("log", []),
+            "images": session.get("images", []),
+            "recap": None,
+        }
+        save_campaign_json(campaign_id, _archive_filename(episode), stamp_document("archive", record))
+        index_episode(campaign_id, record)
+    return record
+
+
+# === Recaps ===
+
+def _fallback_recap(record: dict) -> str:
+    """Extractive recap used when the model is unavailable"""
+    dm_lines = [e.get("content", "") for e in record.get("log", []) if e.get("type") == "chat" and e.get("role") == "dm"]
+    party = ", ".join(record.get("party", [])) or "The party"
+    recap = f"{party} set out on \"{record.get('quest', 'a quest')}\" at {record.get('location', 'an unknown place')} and the episode ended in {record.get('outcome', 'an unknown outcome')}."
+    if dm_lines:
+        recap += f" It closed with: {dm_lines[-1][:300]}"
+    return recap
+
+
+def generate_recap(campaign_id: str, episode: int) -> str:
+    """Generate and store a compact recap for an archived episode (run as a background task)"""
+    record = load_archived_session(campaign_id, episode)
+    if not record:
+        return ""
+
+    transcript = "\n".join(m["text"] for m in extract_moments(record))
+    if not transcript:
+        recap = _fallback_recap(record)
+    else:
+        try:
+            recap = claude_message(
+                priority=Priority.BACKGROUND,
+                campaign_id=campaign_id,
+                feature="recap",
+                model="claude-3-5-haiku-latest",
+                max_tokens=300,
+                messages=[{
+                    "role": "user",
+                    "content": f"""Summarize this tabletop RPG episode as a recap the DM can use next time.
+
+Quest: {record.get('quest', '')}
+Location: {record.get('location', '')}
+Party: {', '.join(record.get('party', []))}
+Outcome: {record.get('outcome', '')}
+
+Transcript:
+{transcript[-12000:]}
+
+Rules:
+- Output ONLY the recap, 3-5 sentences
+- Name the NPCs, places, and items that matter
+- Mention unresolved threads the party may return to"""
+                }]
+            ).strip()
+        except Exception as e:
+            FALLBACKS.inc(step="recap")
+            print(f"Recap generation failed: {e}")
+            recap = _fallback_recap(record)
+
+    record["recap"] = recap
+    save_campaign_json(campaign_id, _archive_filename(episode), stamp_document("archive", record))
+    recaps = _load_recaps(campaign_id)
+    recaps[str(episode)] = recap
+    save_campaign_json(campaign_id, RECAPS_FILE, {"recaps": recaps})
+    return recap
+
+
+def _load_recaps(campaign_id: str) -> dict:
+    """Recaps by episode (as strings), built from the archives once for campaigns that predate recaps.json"""
+    data = load_campaign_json(campaign_id, RECAPS_FILE)
+    if data:
+        return data.get("recaps", {})
+    recaps = {}
+    for episode in list_archived_episodes(campaign_id):
+        recap = load_archived_session(campaign_id, episode).get("recap")
+        if recap:
+            recaps[str(episode)] = recap
+    if recaps:
+        save_campaign_json(campaign_id, RECAPS_FILE, {"recaps": recaps})
+    return recaps
+
+
+def get_latest_recap(campaign_id: str) -> Optional[dict]:
+    """Return {"episode", "recap"} for the most recent archived episode that has a recap"""
+    recaps = _load_recaps(campaign_id)
+    if not recaps:
+        return None
+    episode = max(recaps, key=int)
+    return {"episode": int(episode), "recap": recaps[episode]}
+
+
+# === Recall ===
+
+def reindex_history(campaign_id: str) -> int:
+    """Index any archived episodes missing from the history index. Returns episodes added."""
+    done = indexed_episodes(campaign_id)
+    added = 0
+    for episode in list_archived_episodes(campaign_id):
+        if episode not in done:
+            index_episode(campaign_id, load_archived_session(campaign_id, episode))
+            added += 1
+    return added
+
+
+def recall_moments(campaign_id: str, query: str, limit: int = 4) -> list:
+    """Return the most relevant archived moments for a query, ranked by bm25"""
+    if not has_history_index(campaign_id):
+        return []
+    results = search_history(campaign_id, query, limit=limit)["results"]
+    # Present in story order so the DM reads them chronologically
+    results.sort(key=lambda r: (r["episode"], r["kind"] != "chat", r["position"]))
+    moments = []
+    for result in results:
+        text = result["text"]
+        if result["kind"] == "chat":
+            text = f"{'Player' if result['role'] == 'player' else 'DM'}: {text}"
+        elif result["kind"] == "scene":
+            text = f"Scene: {text}"
+        moments.append({"episode": result["episode"], "kind": result["kind"], "text": text})
+    return moments
+
+
+register_cache("archive_locks", lambda: dict(_archive_locks))
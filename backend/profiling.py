@@ -0,0 +1,404 @@
+"""
+Sampling profiler: one request on demand, or every route continuously
+
+A background thread samples the stacks of every thread (sys._current_frames)
+and charges each stack to the request it is running code for. Requests are
+found through ProfilingMiddleware, which puts the request's state in a
+contextvar. On the event loop thread the sampler finds the middleware's own
+frame below the running code. In threadpool workers (starlette's
+run_in_threadpool, asyncio.to_thread) it reads the contextvar from the
+Context the work was handed with. Stacks are cut at that boundary, so they
+start at the request's own code.
+
+Samples show code that is running or blocked inside a thread. A coroutine
+suspended at an await (an async sleep, say) is not on any stack and is not
+sampled.
+
+Two modes, both admin-only (see routes/admin.py):
+
+- Per request: send `X-Weave-Profile: 1` (or `?weave_profile=1`) with the
+  admin token. The request is sampled every PROFILE_INTERVAL_SECONDS. The
+  response carries `X-Weave-Profile-Id`, and the profile is kept in memory
+  (the last MAX_PROFILES) for GET /admin/profiles/{id}.
+- Continuous: start_continuous(interval_ms) samples at a low rate, adding
+  stacks up per route template. It is started at startup when
+  config.PROFILE_CONTINUOUS_MS is set, or at runtime through the admin routes.
+
+Profiles come back as folded stacks ("a;b;c 12" per line, the input format of
+flamegraph.pl, speedscope and inferno) or as an SVG flamegraph.
+"""
+
+import contextvars
+import hashlib
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from html import escape
+from typing import Optional
+from urllib.parse import parse_qs
+
+from admin_auth import ADMIN_HEADER, is_admin_token
+from memory_report import register_cache
+
+PROFILE_HEADER = b"x-weave-profile"
+PROFILE_QUERY = "weave_profile"
+PROFILE_INTERVAL_SECONDS = 0.005
+MAX_PROFILES = 50
+# Distinct stacks kept per route in continuous mode; further ones count as "[other]"
+MAX_STACKS_PER_ROUTE = 5000
+MAX_STACK_DEPTH = 128
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+        self.started = time.time()
+        self.seconds = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started": self.started,
+            "seconds": round(self.seconds, 4),
+            "samples": self.samples,
+        }
+
+
+class _RequestState:
+    """What the sampler needs to know about a request in flight"""
+
+    def __init__(self, scope: dict, profile: Optional[RequestProfile]):
+        self.scope = scope
+        self.profile = profile
+
+    @property
+    def route(self) -> str:
+        return getattr(self.scope.get("route"), "path", None) or "unmatched"
+
+
+class _Continuous:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.started = time.time()
+        self.last_sample = 0.0
+        self.samples: Counter = Counter()
+        self.stacks: dict = {}
+
+    def add(self, route: str, stack: str):
+        stacks = self.stacks.setdefault(route, Counter())
+        if stack not in stacks and len(stacks) >= MAX_STACKS_PER_ROUTE:
+            stack = "[other]"
+        stacks[stack] += 1
+        self.samples[route] += 1
+
+
+_request_state: contextvars.ContextVar = contextvars.ContextVar("weave_profiling", default=None)
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_active: set = set()
+_profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+_continuous: Optional[_Continuous] = None
+_sampler: Optional[threading.Thread] = None
+
+
+# === Finding the request a thread is working for ===
+
+def _boundary_codes() -> dict:
+    """Code objects of the frames that hand work to a request: code -> how to find its state"""
+    from concurrent.futures.thread import _WorkItem
+
+    codes = {ProfilingMiddleware.__call__.__code__: "middleware", _WorkItem.run.__code__: "work_item"}
+    try:
+        from anyio._backends._asyncio import WorkerThread
+        codes[WorkerThread.run.__code__] = "anyio_worker"
+    except (ImportError, AttributeError):
+        pass
+    return codes
+
+
+_BOUNDARIES: dict = {}
+
+
+def _state_at(frame, kind: str) -> Optional[_RequestState]:
+    local = frame.f_locals
+    if kind == "middleware":
+        return local.get("state")
+    if kind == "anyio_worker":
+        context = local.get("context")
+    else:
+        # asyncio.to_thread submits functools.partial(context.run, func)
+        fn = getattr(local.get("self"), "fn", None)
+        context = getattr(getattr(fn, "func", None), "__self__", None)
+    if isinstance(context, contextvars.Context):
+        return context.get(_request_state)
+    return None
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _attribute(frame) -> tuple:
+    """(request state, folded stack) for a thread's innermost frame, or (None, None)"""
+    names = []
+    while frame is not None:
+        kind = _BOUNDARIES.get(frame.f_code)
+        if kind is not None:
+            state = _state_at(frame, kind)
+            if state is None or not names:
+                return None, None
+            return state, ";".join(reversed(names[:MAX_STACK_DEPTH]))
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return None, None
+
+
+# === The sampler thread ===
+
+def _sample_once():
+    own = threading.get_ident()
+    now = time.monotonic()
+    continuous = _continuous
+    take_continuous = continuous is not None and now - continuous.last_sample >= continuous.interval
+    if not _active and not take_continuous:
+        return
+    with _lock:
+        if take_continuous:
+            continuous.last_sample = now
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            state, stack = _attribute(frame)
+            if state is None:
+                continue
+            if state.profile is not None and state.profile in _active:
+                state.profile.stacks[stack] += 1
+                state.profile.samples += 1
+            if take_continuous:
+                continuous.add(state.route, stack)
+
+
+def _run_sampler():
+    while True:
+        continuous = _continuous
+        if not _active and continuous is None:
+            _wake.wait()
+            _wake.clear()
+            continue
+        intervals = ([PROFILE_INTERVAL_SECONDS] if _active else []) + ([continuous.interval] if continuous else [])
+        time.sleep(min(intervals))
+        _sample_once()
+
+
+def _ensure_sampler():
+    global _sampler
+    with _lock:
+        if not _BOUNDARIES:
+            _BOUNDARIES.update(_boundary_codes())
+        if _sampler is None:
+            _sampler = threading.Thread(target=_run_sampler, name="weave-profiler", daemon=True)
+            _sampler.start()
+    _wake.set()
+
+
+# === Per-request profiles ===
+
+def _begin(profile: RequestProfile):
+    with _lock:
+        _active.add(profile)
+    # After adding, so an idle sampler wakes to find it
+    _ensure_sampler()
+
+
+def _finish(profile: RequestProfile):
+    with _lock:
+        _active.discard(profile)
+        _profiles[profile.id] = profile
+        while len(_profiles) > MAX_PROFILES:
+            _profiles.popitem(last=False)
+
+
+def get_profile(profile_id: str) -> Optional[RequestProfile]:
+    return _profiles.get(profile_id)
+
+
+def list_profiles() -> list:
+    """Kept profiles, newest first"""
+    return [profile.summary() for profile in reversed(_profiles.values())]
+
+
+# === Continuous mode ===
+
+def start_continuous(interval_ms: float):
+    """Sample every route every interval_ms from now on; restarting clears what was collected"""
+    global _continuous
+    _continuous = _Continuous(interval_ms / 1000)
+    _ensure_sampler()
+
+
+def stop_continuous():
+    global _continuous
+    _continuous = None
+
+
+def continuous_summary(top: int = 10) -> dict:
+    """Per route: samples and the functions with the most samples at the top of the stack"""
+    continuous = _continuous
+    if continuous is None:
+        return {"running": False, "routes": {}}
+    with _lock:
+        routes = {
+            route: {
+                "samples": continuous.samples[route],
+                "top": _self_counts(stacks).most_common(top),
+            }
+            for route, stacks in continuous.stacks.items()
+        }
+    return {
+        "running": True,
+        "interval_ms": continuous.interval * 1000,
+        "started": continuous.started,
+        "routes": dict(sorted(routes.items(), key=lambda item: -item[1]["samples"])),
+    }
+
+
+def continuous_stacks(route: Optional[str] = None) -> Counter:
+    """Folded stacks for one route, or for all of them under a root frame per route"""
+    continuous = _continuous
+    if continuous is None:
+        return Counter()
+    with _lock:
+        if route is not None:
+            return Counter(continuous.stacks.get(route, {}))
+        merged = Counter()
+        for name, stacks in continuous.stacks.items():
+            for stack, count in stacks.items():
+                merged[f"{name};{stack}"] += count
+        return merged
+
+
+def _self_counts(stacks: Counter) -> Counter:
+    counts = Counter()
+    for stack, count in stacks.items():
+        counts[stack.rsplit(";", 1)[-1]] += count
+    return counts
+
+
+# === Output ===
+
+def folded(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def flamegraph_svg(stacks: Counter, title: str = "", width: int = 1200) -> str:
+    """A self-contained SVG flamegraph (root at the bottom; hover a frame for its samples)"""
+    tree: dict = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        tree["count"] += count
+        node = tree
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"count": 0, "children": {}})
+            node["count"] += count
+
+    def depth(node) -> int:
+        return 1 + max((depth(child) for child in node["children"].values()), default=0)
+
+    row, top = 16, 24
+    height = top + row * max(depth(tree) - 1, 1) + 4
+    total = tree["count"] or 1
+    scale = width / total
+    rects = []
+
+    def draw(node, x: float, level: int):
+        for name, child in sorted(node["children"].items()):
+            w = child["count"] * scale
+            if w >= 0.5:
+                y = height - 4 - row * (level + 1)
+                hue = int(hashlib.md5(name.encode()).hexdigest()[:2], 16)
+                label = escape(name)
+                text = label if len(name) * 7 < w else ""
+                rects.append(
+                    f'<g><title>{label} ({child["count"]} samples, {child["count"] / total:.1%})</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" fill="rgb(230,{80 + hue // 2},{hue // 4})"/>'
+                    f'<text x="{x + 3:.1f}" y="{y + row - 4}">{text}</text></g>'
+                )
+                draw(child, x, level + 1)
+            x += w
+
+    draw(tree, 0.0, 0)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">'
+        f'<text x="4" y="16" font-size="13">{escape(title)} ({tree["count"]} samples)</text>'
+        + "".join(rects)
+        + "</svg>"
+    )
+
+
+# === Middleware ===
+
+def _wants_profile(scope: dict) -> bool:
+    headers = dict(scope.get("headers") or [])
+    flag = headers.get(PROFILE_HEADER, b"").decode()
+    if not flag:
+        flag = parse_qs(scope.get("query_string", b"").decode()).get(PROFILE_QUERY, [""])[0]
+    if flag.lower() not in ("1", "true", "yes"):
+        return False
+    return is_admin_token(headers.get(ADMIN_HEADER.lower().encode(), b"").decode())
+
+
+class ProfilingMiddleware:
+    """ASGI middleware marking each request for the sampler, and profiling those that ask (as admin)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope.get("path", "")) if _wants_profile(scope) else None
+        # The sampler reads this local from this frame (see _state_at)
+        state = _RequestState(scope, profile)
+        reset = _request_state.set(state)
+        if profile is None:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _request_state.reset(reset)
+            return
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-weave-profile-id", profile.id.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        _begin(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _request_state.reset(reset)
+            profile.seconds = time.perf_counter() - started
+            profile.route = state.route
+            _finish(profile)
+
+
+register_cache("request_profiles", lambda: {profile_id: profile.stacks for profile_id, profile in dict(_profiles).items()})
+register_cache("continuous_profile", lambda: dict(_continuous.stacks) if _continuous is not None else {})
@@ -0,0 +1,252 @@
+"""
+Retries and circuit breakers for the upstream providers (Anthropic, Replicate)
+
+with_retries() runs one provider call. Errors that say the provider is
+briefly unable to answer are retried with jittered exponential backoff, as
+long as the request's Deadline leaves room for the wait:
+- 408, 409, 429 and 5xx responses (529 overloaded included)
+- dropped connections and timeouts
+Other errors (bad requests, auth, failed predictions) are raised at once.
+
+Each provider has a CircuitBreaker. It opens after BREAKER_FAILURES
+retryable failures in a row. 429s do not count: they mean we are over quota,
+and llm_scheduler slows down for them. While open, calls fail fast with
+ProviderUnavailable for BREAKER_RESET_SECONDS. Then one trial call is let
+through, which closes the breaker again on success. Optional work, such as
+illustrations, checks provider_available() and is skipped while a provider
+is down.
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+
+from cancellation import Cancelled, CancelToken
+from deadlines import Deadline, DeadlineExceeded
+from lazy_imports import LazyModule
+from metrics import register_collector
+
+# The SDKs are only needed to recognise their errors, and an error can only
+# come from an SDK that was imported (see lazy_imports.py)
+anthropic = LazyModule("anthropic")
+httpx = LazyModule("httpx")
+replicate_exceptions = LazyModule("replicate.exceptions")
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+BREAKER_FAILURES = 5
+BREAKER_RESET_SECONDS = 30.0
+
+RETRYABLE_STATUS = (408, 409, 429)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ProviderUnavailable(Exception):
+    """The provider's breaker is open: it has been failing, so calls fail fast"""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} is unavailable, retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_total = 0
+        self.retries_total = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def _retry_after(self, now: float) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - now)
+
+    @property
+    def available(self) -> bool:
+        """Whether a call would be let through now (without claiming the half-open trial)"""
+        with self._lock:
+            if self.state == OPEN:
+                return self._retry_after(time.monotonic()) == 0
+            return not (self.state == HALF_OPEN and self._trial_running)
+
+    def before_call(self):
+        """Let a call through or raise ProviderUnavailable"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if self._retry_after(now) > 0:
+                    raise ProviderUnavailable(self.name, self._retry_after(now))
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._trial_running:
+                    raise ProviderUnavailable(self.name, self.reset_seconds)
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened_total += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def record_neutral(self):
+        """The call ended without telling us anything about the provider's health"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_retry(self):
+        with self._lock:
+            self.retries_total += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "opened_total": self.opened_total,
+                "retries_total": self.retries_total,
+                "retry_after_seconds": round(self._retry_after(time.monotonic()), 1) if self.state == OPEN else 0,
+            }
+
+
+breakers = {
+    "anthropic": CircuitBreaker("anthropic"),
+    "replicate": CircuitBreaker("replicate"),
+}
+
+
+def _status(error: BaseException) -> Optional[int]:
+    if anthropic.loaded and isinstance(error, anthropic.APIStatusError):
+        return error.status_code
+    if replicate_exceptions.loaded and isinstance(error, replicate_exceptions.ReplicateError):
+        return error.status
+    if httpx.loaded and isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether error means the provider may well answer if asked again shortly"""
+    if anthropic.loaded and isinstance(error, anthropic.APIConnectionError):
+        return True
+    if httpx.loaded and isinstance(error, httpx.TransportError):
+        return True
+    status = _status(error)
+    return status is not None and (status in RETRYABLE_STATUS or status >= 500)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from a retry-after header"""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, error: BaseException) -> float:
+    """Full-jitter exponential backoff, no shorter than the provider's retry-after"""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    return max(delay, retry_after(error) or 0)
+
+
+def _sleep(seconds: float, token: Optional[CancelToken]):
+    end = time.monotonic() + seconds
+    while (left := end - time.monotonic()) > 0:
+        if token is not None:
+            token.raise_if_cancelled()
+        time.sleep(min(left, 0.1))
+
+
+def with_retries(
+    provider: str,
+    call: Callable[[], object],
+    token: Optional[CancelToken] = None,
+    deadline: Optional[Deadline] = None,
+    can_retry: Optional[Callable[[], bool]] = None,
+):
+    """
+    Run call() through provider's breaker, retrying retryable errors while time allows.
+
+    can_retry, if given, is asked before each retry; a call that has already
+    produced output the caller has used should not be repeated.
+    """
+    breaker = breakers[provider]
+    for attempt in range(MAX_ATTEMPTS):
+        breaker.before_call()
+        try:
+            result = call()
+        except (Cancelled, DeadlineExceeded):
+            breaker.record_neutral()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                # The provider answered; the request itself was at fault
+                breaker.record_neutral()
+                raise
+            if _status(e) == 429:
+                breaker.record_neutral()
+            else:
+                breaker.record_failure()
+            delay = backoff_delay(attempt, e)
+            if attempt + 1 == MAX_ATTEMPTS or (deadline is not None and not deadline.allows(delay)):
+                raise
+            if can_retry is not None and not can_retry():
+                raise
+            breaker.record_retry()
+            _sleep(delay, token)
+        else:
+            breaker.record_success()
+            return result
+
+
+def provider_available(provider: str) -> bool:
+    """Whether provider's breaker would let a call through; optional work checks this first"""
+    return breakers[provider].available
+
+
+def unavailable(error: ProviderUnavailable) -> HTTPException:
+    """The 503 a route answers with while a provider's breaker is open"""
+    return HTTPException(
+        status_code=503,
+        detail=f"AI provider unavailable: {error.provider} is failing, try again shortly",
+        headers={"Retry-After": str(max(1, round(error.retry_after)))},
+    )
+
+
+def snapshot() -> dict:
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+
+def _collect_metrics() -> list:
+    providers = snapshot()
+    return [
+        ("weave_provider_breaker_state", "gauge", "Circuit breaker state per provider and state (1 for the current one)",
+         [({"provider": name, "state": state}, int(info["state"] == state)) for name, info in providers.items() for state in (CLOSED, OPEN, HALF_OPEN)]),
+        ("weave_provider_breaker_opened_total", "counter", "Times each provider's breaker has opened",
+         [({"provider": name}, info["opened_total"]) for name, info in providers.items()]),
+        ("weave_provider_retries_total", "counter", "Provider calls retried after a transient error",
+         [({"provider": name}, info["retries_total"]) for name, info in providers.items()]),
+    ]
+
+
+register_collector(_collect_metrics)
@@ -0,0 +1,134 @@
+"""
+Admin-only endpoints for looking inside a running worker: request profiles,
+the continuous per-route profiler, and memory (caches, live objects,
+tracemalloc snapshots). Every route needs the admin token.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel, Field
+
+import memory_report
+import profiling
+from admin_auth import require_admin
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+def _render(stacks, title: str, format: str) -> Response:
+    if format == "folded":
+        return PlainTextResponse(profiling.folded(stacks))
+    return Response(profiling.flamegraph_svg(stacks, title), media_type="image/svg+xml")
+
+
+@router.get("/profiles")
+def list_profiles():
+    """Profiled requests kept in this worker, newest first"""
+    return {"profiles": profiling.list_profiles()}
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = Query("svg", pattern="^(svg|folded)$")):
+    """One request's profile as an SVG flamegraph or folded stacks"""
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (only the most recent are kept, per worker)")
+    return _render(profile.stacks, f"{profile.method} {profile.path} in {profile.seconds * 1000:.0f}ms", format)
+
+
+class ContinuousRequest(BaseModel):
+    interval_ms: float = Field(50, ge=1, le=10_000)
+
+
+@router.post("/profiling/continuous")
+def start_continuous(request: ContinuousRequest):
+    """Start (or restart, clearing what was collected) continuous sampling of every route"""
+    profiling.start_continuous(request.interval_ms)
+    return profiling.continuous_summary()
+
+
+@router.delete("/profiling/continuous")
+def stop_continuous():
+    profiling.stop_continuous()
+    return {"running": False}
+
+
+@router.get("/profiling/routes")
+def continuous_summary(top: int = Query(10, ge=1, le=100)):
+    """Samples per route and the functions most often running, since continuous sampling started"""
+    return profiling.continuous_summary(top)
+
+
+@router.get("/profiling/flamegraph")
+def continuous_flamegraph(
+    route: Optional[str] = Query(None, description="A route template, e.g. /campaigns/{campaign_id}/dm/message; all routes if omitted"),
+    format: str = Query("svg", pattern="^(svg|folded)$"),
+):
+    """Continuous samples for one route, or all of them rooted at their route, as a flamegraph"""
+    return _render(profiling.continuous_stacks(route), route or "all routes", format)
+
+
+# === Memory ===
+
+GROUP_BY_PATTERN = "^(lineno|filename|traceback)$"
+
+
+@router.get("/memory")
+def memory_overview():
+    """RSS, tracemalloc status, live counts of campaign models and documents, and every in-process cache's size"""
+    return memory_report.overview()
+
+
+class TracingRequest(BaseModel):
+    frames: int = Field(1, ge=1, le=50, description="Stack frames kept per allocation; more is slower")
+
+
+@router.post("/memory/tracemalloc")
+def start_tracing(request: TracingRequest):
+    """Start tracing allocations (restarting drops earlier snapshots)"""
+    memory_report.start_tracing(request.frames)
+    return {"tracing": True, "frames": request.frames}
+
+
+@router.delete("/memory/tracemalloc")
+def stop_tracing():
+    memory_report.stop_tracing()
+    return {"tracing": False}
+
+
+@router.post("/memory/snapshots")
+def take_snapshot(limit: int = Query(25, ge=1, le=500)):
+    """Snapshot traced allocations; returns its id and largest allocation sites"""
+    try:
+        snapshot_id = memory_report.take_snapshot()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"id": snapshot_id, "top": memory_report.top_allocations(snapshot_id, limit=limit)}
+
+
+@router.get("/memory/snapshots/{snapshot_id}")
+def get_snapshot(
+    snapshot_id: int,
+    group_by: str = Query("lineno", pattern=GROUP_BY_PATTERN),
+    limit: int = Query(25, ge=1, le=500),
+):
+    try:
+        return {"id": snapshot_id, "top": memory_report.top_allocations(snapshot_id, group_by, limit)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+
+@router.get("/memory/diff")
+def diff_snapshots(
+    base: int,
+    head: int,
+    group_by: str = Query("lineno", pattern=GROUP_BY_PATTERN),
+    limit: int = Query(25, ge=1, le=500),
+):
+    """Allocation sites that grew or shrank most from snapshot base to snapshot head"""
+    try:
+        return {"base": base, "head": head, "sites": memory_report.diff(base, head, group_by, limit)}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Snapshot {e.args[0]} not found")
@@ -2,25 +2,29 @@
 Campaign content, drafts, state, beats, and DM context routes
 """
 
-from fastapi import APIRouter, HTTPException
+from typing import Optional
 
-from models import CampaignContentRequest, BeatHitRequest
+from fastapi import APIRouter, HTTPException, Query
+
+from models import CampaignContentRequest, BeatHitRequest, StateRollbackRequest
 from helpers import load_json, save_json, load_campaign_json, save_campaign_json
 from campaign_schema import (
     CampaignContent,
     CampaignState,
-    NPCState,
     validate_campaign_content,
 )
 from campaign_logic import (
     load_campaign_content,
+    save_campaign_content,
     load_campaign_state,
     save_campaign_state,
+    has_campaign_state,
+    record_state_events,
     get_available_beats,
-    advance_threat,
     build_dm_context,
-    _migrate_campaign_data,
 )
+from schema_migrations import upgrade_document, unstamped
+from campaign_events import has_event_log, list_events, last_seq
 
 router = APIRouter()
 
@@ -33,7 +37,7 @@ def create_campaign_content(campaign_id: str, request: CampaignContentRequest):
         raise HTTPException(status_code=400, detail={"errors": result.errors})
 
     content = CampaignContent(**request.content)
-    save_campaign_json(campaign_id, "campaign.json", content.dict())
+    save_campaign_content(campaign_id, content)
 
     # Mark campaign as no longer a draft
     campaigns_data = load_json("campaigns.json")
@@ -44,19 +48,20 @@ def create_campaign_content(campaign_id: str, request: CampaignContentRequest):
     save_json("campaigns.json", campaigns_data)
 
     # Initialize state if needed
-    state_data = load_campaign_json(campaign_id, "state.json")
-    if not state_data:
+    if not has_campaign_state(campaign_id):
         state = CampaignState()
         state.initialize_from_content(content)
-        save_campaign_state(campaign_id, state)
+        save_campaign_state(campaign_id, state, event_type="state_initialized")
 
     return {"success": True, "warnings": result.warnings, "campaign_id": campaign_id}
 
 @router.post("/campaigns/{campaign_id}/draft")
 def save_campaign_draft(campaign_id: str, request: CampaignContentRequest):
     """Save campaign content as draft (no validation)"""
-    # Save raw content without validation
-    save_campaign_json(campaign_id, "draft.json", request.content)
+    # Save raw content without validation. Clients may post old-format drafts,
+    # so run the migrations rather than trusting any stamp they sent.
+    draft, _ = upgrade_document("draft", unstamped(request.content))
+    save_campaign_json(campaign_id, "draft.json", draft)
 
     # Ensure campaign is marked as draft
     campaigns_data = load_json("campaigns.json")
@@ -78,21 +83,17 @@ def get_campaign_draft(campaign_id: str):
     """Get campaign draft content for resuming editing"""
     draft = load_campaign_json(campaign_id, "draft.json")
     if draft:
-        # Handle old format where draft.json was {content: {...}, system: {...}}
-        if "content" in draft and isinstance(draft["content"], dict) and "name" in draft["content"]:
-            draft = draft["content"]
-        # Migrate old schema (anchor_runs → beats, etc.)
-        if "anchor_runs" in draft or ("threat" in draft and "advance_on" in draft.get("threat", {})):
-            draft = _migrate_campaign_data(draft)
-        return {"hasDraft": True, "content": draft}
+        # Old drafts (wrapped format, anchor_runs schema) are upgraded and saved once
+        draft, upgraded = upgrade_document("draft", draft)
+        if upgraded:
+            save_campaign_json(campaign_id, "draft.json", draft)
+        return {"hasDraft": True, "content": unstamped(draft)}
 
     # Fall back to campaign.json if exists
     content = load_campaign_json(campaign_id, "campaign.json")
     if content:
-        # Migrate if needed
-        if "anchor_runs" in content or ("threat" in content and "advance_on" in content.get("threat", {})):
-            content = _migrate_campaign_data(content)
-        return {"hasDraft": False, "content": content}
+        content, _ = upgrade_document("campaign", content)
+        return {"hasDraft": False, "content": unstamped(content)}
 
     return {"hasDraft": False, "content": None}
 
@@ -102,7 +103,7 @@ def get_campaign_content_endpoint(campaign_id: str):
     content = load_campaign_content(campaign_id)
     if not content:
         raise HTTPException(status_code=404, detail="Campaign content not found")
-    return content.dict()
+    return content.model_dump()
 
 @router.put("/campaigns/{campaign_id}/content")
 def update_campaign_content(campaign_id: str, request: CampaignContentRequest):
@@ -112,23 +113,54 @@ def update_campaign_content(campaign_id: str, request: CampaignContentRequest):
         raise HTTPException(status_code=400, detail={"errors": result.errors})
 
     content = CampaignContent(**request.content)
-    save_campaign_json(campaign_id, "campaign.json", content.dict())
+    save_campaign_content(campaign_id, content)
 
     # Update state to include any new NPCs
     state = load_campaign_state(campaign_id)
+    events = []
     for npc in content.npcs:
         npc_key = npc.name.lower().replace(" ", "_")
         if npc_key not in state.npcs:
-            state.npcs[npc_key] = NPCState()
-    save_campaign_state(campaign_id, state)
+            events.append({"type": "npc_added", "data": {"npc_key": npc_key}})
+    if events:
+        record_state_events(campaign_id, events)
 
     return {"success": True, "warnings": result.warnings}
 
 @router.get("/campaigns/{campaign_id}/state")
-def get_campaign_state_endpoint(campaign_id: str):
-    """Get campaign runtime state"""
-    state = load_campaign_state(campaign_id)
-    return state.dict()
+def get_campaign_state_endpoint(
+    campaign_id: str,
+    as_of_episode: Optional[int] = Query(None, ge=0),
+    as_of_seq: Optional[int] = Query(None, ge=0),
+):
+    """Get campaign runtime state, optionally as it was once N episodes were done or after event seq"""
+    state = load_campaign_state(campaign_id, as_of_seq=as_of_seq, as_of_episode=as_of_episode)
+    return state.model_dump()
+
+@router.get("/campaigns/{campaign_id}/events")
+def get_campaign_events(
+    campaign_id: str,
+    after_seq: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """List state change events, oldest first"""
+    return {
+        "events": list_events(campaign_id, after_seq=after_seq, limit=limit) if has_event_log(campaign_id) else [],
+        "last_seq": last_seq(campaign_id),
+    }
+
+@router.post("/campaigns/{campaign_id}/state/rollback")
+def rollback_campaign_state(campaign_id: str, request: StateRollbackRequest):
+    """Restore state as it was after event to_seq. Recorded as a new event, so it can be undone too."""
+    latest = last_seq(campaign_id)
+    if not latest:
+        raise HTTPException(status_code=404, detail="Campaign has no state history")
+    if request.to_seq > latest:
+        raise HTTPException(status_code=400, detail=f"Event {request.to_seq} does not exist (last is {latest})")
+
+    state = load_campaign_state(campaign_id, as_of_seq=request.to_seq)
+    save_campaign_state(campaign_id, state, event_type="state_restored", restored_to=request.to_seq)
+    return {"success": True, "restored_to": request.to_seq, "state": state.model_dump()}
 
 @router.post("/campaigns/{campaign_id}/state/reset")
 def reset_campaign_state(campaign_id: str):
@@ -139,7 +171,7 @@ def reset_campaign_state(campaign_id: str):
 
     state = CampaignState()
     state.initialize_from_content(content)
-    save_campaign_state(campaign_id, state)
+    save_campaign_state(campaign_id, state, event_type="state_reset")
     return {"success": True}
 
 @router.get("/campaigns/{campaign_id}/available-beats")
@@ -166,35 +198,30 @@ def hit_beat(campaign_id: str, request: BeatHitRequest):
     if not content:
         raise HTTPException(status_code=404, detail="Campaign content not found")
 
-    state = load_campaign_state(campaign_id)
-
     # Find the beat
     beat = next((b for b in content.beats if b.id == request.beat_id), None)
     if not beat:
         raise HTTPException(status_code=404, detail=f"Beat '{request.beat_id}' not found")
 
-    if beat.id in state.beats_hit:
-        raise HTTPException(status_code=400, detail=f"Beat '{request.beat_id}' already hit")
-
-    # Record the beat hit
-    state.beats_hit.append(beat.id)
-
-    # Add revelation to facts known
-    if beat.revelation:
-        state.facts_known.append(beat.revelation)
-        state.facts_known = list(set(state.facts_known))
-
-    # Add any additional facts
-    state.facts_known.extend(request.facts_learned)
-    state.facts_known = list(set(state.facts_known))
-
-    # Track NPCs met
-    for npc_name in request.npcs_met:
-        npc_key = npc_name.lower().replace(" ", "_")
-        if npc_key in state.npcs:
-            state.npcs[npc_key].met = True
-
-    save_campaign_state(campaign_id, state)
+    # Built under the event log lock, so two hits of the same beat cannot both pass the check
+    def beat_events(state):
+        if beat.id in state.beats_hit:
+            raise HTTPException(status_code=400, detail=f"Beat '{request.beat_id}' already hit")
+
+        # Record the beat hit, what the party learned, and who they met
+        events = [{"type": "beat_hit", "data": {"beat_id": beat.id}}]
+        facts = ([beat.revelation] if beat.revelation else []) + request.facts_learned
+        for fact in dict.fromkeys(facts):
+            if fact not in state.facts_known:
+                events.append({"type": "fact_learned", "data": {"fact": fact, "beat_id": beat.id}})
+        for npc_name in request.npcs_met:
+            npc_key = npc_name.lower().replace(" ", "_")
+            if npc_key in state.npcs:
+                events.append({"type": "npc_met", "data": {"npc_key": npc_key}})
+        return events
+
+    state, first_seq = record_state_events(campaign_id, beat_events)
+    rollback_to = first_seq - 1
 
     # Check if campaign is complete (all beats hit or finale beat hit)
     finale_hit = any(
@@ -209,7 +236,8 @@ def hit_beat(campaign_id: str, request: BeatHitRequest):
         "beats_hit": state.beats_hit,
         "episodes_completed": state.episodes_completed,
         "threat_stage": state.threat_stage,
-        "campaign_complete": finale_hit or all_beats_done or threat_maxed
+        "campaign_complete": finale_hit or all_beats_done or threat_maxed,
+        "rollback_to": rollback_to
     }
 
 @router.get("/campaigns/{campaign_id}/dm-context")
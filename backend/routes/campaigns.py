@@ -15,10 +15,18 @@ from config import TEMPLATES_DIR
 from models import CampaignCreate, CampaignUpdate
 from helpers import load_json, save_json, load_campaign_json, save_campaign_json, get_campaign_dir
 from campaign_schema import CampaignSystem, BLOOMBURROW_SYSTEM, DEFAULT_SYSTEM
+from content_index import drop_campaign_index
+from idempotency import drop_campaign_keys
+from campaign_actors import SESSION_FILE, ROSTER_FILE, peek_doc, discard
+from schema_migrations import stamp_document
 
 router = APIRouter()
 
 
+def _character_count(roster: dict) -> int:
+    return len(roster.get("characters", []))
+
+
 @router.get("/campaigns/{campaign_id}/system")
 def get_campaign_system(campaign_id: str):
     """Get the system configuration for a campaign"""
@@ -55,12 +63,12 @@ def get_campaigns():
     campaigns = []
     for campaign in data.get("campaigns", []):
         # Load campaign-specific data for stats
-        roster = load_campaign_json(campaign["id"], "roster.json")
+        character_count = peek_doc(campaign["id"], ROSTER_FILE, _character_count)
         town = load_campaign_json(campaign["id"], "town.json")
 
         campaigns.append({
             **campaign,
-            "characterCount": len(roster.get("characters", [])),
+            "characterCount": character_count,
             "currencyAmount": town.get("seeds", 0)
         })
 
@@ -76,11 +84,10 @@ def get_campaign(campaign_id: str):
     for campaign in data.get("campaigns", []):
         if campaign["id"] == campaign_id:
             # Add stats
-            roster = load_campaign_json(campaign_id, "roster.json")
             town = load_campaign_json(campaign_id, "town.json")
             return {
                 **campaign,
-                "characterCount": len(roster.get("characters", [])),
+                "characterCount": peek_doc(campaign_id, ROSTER_FILE, _character_count),
                 "currencyAmount": town.get("seeds", 0)
             }
     raise HTTPException(status_code=404, detail="Campaign not found")
@@ -126,14 +133,14 @@ def create_campaign(campaign: CampaignCreate):
     currency_config = system_config.get("currency", {"name": "Gold", "symbol": "\U0001fa99", "starting": 0})
 
     # Initialize campaign data files
-    save_campaign_json(campaign_id, "roster.json", {"characters": []})
+    save_campaign_json(campaign_id, ROSTER_FILE, stamp_document("roster", {"characters": []}))
     save_campaign_json(campaign_id, "town.json", {
         "name": "",
         "currency": currency_config.get("starting", 0),
         "buildings": buildings_init
     })
     save_campaign_json(campaign_id, "stash.json", {"items": []})
-    save_campaign_json(campaign_id, "current_session.json", {"active": False})
+    save_campaign_json(campaign_id, SESSION_FILE, stamp_document("session", {"active": False}))
     save_campaign_json(campaign_id, "system.json", system_config)
 
     # Add to campaigns list
@@ -193,9 +200,12 @@ def delete_campaign(campaign_id: str):
     save_json("campaigns.json", data)
 
     # Delete campaign data directory
+    discard(campaign_id)
     campaign_dir = get_campaign_dir(campaign_id)
     if os.path.exists(campaign_dir):
         shutil.rmtree(campaign_dir)
+    drop_campaign_index(campaign_id)
+    drop_campaign_keys(campaign_id)
 
     return {"deleted": campaign_id}
 
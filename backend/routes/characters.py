@@ -2,62 +2,75 @@
 Character CRUD routes
 """
 
+import copy
+
 from fastapi import APIRouter, HTTPException
 
 from models import Character
-from helpers import load_campaign_json, save_campaign_json
+from campaign_actors import ROSTER_FILE, read_doc, update_doc
 
 router = APIRouter()
 
 
+def _find_character(roster: dict, char_id: str):
+    return next((c for c in roster.get("characters", []) if c["id"] == char_id), None)
+
+
 @router.get("/campaigns/{campaign_id}/characters")
 def get_characters(campaign_id: str):
-    data = load_campaign_json(campaign_id, "roster.json")
+    data = read_doc(campaign_id, ROSTER_FILE)
     return data.get("characters", [])
 
 @router.post("/campaigns/{campaign_id}/characters")
 def create_character(campaign_id: str, character: Character):
-    data = load_campaign_json(campaign_id, "roster.json")
-    if "characters" not in data:
-        data["characters"] = []
+    def add(data: dict):
+        if "characters" not in data:
+            data["characters"] = []
+
+        # Generate ID
+        char_id = f"char_{len(data['characters']) + 1:03d}"
+        character.id = char_id
 
-    # Generate ID
-    char_id = f"char_{len(data['characters']) + 1:03d}"
-    character.id = char_id
+        data["characters"].append(character.model_dump())
 
-    data["characters"].append(character.dict())
-    save_campaign_json(campaign_id, "roster.json", data)
+    update_doc(campaign_id, ROSTER_FILE, add, returns=False)
     return character
 
 @router.get("/campaigns/{campaign_id}/characters/{char_id}")
 def get_character(campaign_id: str, char_id: str):
-    data = load_campaign_json(campaign_id, "roster.json")
-    for char in data.get("characters", []):
-        if char["id"] == char_id:
-            return char
-    raise HTTPException(status_code=404, detail="Character not found")
+    char = read_doc(campaign_id, ROSTER_FILE, lambda data: _find_character(data, char_id))
+    if char is None:
+        raise HTTPException(status_code=404, detail="Character not found")
+    return char
 
 @router.put("/campaigns/{campaign_id}/characters/{char_id}")
 def update_character(campaign_id: str, char_id: str, updates: dict):
     """Update a character's stats, level, etc."""
-    data = load_campaign_json(campaign_id, "roster.json")
-    for i, char in enumerate(data.get("characters", [])):
-        if char["id"] == char_id:
-            # Apply updates
-            for key, value in updates.items():
-                if key == "stats" and isinstance(value, dict):
-                    # Merge stats
-                    char["stats"] = {**char.get("stats", {}), **value}
-                else:
-                    char[key] = value
-            data["characters"][i] = char
-            save_campaign_json(campaign_id, "roster.json", data)
-            return char
-    raise HTTPException(status_code=404, detail="Character not found")
+    updated = {}
+
+    def check(data: dict):
+        if _find_character(data, char_id) is None:
+            raise HTTPException(status_code=404, detail="Character not found")
+
+    def apply(data: dict):
+        char = _find_character(data, char_id)
+        # Apply updates
+        for key, value in updates.items():
+            if key == "stats" and isinstance(value, dict):
+                # Merge stats
+                char["stats"] = {**char.get("stats", {}), **value}
+            else:
+                char[key] = value
+        # The body may change the id, so keep the result rather than looking it up again
+        updated.update(copy.deepcopy(char))
+
+    update_doc(campaign_id, ROSTER_FILE, apply, check=check, returns=False)
+    return updated
 
 @router.delete("/campaigns/{campaign_id}/characters/{char_id}")
 def delete_character(campaign_id: str, char_id: str):
-    data = load_campaign_json(campaign_id, "roster.json")
-    data["characters"] = [c for c in data.get("characters", []) if c["id"] != char_id]
-    save_campaign_json(campaign_id, "roster.json", data)
+    def remove(data: dict):
+        data["characters"] = [c for c in data.get("characters", []) if c["id"] != char_id]
+
+    update_doc(campaign_id, ROSTER_FILE, remove, returns=False)
     return {"deleted": char_id}
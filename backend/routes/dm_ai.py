@@ -6,15 +6,16 @@ import os
 import re
 import uuid
 
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import FileResponse
-import httpx
-import anthropic
-import replicate
 
+import config
 from config import IMAGES_DIR
 from models import DMMessage, ImageRequest
-from helpers import load_campaign_json, save_campaign_json, get_campaign_images_dir
+from helpers import load_campaign_json, get_campaign_images_dir
+from campaign_actors import SESSION_FILE, read_doc, update_doc
 from campaign_schema import BLOOMBURROW_SYSTEM
 from campaign_logic import (
     load_campaign_content,
@@ -27,18 +28,39 @@ from dm_context_builder import (
     build_dm_system_prompt,
     build_rules_reference,
     build_lore_section,
+    format_play_memory_for_dm,
 )
 from campaign_logic import get_available_beats
+from play_memory import recall_moments, get_latest_recap
+from idempotency import idempotency_key, run_idempotent
+from cancellation import Cancelled, CancelToken, run_until_disconnect
+from ai_calls import claude_message, render_image, fetch_bytes
+from deadlines import Deadline, DeadlineExceeded
+from resilience import ProviderUnavailable, provider_available, unavailable
+from metrics import FALLBACKS, stage
+from turn_traces import recorded
 
 router = APIRouter()
 
 # Default style for backwards compatibility
 DEFAULT_ART_STYLE = "fantasy illustration, detailed, atmospheric lighting"
 
+# Time an illustration stage is expected to need; with less left in the turn's
+# budget it is skipped (see deadlines.py). Stages are also skipped while their
+# provider's circuit breaker is open (see resilience.py).
+IMAGE_PROMPT_SECONDS = 2.0
+RENDER_SECONDS = 4.0
+
 
 # === Image Generation Helpers ===
 
-def craft_image_prompt(scene_description: str, session: dict) -> str:
+def craft_image_prompt(
+    scene_description: str,
+    session: dict,
+    token: Optional[CancelToken] = None,
+    deadline: Optional[Deadline] = None,
+    campaign_id: Optional[str] = None,
+) -> str:
     """Use Claude to craft an optimized image generation prompt"""
     party_info = ""
     if session.get("party"):
@@ -47,8 +69,11 @@ def craft_image_prompt(scene_description: str, session: dict) -> str:
     location = session.get("location", "a woodland location")
 
     try:
-        client = anthropic.Anthropic()
-        response = client.messages.create(
+        return claude_message(
+            token,
+            deadline=deadline,
+            campaign_id=campaign_id,
+            feature="image_prompt",
             model="claude-3-5-haiku-latest",
             max_tokens=200,
             messages=[{
@@ -68,18 +93,26 @@ Rules:
 - No action verbs - describe a frozen moment
 - Be specific about colors and lighting"""
             }]
-        )
-        return response.content[0].text.strip()
+        ).strip()
+    except (DeadlineExceeded, ProviderUnavailable):
+        if deadline is not None:
+            deadline.degrade("image_prompt")
+        return scene_description
     except Exception as e:
+        FALLBACKS.inc(step="image_prompt")
         print(f"Prompt crafting failed: {e}")
         return scene_description  # Fall back to original
 
 
-def download_image(url: str, campaign_id: str = None) -> str:
+def download_image(
+    url: str,
+    campaign_id: str = None,
+    token: Optional[CancelToken] = None,
+    deadline: Optional[Deadline] = None,
+) -> str:
     """Download image from URL and save locally, return local path"""
     try:
-        response = httpx.get(url, timeout=30.0)
-        response.raise_for_status()
+        content = fetch_bytes(url, token, deadline=deadline)
 
         # Generate unique filename
         filename = f"{uuid.uuid4().hex}.webp"
@@ -95,18 +128,37 @@ def download_image(url: str, campaign_id: str = None) -> str:
             url_path = f"/api/images/{filename}"
 
         with open(filepath, "wb") as f:
-            f.write(response.content)
+            f.write(content)
 
         return url_path
+    except (DeadlineExceeded, ProviderUnavailable):
+        if deadline is not None:
+            deadline.degrade("image_download")
+        return None
     except Exception as e:
+        FALLBACKS.inc(step="image_download")
         print(f"Failed to download image: {e}")
         return None
 
-def generate_scene_image(scene_description: str, session: dict, campaign_id: str = None, art_style: str = None) -> tuple[str, str]:
+def generate_scene_image(
+    scene_description: str,
+    session: dict,
+    campaign_id: str = None,
+    art_style: str = None,
+    token: Optional[CancelToken] = None,
+    deadline: Optional[Deadline] = None,
+) -> tuple[str, str]:
     """Generate an image for a scene and return (local_URL, crafted_prompt)"""
 
-    # First, craft an optimized prompt
-    crafted_prompt = craft_image_prompt(scene_description, session)
+    # First, craft an optimized prompt, unless that would leave too little time to render
+    short_on_time = deadline is not None and not deadline.allows(IMAGE_PROMPT_SECONDS + RENDER_SECONDS)
+    if short_on_time or not provider_available("anthropic"):
+        if deadline is not None:
+            deadline.degrade("image_prompt")
+        crafted_prompt = scene_description
+    else:
+        with stage("image_prompt"):
+            crafted_prompt = craft_image_prompt(scene_description, session, token, deadline, campaign_id)
 
     # Use provided art style or fall back to default
     style = art_style or "fantasy illustration, detailed, atmospheric lighting"
@@ -115,38 +167,83 @@ def generate_scene_image(scene_description: str, session: dict, campaign_id: str
     full_prompt = f"{style}, {crafted_prompt}"
 
     try:
-        output = replicate.run(
-            "black-forest-labs/flux-schnell",
-            input={
-                "prompt": full_prompt,
-                "num_outputs": 1,
-                "aspect_ratio": "16:9",
-                "output_format": "webp",
-                "output_quality": 80
-            }
-        )
-        # Convert FileOutput to string URL and download locally
-        if output and len(output) > 0:
-            remote_url = str(output[0])
-            local_url = download_image(remote_url, campaign_id)
+        with stage("render"):
+            remote_url = render_image(
+                {
+                    "prompt": full_prompt,
+                    "num_outputs": 1,
+                    "aspect_ratio": "16:9",
+                    "output_format": "webp",
+                    "output_quality": 80
+                },
+                token,
+                deadline,
+                campaign_id=campaign_id,
+                feature="illustration",
+            )
+        # Download locally
+        if remote_url:
+            with stage("download"):
+                local_url = download_image(remote_url, campaign_id, token, deadline)
             if local_url:
                 return local_url, crafted_prompt
             # Fallback to remote URL if download fails
             return remote_url, crafted_prompt
         return None, crafted_prompt
+    except (DeadlineExceeded, ProviderUnavailable):
+        if deadline is not None:
+            deadline.degrade("illustration")
+        return None, crafted_prompt
     except Exception as e:
+        FALLBACKS.inc(step="illustration")
         print(f"Image generation failed: {e}")
         return None, crafted_prompt
 
 
 # === DM Message Route ===
 
+def _record_turn(campaign_id: str, player_message: str, dm_text: str, session_updates: dict, new_images: list, interrupted: bool = False):
+    """Log a turn to the session. Applied to the latest copy so dice rolls made during the call are kept."""
+    dm_entry = {"type": "chat", "role": "dm", "content": dm_text}
+    if interrupted:
+        dm_entry["interrupted"] = True
+
+    def record_turn(current: dict):
+        if not current.get("active"):
+            return False
+        if new_images:
+            current.setdefault("images", []).extend(new_images)
+        current.update(session_updates)
+        current.setdefault("log", []).extend([
+            {"type": "chat", "role": "player", "content": player_message},
+            dm_entry,
+        ])
+
+    update_doc(campaign_id, SESSION_FILE, record_turn, returns=False)
+
+
 @router.post("/campaigns/{campaign_id}/dm/message")
-def dm_message(campaign_id: str, msg: DMMessage):
+async def dm_message(
+    campaign_id: str,
+    msg: DMMessage,
+    http_request: Request,
+    response: Response,
+    key: Optional[str] = Depends(idempotency_key),
+):
     """Send a message to Claude as DM, get response"""
+    return await run_until_disconnect(http_request, lambda token: run_idempotent(
+        campaign_id, key, ("dm/message", msg.model_dump()),
+        lambda work: _dm_message(campaign_id, msg, work), response, token,
+    ))
+
+
+@recorded("dm_message", DMMessage)
+def _dm_message(campaign_id: str, msg: DMMessage, token: Optional[CancelToken] = None):
+    deadline = Deadline(config.DM_TURN_BUDGET_SECONDS)
 
     # Load campaign system config
-    system_config = load_campaign_json(campaign_id, "system.json")
+    with stage("load"):
+        system_config = load_campaign_json(campaign_id, "system.json")
     if not system_config:
         # Fall back to Bloomburrow for backwards compatibility
         system_config = BLOOMBURROW_SYSTEM
@@ -157,26 +254,30 @@ def dm_message(campaign_id: str, msg: DMMessage):
     lore = build_lore_section(system_config)
 
     # Get current session
-    session = load_campaign_json(campaign_id, "current_session.json")
+    with stage("load"):
+        session = read_doc(campaign_id, SESSION_FILE)
 
     # Check for authored campaign content
     campaign_context_section = ""
-    content = load_campaign_content(campaign_id)
+    with stage("load"):
+        content = load_campaign_content(campaign_id)
     if content:
-        state = load_campaign_state(campaign_id)
-
-        # Load author notes for DM guidance
-        prep_data = load_dm_prep_data(campaign_id)
+        # Runtime state, and author notes for DM guidance
+        with stage("load"):
+            state = load_campaign_state(campaign_id)
+            prep_data = load_dm_prep_data(campaign_id)
         author_notes = []
         if prep_data.author_notes:
-            author_notes.extend([n.dict() for n in prep_data.author_notes])
+            author_notes.extend([n.model_dump() for n in prep_data.author_notes])
         if prep_data.pinned:
-            author_notes.extend([n.dict() for n in prep_data.pinned])
+            author_notes.extend([n.model_dump() for n in prep_data.pinned])
 
         # Build episode details from current state
         episode_details = state.current_episode or {"description": "Freeform episode", "tone": content.tone}
-        dm_context = build_dm_context(content, state, episode_details)
-        campaign_context_section = build_dm_system_injection(dm_context, session, author_notes)
+        with stage("build_dm_context"):
+            dm_context = build_dm_context(content, state, episode_details)
+        with stage("build_dm_system_injection"):
+            campaign_context_section = build_dm_system_injection(dm_context, session, author_notes)
 
     # Get current state if requested (for freestyle campaigns or fallback)
     state_context = ""
@@ -204,6 +305,14 @@ def dm_message(campaign_id: str, msg: DMMessage):
             for img in session.get("images", [])[-5:]:  # Last 5 images
                 state_context += f"- {img.get('prompt', 'unknown scene')}\n"
 
+    # Recall a few relevant moments from archived episodes (fixed cost, not the full transcript)
+    memory_query = " ".join([msg.message, session.get("quest", ""), session.get("location", "")])
+    with stage("recall"):
+        memory_section = format_play_memory_for_dm(
+            recall_moments(campaign_id, memory_query, limit=4),
+            get_latest_recap(campaign_id)
+        )
+
     # Combine into full system prompt
     full_system = f"""{system_prompt}
 
@@ -211,6 +320,8 @@ def dm_message(campaign_id: str, msg: DMMessage):
 
 {state_context}
 
+{memory_section}
+
 ## Rules Reference
 {rules}
 
@@ -234,17 +345,44 @@ def dm_message(campaign_id: str, msg: DMMessage):
 
     # Call Claude API
     try:
-        client = anthropic.Anthropic()  # Uses ANTHROPIC_API_KEY env var
+        try:
+            with stage("claude"):
+                dm_response = claude_message(
+                    token,
+                    deadline=deadline,
+                    campaign_id=campaign_id,
+                    feature="dm_turn",
+                    model="claude-sonnet-4-20250514",
+                    max_tokens=1024,
+                    system=full_system,
+                    messages=messages
+                )
+        except Cancelled as cancelled:
+            # Keep what the DM had said so far, marked as cut off, rather than losing the turn
+            if cancelled.partial.strip() and session.get("active"):
+                _record_turn(campaign_id, msg.message, cancelled.partial.strip(), {}, [], interrupted=True)
+            raise
+        except DeadlineExceeded as late:
+            if not late.partial.strip():
+                raise
+            # Out of time mid-reply: keep what the DM said rather than failing the turn
+            dm_response = late.partial
+            deadline.degrade("response")
+
+        def illustrate(description: str) -> tuple:
+            if not deadline.allows(RENDER_SECONDS) or not provider_available("replicate"):
+                deadline.degrade("illustration")
+                return None, None
+            try:
+                return generate_scene_image(description, session, campaign_id, art_style, token, deadline)
+            except Cancelled:
+                # The reply is complete and still gets logged; skip the picture nobody is waiting for
+                return None, None
 
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1024,
-            system=full_system,
-            messages=messages
-        )
-
-        dm_response = response.content[0].text
         image_url = None
+        # Session changes from this turn, applied in one update at the end
+        session_updates = {}
+        new_images = []
 
         # Get art style from system config
         art_style = system_config.get("art_style", "fantasy illustration, detailed, atmospheric lighting")
@@ -253,15 +391,15 @@ def dm_message(campaign_id: str, msg: DMMessage):
         scene_match = re.search(r'\[SCENE:\s*(.+?)\]', dm_response, re.IGNORECASE | re.DOTALL)
         if scene_match:
             scene_description = scene_match.group(1).strip()
-            image_url, crafted_prompt = generate_scene_image(scene_description, session, campaign_id, art_style)
+            image_url, crafted_prompt = illustrate(scene_description)
 
             # Store image in session
             if image_url and session.get("active"):
-                session.setdefault("images", []).append({
+                new_images.append({
                     "url": image_url,
                     "prompt": crafted_prompt
                 })
-                session["currentImage"] = image_url
+                session_updates["currentImage"] = image_url
 
             # Remove the [SCENE:] tag from the response shown to users
             dm_response_clean = re.sub(r'\[SCENE:\s*.+?\]', '', dm_response, flags=re.IGNORECASE | re.DOTALL).strip()
@@ -271,19 +409,19 @@ def dm_message(campaign_id: str, msg: DMMessage):
             if msg.requestIllustration and session.get("active"):
                 # Use first paragraph as scene description
                 first_para = dm_response.split('\n\n')[0][:500]
-                image_url, crafted_prompt = generate_scene_image(first_para, session, campaign_id, art_style)
+                image_url, crafted_prompt = illustrate(first_para)
                 if image_url:
-                    session.setdefault("images", []).append({
+                    new_images.append({
                         "url": image_url,
                         "prompt": crafted_prompt
                     })
-                    session["currentImage"] = image_url
+                    session_updates["currentImage"] = image_url
 
         # Check for [PHASE: ...] tag and update session
         phase_match = re.search(r'\[PHASE:\s*(\w+)\]', dm_response, re.IGNORECASE)
         if phase_match and session.get("active"):
             new_phase = phase_match.group(1).strip().lower()
-            session["runState"] = new_phase
+            session_updates["runState"] = new_phase
             # Remove tag from response
             dm_response_clean = re.sub(r'\[PHASE:\s*\w+\]', '', dm_response_clean, flags=re.IGNORECASE).strip()
 
@@ -291,29 +429,25 @@ def dm_message(campaign_id: str, msg: DMMessage):
         room_match = re.search(r'\[ROOM:\s*(\d+)\]', dm_response, re.IGNORECASE)
         if room_match and session.get("active"):
             new_room = int(room_match.group(1))
-            session["roomNumber"] = new_room
+            session_updates["roomNumber"] = new_room
             # Remove tag from response
             dm_response_clean = re.sub(r'\[ROOM:\s*\d+\]', '', dm_response_clean, flags=re.IGNORECASE).strip()
 
-        # Log to session
         if session.get("active"):
-            session.setdefault("log", []).append({
-                "type": "chat",
-                "role": "player",
-                "content": msg.message
-            })
-            session.setdefault("log", []).append({
-                "type": "chat",
-                "role": "dm",
-                "content": dm_response_clean
-            })
-            save_campaign_json(campaign_id, "current_session.json", session)
+            with stage("save"):
+                _record_turn(campaign_id, msg.message, dm_response_clean, session_updates, new_images)
 
         return {
             "response": dm_response_clean,
-            "image_url": image_url
+            "image_url": image_url,
+            # Stages skipped or cut short to stay within the turn's time budget
+            "degraded": deadline.degraded,
         }
 
+    except ProviderUnavailable as e:
+        raise unavailable(e)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="The DM ran out of time for this turn")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI error: {str(e)}")
 
@@ -321,8 +455,21 @@ def dm_message(campaign_id: str, msg: DMMessage):
 # === Image Generation Routes ===
 
 @router.post("/campaigns/{campaign_id}/image/generate")
-def generate_image(campaign_id: str, request: ImageRequest):
+async def generate_image(
+    campaign_id: str,
+    request: ImageRequest,
+    http_request: Request,
+    response: Response,
+    key: Optional[str] = Depends(idempotency_key),
+):
     """Generate an image using Replicate Flux"""
+    return await run_until_disconnect(http_request, lambda token: run_idempotent(
+        campaign_id, key, ("image/generate", request.model_dump()),
+        lambda work: _generate_image(campaign_id, request, work), response, token,
+    ))
+
+
+def _generate_image(campaign_id: str, request: ImageRequest, token: Optional[CancelToken] = None):
 
     # Load campaign system config for art style
     system_config = load_campaign_json(campaign_id, "system.json")
@@ -339,25 +486,29 @@ def generate_image(campaign_id: str, request: ImageRequest):
         full_prompt = f"{art_style}, {request.prompt}"
 
     try:
-        output = replicate.run(
-            "black-forest-labs/flux-schnell",
-            input={
-                "prompt": full_prompt,
-                "num_outputs": 1,
-                "aspect_ratio": "16:9",
-                "output_format": "webp",
-                "output_quality": 80
-            }
-        )
-
-        # Flux returns a list of URLs - download to campaign directory
-        if output and len(output) > 0:
-            remote_url = str(output[0])
-            local_url = download_image(remote_url, campaign_id)
+        with stage("render"):
+            remote_url = render_image(
+                {
+                    "prompt": full_prompt,
+                    "num_outputs": 1,
+                    "aspect_ratio": "16:9",
+                    "output_format": "webp",
+                    "output_quality": 80
+                },
+                token,
+                campaign_id=campaign_id,
+            )
+
+        # Download to campaign directory
+        if remote_url:
+            with stage("download"):
+                local_url = download_image(remote_url, campaign_id, token)
             return {"image_url": local_url or remote_url, "prompt": full_prompt}
 
         return {"image_url": None, "prompt": full_prompt}
 
+    except ProviderUnavailable as e:
+        raise unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image generation error: {str(e)}")
 
@@ -4,9 +4,9 @@ DM Prep notes, pins, conversation, and coach message routes
 
 import uuid
 from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException
-import anthropic
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 
 from models import DMPrepMessageRequest, DMPrepNoteCreate, DMPrepNoteUpdate, DMPrepPinRequest
 from helpers import load_campaign_json
@@ -18,23 +18,97 @@ from campaign_logic import (
     save_dm_prep_data,
 )
 from prep_coach_builder import build_prep_coach_system_prompt, build_prep_coach_context
+from content_index import get_campaign_index
+from idempotency import idempotency_key, run_idempotent
+from cancellation import Cancelled, CancelToken, run_until_disconnect
+from ai_calls import claude_message
+from llm_scheduler import Priority
+from resilience import ProviderUnavailable, unavailable
+from metrics import stage
+from turn_traces import recorded
 
 router = APIRouter()
 
+# A GET only refreshes last_accessed this often. Writing dm_prep.json on every
+# read would change its mtime and make other workers rebuild their search index.
+ACCESS_TOUCH_SECONDS = 60 * 60
+
 
 @router.get("/campaigns/{campaign_id}/dm-prep")
-def get_dm_prep(campaign_id: str):
-    """Get all DM prep data for a campaign"""
+def get_dm_prep(
+    campaign_id: str,
+    include_conversation: bool = True,
+    conversation_limit: Optional[int] = Query(None, ge=0),
+):
+    """Get DM prep data for a campaign, optionally trimming the coach conversation"""
     prep_data = load_dm_prep_data(campaign_id)
     # Update last accessed
-    prep_data.last_accessed = datetime.utcnow().isoformat() + "Z"
-    save_dm_prep_data(campaign_id, prep_data)
-    return prep_data.dict()
+    now = datetime.utcnow()
+    last = datetime.fromisoformat(prep_data.last_accessed.rstrip("Z")) if prep_data.last_accessed else None
+    if last is None or (now - last).total_seconds() >= ACCESS_TOUCH_SECONDS:
+        prep_data.last_accessed = now.isoformat() + "Z"
+        save_dm_prep_data(campaign_id, prep_data)
+
+    result = prep_data.model_dump()
+    result["conversation_total"] = len(prep_data.conversation)
+    if not include_conversation:
+        result["conversation"] = []
+    elif conversation_limit is not None:
+        result["conversation"] = result["conversation"][-conversation_limit:] if conversation_limit else []
+    return result
+
+
+@router.get("/campaigns/{campaign_id}/dm-prep/notes")
+def search_dm_prep_notes(
+    campaign_id: str,
+    q: str = "",
+    category: Optional[str] = None,
+    related_to: Optional[str] = None,
+    pinned: Optional[bool] = None,
+):
+    """Search author notes and pinned insights with prefix matching and filters"""
+    kind = None if pinned is None else ("pin" if pinned else "note")
+    results = get_campaign_index(campaign_id).search(q, category=category, related_to=related_to)
+    notes = [
+        {
+            "id": r["note_id"],
+            "content": r["text"],
+            "category": r["category"],
+            "related_to": r["related_to"],
+            "created_at": r["created_at"],
+            "pinned": r["kind"] == "pin",
+            "score": r["score"],
+        }
+        for r in results
+        if r["kind"] in ("note", "pin") and (kind is None or r["kind"] == kind)
+    ]
+    return {"query": q, "total": len(notes), "notes": notes}
 
 
 @router.post("/campaigns/{campaign_id}/dm-prep/message")
-def dm_prep_message(campaign_id: str, request: DMPrepMessageRequest):
+async def dm_prep_message(
+    campaign_id: str,
+    request: DMPrepMessageRequest,
+    http_request: Request,
+    response: Response,
+    key: Optional[str] = Depends(idempotency_key),
+):
     """Send a message to the Prep Coach AI"""
+    return await run_until_disconnect(http_request, lambda token: run_idempotent(
+        campaign_id, key, ("dm-prep/message", request.model_dump()),
+        lambda work: _dm_prep_message(campaign_id, request, work), response, token,
+    ))
+
+
+def _save_exchange(campaign_id: str, prep_data, user_message: str, assistant_message: dict):
+    prep_data.conversation.append({"role": "user", "content": user_message})
+    prep_data.conversation.append(assistant_message)
+    prep_data.last_accessed = datetime.utcnow().isoformat() + "Z"
+    save_dm_prep_data(campaign_id, prep_data)
+
+
+@recorded("dm_prep_message", DMPrepMessageRequest)
+def _dm_prep_message(campaign_id: str, request: DMPrepMessageRequest, token: Optional[CancelToken] = None):
     # Load system config
     system_config = load_campaign_json(campaign_id, "system.json")
     if not system_config:
@@ -42,18 +116,18 @@ def dm_prep_message(campaign_id: str, request: DMPrepMessageRequest):
 
     # Load campaign content
     content = load_campaign_content(campaign_id)
-    content_dict = content.dict() if content else None
+    content_dict = content.model_dump() if content else None
 
     # Load campaign state
     state = load_campaign_state(campaign_id)
-    state_dict = state.dict() if state else None
+    state_dict = state.model_dump() if state else None
 
     # Load existing prep data
     prep_data = load_dm_prep_data(campaign_id)
 
     # Build system prompt and context
     system_prompt = build_prep_coach_system_prompt(system_config)
-    context = build_prep_coach_context(content_dict, state_dict, prep_data.dict(), system_config)
+    context = build_prep_coach_context(content_dict, state_dict, prep_data.model_dump(), system_config)
 
     full_system = f"{system_prompt}\n\n---\n\n{context}" if context else system_prompt
 
@@ -67,24 +141,33 @@ def dm_prep_message(campaign_id: str, request: DMPrepMessageRequest):
 
     # Call Claude API
     try:
-        client = anthropic.Anthropic()
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1024,
-            system=full_system,
-            messages=messages
-        )
-
-        assistant_response = response.content[0].text
+        try:
+            with stage("claude"):
+                assistant_response = claude_message(
+                    token,
+                    priority=Priority.AUTHORING,
+                    campaign_id=campaign_id,
+                    feature="dm_prep",
+                    model="claude-sonnet-4-20250514",
+                    max_tokens=1024,
+                    system=full_system,
+                    messages=messages
+                )
+        except Cancelled as cancelled:
+            # Keep the partial answer in the history, marked as cut off
+            if cancelled.partial.strip():
+                _save_exchange(campaign_id, prep_data, request.message, {
+                    "role": "assistant", "content": cancelled.partial.strip(), "interrupted": True,
+                })
+            raise
 
         # Update conversation history
-        prep_data.conversation.append({"role": "user", "content": request.message})
-        prep_data.conversation.append({"role": "assistant", "content": assistant_response})
-        prep_data.last_accessed = datetime.utcnow().isoformat() + "Z"
-        save_dm_prep_data(campaign_id, prep_data)
+        _save_exchange(campaign_id, prep_data, request.message, {"role": "assistant", "content": assistant_response})
 
         return {"response": assistant_response}
 
+    except ProviderUnavailable as e:
+        raise unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI error: {str(e)}")
 
@@ -109,7 +192,7 @@ def create_dm_prep_note(campaign_id: str, request: DMPrepNoteCreate):
     prep_data.last_accessed = datetime.utcnow().isoformat() + "Z"
     save_dm_prep_data(campaign_id, prep_data)
 
-    return note.dict()
+    return note.model_dump()
 
 
 @router.put("/campaigns/{campaign_id}/dm-prep/note/{note_id}")
@@ -129,7 +212,7 @@ def update_dm_prep_note(campaign_id: str, note_id: str, request: DMPrepNoteUpdat
 
             prep_data.last_accessed = datetime.utcnow().isoformat() + "Z"
             save_dm_prep_data(campaign_id, prep_data)
-            return prep_data.author_notes[i].dict()
+            return prep_data.author_notes[i].model_dump()
 
     raise HTTPException(status_code=404, detail="Note not found")
 
@@ -171,7 +254,7 @@ def pin_dm_prep_insight(campaign_id: str, request: DMPrepPinRequest):
     prep_data.last_accessed = datetime.utcnow().isoformat() + "Z"
     save_dm_prep_data(campaign_id, prep_data)
 
-    return pinned_note.dict()
+    return pinned_note.model_dump()
 
 
 @router.delete("/campaigns/{campaign_id}/dm-prep/pin/{pin_id}")
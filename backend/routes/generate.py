@@ -4,13 +4,20 @@ Generate-fields routes: AI-powered field generation for campaign content
 
 import json
 import re
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException
-import anthropic
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
 from models import GenerateFieldsRequest
 from helpers import load_campaign_json
 from campaign_schema import BLOOMBURROW_SYSTEM
+from idempotency import idempotency_key, run_idempotent
+from cancellation import CancelToken, run_until_disconnect
+from ai_calls import claude_message
+from llm_scheduler import Priority
+from resilience import ProviderUnavailable, unavailable
+from metrics import stage
+from turn_traces import recorded
 
 router = APIRouter()
 
@@ -192,8 +199,22 @@ def _validate_generated(result: dict, species: list, tags: list, existing_ids: s
 
 
 @router.post("/campaigns/{campaign_id}/generate-fields")
-def generate_fields_for_campaign(campaign_id: str, req: GenerateFieldsRequest):
+async def generate_fields_for_campaign(
+    campaign_id: str,
+    req: GenerateFieldsRequest,
+    http_request: Request,
+    response: Response,
+    key: Optional[str] = Depends(idempotency_key),
+):
     """Generate AI content for flagged fields within an existing campaign"""
+    return await run_until_disconnect(http_request, lambda token: run_idempotent(
+        campaign_id, key, ("generate-fields", req.model_dump()),
+        lambda work: _generate_fields_for_campaign(campaign_id, req, work), response, token,
+    ))
+
+
+@recorded("generate_fields", GenerateFieldsRequest)
+def _generate_fields_for_campaign(campaign_id: str, req: GenerateFieldsRequest, token: Optional[CancelToken] = None):
     # Load system config for lore/tone
     system_config = load_campaign_json(campaign_id, "system.json")
     if not system_config:
@@ -218,14 +239,16 @@ def generate_fields_for_campaign(campaign_id: str, req: GenerateFieldsRequest):
     prompt = _build_generate_prompt(req.content, req.generate, species, tags, lore, tone)
 
     try:
-        client = anthropic.Anthropic()
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2048,
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        response_text = response.content[0].text.strip()
+        with stage("claude"):
+            response_text = claude_message(
+                token,
+                priority=Priority.AUTHORING,
+                campaign_id=campaign_id,
+                feature="generate_fields",
+                model="claude-sonnet-4-20250514",
+                max_tokens=2048,
+                messages=[{"role": "user", "content": prompt}]
+            ).strip()
         # Extract JSON from response (handle markdown code blocks)
         json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
         if json_match:
@@ -237,13 +260,27 @@ def generate_fields_for_campaign(campaign_id: str, req: GenerateFieldsRequest):
 
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=500, detail=f"Failed to parse AI response: {str(e)}")
+    except ProviderUnavailable as e:
+        raise unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI generation error: {str(e)}")
 
 
 @router.post("/generate-fields")
-def generate_fields_standalone(req: GenerateFieldsRequest):
+async def generate_fields_standalone(
+    req: GenerateFieldsRequest,
+    http_request: Request,
+    response: Response,
+    key: Optional[str] = Depends(idempotency_key),
+):
     """Generate AI content for flagged fields (standalone, no campaign context)"""
+    return await run_until_disconnect(http_request, lambda token: run_idempotent(
+        "", key, ("generate-fields", req.model_dump()),
+        lambda work: _generate_fields_standalone(req, work), response, token,
+    ))
+
+
+def _generate_fields_standalone(req: GenerateFieldsRequest, token: Optional[CancelToken] = None):
     species = req.available_species
     tags = req.available_tags
 
@@ -258,14 +295,14 @@ def generate_fields_standalone(req: GenerateFieldsRequest):
     prompt = _build_generate_prompt(req.content, req.generate, species, tags, "", "")
 
     try:
-        client = anthropic.Anthropic()
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2048,
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        response_text = response.content[0].text.strip()
+        with stage("claude"):
+            response_text = claude_message(
+                token,
+                priority=Priority.AUTHORING,
+                model="claude-sonnet-4-20250514",
+                max_tokens=2048,
+                messages=[{"role": "user", "content": prompt}]
+            ).strip()
         json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
         if json_match:
             response_text = json_match.group(1)
@@ -276,5 +313,7 @@ def generate_fields_standalone(req: GenerateFieldsRequest):
 
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=500, detail=f"Failed to parse AI response: {str(e)}")
+    except ProviderUnavailable as e:
+        raise unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI generation error: {str(e)}")
@@ -0,0 +1,52 @@
+"""
+Archived session history routes: episode list, episode detail, and full-text search
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from history_index import search_history
+from play_memory import list_archived_episodes, load_archived_session
+
+router = APIRouter()
+
+
+@router.get("/campaigns/{campaign_id}/history")
+def get_history(campaign_id: str):
+    """List archived episodes with their recaps"""
+    episodes = []
+    for episode in list_archived_episodes(campaign_id):
+        record = load_archived_session(campaign_id, episode)
+        episodes.append({
+            "episode": episode,
+            "ended_at": record.get("ended_at"),
+            "outcome": record.get("outcome"),
+            "quest": record.get("quest"),
+            "location": record.get("location"),
+            "party": record.get("party", []),
+            "recap": record.get("recap"),
+        })
+    return {"episodes": episodes}
+
+
+@router.get("/campaigns/{campaign_id}/history/search")
+def search_history_endpoint(
+    campaign_id: str,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    kind: Optional[str] = Query(None, pattern="^(chat|roll|scene)$"),
+):
+    """Ranked full-text search over chat turns, roll purposes, and scene prompts"""
+    result = search_history(campaign_id, q, limit=limit, offset=offset, kind=kind)
+    return {"query": q, "limit": limit, "offset": offset, **result}
+
+
+@router.get("/campaigns/{campaign_id}/history/{episode}")
+def get_history_episode(campaign_id: str, episode: int):
+    """Get one archived episode including its full log"""
+    record = load_archived_session(campaign_id, episode)
+    if not record:
+        raise HTTPException(status_code=404, detail="Episode not found")
+    return record
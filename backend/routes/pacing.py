@@ -0,0 +1,37 @@
+"""
+Campaign pacing simulation route
+"""
+
+from fastapi import APIRouter, HTTPException
+
+from models import PacingSimulationRequest
+from campaign_schema import CampaignContent, validate_campaign_content
+from campaign_logic import load_campaign_content, load_campaign_state
+from pacing_simulator import simulate_pacing
+
+router = APIRouter()
+
+
+@router.post("/campaigns/{campaign_id}/pacing/simulate")
+def simulate_campaign_pacing(campaign_id: str, request: PacingSimulationRequest):
+    """Simulate randomized playthroughs of saved content, or of a draft passed in the body"""
+    if request.content is not None:
+        result = validate_campaign_content(request.content)
+        if not result.valid:
+            raise HTTPException(status_code=400, detail={"errors": result.errors})
+        content = CampaignContent(**request.content)
+    else:
+        content = load_campaign_content(campaign_id)
+        if not content:
+            raise HTTPException(status_code=404, detail="Campaign content not found")
+
+    start_state = load_campaign_state(campaign_id) if request.from_current_state else None
+    return simulate_pacing(
+        content,
+        runs=request.runs,
+        max_episodes=request.max_episodes,
+        hit_chance=request.hit_chance,
+        beats_per_episode=request.beats_per_episode,
+        start_state=start_state,
+        seed=request.seed,
+    )
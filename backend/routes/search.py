@@ -0,0 +1,36 @@
+"""
+Campaign-wide search over authored content and DM prep notes
+"""
+
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from content_index import get_campaign_index
+from helpers import get_campaign_dir
+
+router = APIRouter()
+
+
+@router.get("/campaigns/{campaign_id}/search")
+def search_campaign(
+    campaign_id: str,
+    q: str = "",
+    kind: Optional[str] = Query(None, pattern="^(threat|npc|location|beat|hint|character_arc|note|pin)$"),
+    category: Optional[str] = None,
+    related_to: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    """Prefix search across NPCs, locations, beats, hints, arcs, author notes, and pins"""
+    if not os.path.isdir(get_campaign_dir(campaign_id)):
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    results = get_campaign_index(campaign_id).search(q, kind=kind, category=category, related_to=related_to)
+    return {
+        "query": q,
+        "total": len(results),
+        "limit": limit,
+        "offset": offset,
+        "results": results[offset:offset + limit],
+    }
@@ -2,24 +2,28 @@
 Session CRUD and dice routes
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException
 
+import config
 from models import SessionStart, SessionUpdate, SessionEnd, DiceRoll
-from helpers import load_campaign_json, save_campaign_json
+from helpers import load_campaign_json
+from campaign_actors import SESSION_FILE, ROSTER_FILE, read_doc, update_doc, write_doc, release
+from play_memory import archive_session, generate_recap
+from campaign_logic import load_campaign_content, complete_episode, record_state_events
 
 router = APIRouter()
 
 
 @router.get("/campaigns/{campaign_id}/session")
 def get_session(campaign_id: str):
-    data = load_campaign_json(campaign_id, "current_session.json")
+    data = read_doc(campaign_id, SESSION_FILE)
     if not data:
         return {"active": False}
     return data
 
 @router.post("/campaigns/{campaign_id}/session/start")
 def start_session(campaign_id: str, session: SessionStart):
-    roster = load_campaign_json(campaign_id, "roster.json")
+    roster = read_doc(campaign_id, ROSTER_FILE)
 
     # Build party from character IDs
     party = []
@@ -53,62 +57,99 @@ def start_session(campaign_id: str, session: SessionStart):
         "log": []
     }
 
-    save_campaign_json(campaign_id, "current_session.json", session_data)
+    write_doc(campaign_id, SESSION_FILE, session_data)
     return session_data
 
 @router.put("/campaigns/{campaign_id}/session/update")
 def update_session(campaign_id: str, update: SessionUpdate):
-    data = load_campaign_json(campaign_id, "current_session.json")
-    if not data.get("active"):
-        raise HTTPException(status_code=400, detail="No active session")
-
-    if update.runState is not None:
-        data["runState"] = update.runState
-    if update.roomNumber is not None:
-        data["roomNumber"] = update.roomNumber
-    if update.party is not None:
-        data["party"] = update.party
-    if update.enemies is not None:
-        data["enemies"] = update.enemies
-    if update.lootCollected is not None:
-        data["lootCollected"] = update.lootCollected
-
-    save_campaign_json(campaign_id, "current_session.json", data)
-    return data
+    def check(data: dict):
+        if not data.get("active"):
+            raise HTTPException(status_code=400, detail="No active session")
+
+    def apply(data: dict):
+        if update.runState is not None:
+            data["runState"] = update.runState
+        if update.roomNumber is not None:
+            data["roomNumber"] = update.roomNumber
+        if update.party is not None:
+            data["party"] = update.party
+        if update.enemies is not None:
+            data["enemies"] = update.enemies
+        if update.lootCollected is not None:
+            data["lootCollected"] = update.lootCollected
+
+    return update_doc(campaign_id, SESSION_FILE, apply, check=check)
 
 @router.post("/campaigns/{campaign_id}/session/end")
-def end_session(campaign_id: str, data: SessionEnd):
+def end_session(campaign_id: str, data: SessionEnd, background_tasks: BackgroundTasks):
     """End session with outcome: 'victory', 'retreat', or 'failed'"""
-    session = load_campaign_json(campaign_id, "current_session.json")
-    roster = load_campaign_json(campaign_id, "roster.json")
+    session = read_doc(campaign_id, SESSION_FILE)
     town = load_campaign_json(campaign_id, "town.json")
     outcome = data.outcome
 
-    if outcome == "victory":
-        # Award XP to party members
-        for party_member in session.get("party", []):
-            for char in roster.get("characters", []):
-                if char["id"] == party_member["characterId"]:
-                    char["xp"] = char.get("xp", 0) + 2  # 1 base + 1 victory bonus
-                    break
+    # 1 base + 1 victory bonus; retreat earns the base only
+    xp = {"victory": 2, "retreat": 1}.get(outcome, 0)
+    xp_events = []
+    if xp:
+        def award_xp(roster: dict):
+            for party_member in session.get("party", []):
+                for char in roster.get("characters", []):
+                    if char["id"] == party_member["characterId"]:
+                        char["xp"] = char.get("xp", 0) + xp
+                        xp_events.append({
+                            "type": "xp_awarded",
+                            "data": {"character_id": char["id"], "amount": xp, "outcome": outcome}
+                        })
+                        break
+
+        # Claim the award on the session before making it, so a retried end
+        # (e.g. after the archive write failed) does not award it twice
+        claimed = []
+
+        def claim_xp(current: dict):
+            if not current.get("active") or current.get("xp_awarded"):
+                return False
+            current["xp_awarded"] = True
+            claimed.append(True)
+
+        update_doc(campaign_id, SESSION_FILE, claim_xp, returns=False)
 
         # Add loot to town treasury (simplified: assume loot is seeds)
         # In real implementation, parse loot items
-        save_campaign_json(campaign_id, "roster.json", roster)
+        if claimed:
+            update_doc(campaign_id, ROSTER_FILE, award_xp, returns=False)
 
-    elif outcome == "retreat":
-        # Award partial XP
-        for party_member in session.get("party", []):
-            for char in roster.get("characters", []):
-                if char["id"] == party_member["characterId"]:
-                    char["xp"] = char.get("xp", 0) + 1
-                    break
-        save_campaign_json(campaign_id, "roster.json", roster)
+    # Archive the play log before clearing, recap it after the response is sent
+    archived = archive_session(campaign_id, session, outcome)
+    if archived:
+        # Mark the session so a retried end finds this archive instead of making another
+        def mark_archived(current: dict):
+            current["archived_episode"] = archived["episode"]
 
-    # Clear session
-    save_campaign_json(campaign_id, "current_session.json", {"active": False})
+        update_doc(campaign_id, SESSION_FILE, mark_archived, returns=False)
+        if not archived.get("recap"):
+            background_tasks.add_task(generate_recap, campaign_id, archived["episode"])
 
-    return {"outcome": outcome, "message": f"Run ended: {outcome}"}
+    # Record the session in the state event log
+    if session.get("active"):
+        record_state_events(campaign_id, xp_events + [{
+            "type": "session_ended",
+            "data": {"outcome": outcome, "archived_episode": archived["episode"] if archived else None}
+        }])
+        if config.ADVANCE_EPISODE_ON_SESSION_END:
+            content = load_campaign_content(campaign_id)
+            if content:
+                complete_episode(campaign_id, content)
+
+    # Clear session and checkpoint anything held in memory
+    write_doc(campaign_id, SESSION_FILE, {"active": False})
+    release(campaign_id)
+
+    return {
+        "outcome": outcome,
+        "message": f"Run ended: {outcome}",
+        "archived_episode": archived["episode"] if archived else None
+    }
 
 
 # === Dice Endpoints ===
@@ -129,19 +170,22 @@ def log_dice_roll(campaign_id: str, roll: DiceRoll):
             threshold_result = "failure"
 
     # Log to session if active
-    session = load_campaign_json(campaign_id, "current_session.json")
-    if session.get("active"):
-        log_entry = {
-            "type": "roll",
-            "die": roll.dieType,
-            "result": roll.result,
-            "modifier": roll.modifier,
-            "total": total,
-            "purpose": roll.purpose,
-            "threshold": threshold_result
-        }
+    log_entry = {
+        "type": "roll",
+        "die": roll.dieType,
+        "result": roll.result,
+        "modifier": roll.modifier,
+        "total": total,
+        "purpose": roll.purpose,
+        "threshold": threshold_result
+    }
+
+    def log_roll(session: dict):
+        if not session.get("active"):
+            return False
         session.setdefault("log", []).append(log_entry)
-        save_campaign_json(campaign_id, "current_session.json", session)
+
+    update_doc(campaign_id, SESSION_FILE, log_roll, returns=False)
 
     return {
         "die": roll.dieType,
@@ -0,0 +1,30 @@
+"""
+Operational endpoints: Prometheus metrics, and upstream provider health
+(circuit breakers, retries and the Claude call scheduler)
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+import metrics
+import resilience
+from llm_scheduler import scheduler
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Every metric in metrics.py, in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@router.get("/status/providers")
+def provider_status():
+    """Breaker state and retry counts per provider, and the Claude scheduler's queue and limits"""
+    return {
+        "providers": resilience.snapshot(),
+        "llm_scheduler": scheduler.snapshot(),
+    }
@@ -0,0 +1,20 @@
+"""
+Per-campaign model and image usage route
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from usage_ledger import usage_summary
+
+router = APIRouter()
+
+
+@router.get("/campaigns/{campaign_id}/usage")
+def get_usage(
+    campaign_id: str,
+    since: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+):
+    """Claude tokens, Flux renders, latency and estimated cost: totals, by feature and by day"""
+    return usage_summary(campaign_id, since)
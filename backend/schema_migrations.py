@@ -0,0 +1,64 @@
+"""
+Schema version stamps and the ordered registry of document migrations
+
+Every model-backed document is saved with a schema_version. Loading a
+document at the current version costs one integer comparison; older documents
+run each registered step above their version, in order, and the caller writes
+the result back so the upgrade happens once.
+"""
+
+from typing import Callable
+
+SCHEMA_VERSION_KEY = "schema_version"
+
+# doc type -> [(version, step)] sorted by version; a step upgrades from version - 1
+_MIGRATIONS: dict = {}
+
+
+def migration(doc_type: str, version: int):
+    """Register the decorated function as the step that upgrades doc_type documents to version"""
+    def register(step: Callable[[dict], dict]) -> Callable[[dict], dict]:
+        steps = _MIGRATIONS.setdefault(doc_type, [])
+        if any(v == version for v, _ in steps):
+            raise ValueError(f"Duplicate {doc_type} migration to version {version}")
+        steps.append((version, step))
+        steps.sort(key=lambda s: s[0])
+        return step
+    return register
+
+
+def current_version(doc_type: str) -> int:
+    steps = _MIGRATIONS.get(doc_type)
+    return steps[-1][0] if steps else 0
+
+
+def document_version(data: dict) -> int:
+    """Stamped version, 0 for documents saved before stamps existed"""
+    return data.get(SCHEMA_VERSION_KEY, 0)
+
+
+def upgrade_document(doc_type: str, data: dict) -> tuple:
+    """
+    Bring a stored document up to the current version.
+
+    Returns (data, upgraded). Documents already at the current version (or
+    written by a newer server) come back untouched with upgraded False.
+    """
+    version = document_version(data)
+    current = current_version(doc_type)
+    if version >= current:
+        return data, False
+    for step_version, step in _MIGRATIONS[doc_type]:
+        if step_version > version:
+            data = step(dict(data))
+    return stamp_document(doc_type, data), True
+
+
+def stamp_document(doc_type: str, data: dict) -> dict:
+    """Copy of data carrying the current schema version, for saving"""
+    return {**data, SCHEMA_VERSION_KEY: current_version(doc_type)}
+
+
+def unstamped(data: dict) -> dict:
+    """Copy of data without the version stamp, for handing raw documents to clients"""
+    return {k: v for k, v in data.items() if k != SCHEMA_VERSION_KEY}
@@ -0,0 +1,142 @@
+"""
+Document codecs for files written through the storage helpers
+
+Each file is encoded with the codec configured for it (config.STORAGE_CODEC,
+with per-file overrides in config.STORAGE_CODEC_OVERRIDES) and decoded by
+sniffing its first bytes, so files written under an earlier setting, including
+the indented JSON every campaign started with, keep loading after the setting
+changes. File names keep their .json extension whatever the encoding.
+
+Codecs:
+    pretty   indented JSON, for reading files by hand (the default)
+    json     compact JSON
+    msgpack  MessagePack (needs the msgpack package)
+    zstd     compact JSON compressed with Zstandard (needs the zstandard package)
+
+orjson is used for both JSON codecs when it is installed; the stdlib encoder
+is the fallback.
+"""
+
+import fnmatch
+import json
+import os
+import threading
+import time
+
+import config
+from metrics import STORAGE_SECONDS
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is slower but equivalent
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ("pretty", "json", "msgpack", "zstd")
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_JSON_START = b"{[\"-0123456789tfn"
+
+
+def _parse_overrides(spec: str) -> list:
+    """'current_session.json=zstd,archive/*=msgpack' -> [(pattern, codec)]"""
+    overrides = []
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        pattern, _, codec = entry.partition("=")
+        overrides.append((pattern.strip(), codec.strip()))
+    return overrides
+
+
+def codec_for(filename: str) -> str:
+    """Codec for filename (relative to the campaign or data directory): the first matching override, else the default"""
+    for pattern, codec in _parse_overrides(config.STORAGE_CODEC_OVERRIDES):
+        if fnmatch.fnmatch(filename, pattern):
+            return codec
+    return config.STORAGE_CODEC
+
+
+def _require(module, package: str, codec: str):
+    if module is None:
+        raise RuntimeError(f"The {codec} storage codec needs the {package} package (pip install {package})")
+    return module
+
+
+def _encode_json(data, pretty: bool) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(data, option=option)
+    if pretty:
+        return json.dumps(data, indent=2).encode()
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def encode(data, codec: str) -> bytes:
+    """Encode a document with the named codec"""
+    if codec == "pretty":
+        return _encode_json(data, pretty=True)
+    if codec == "json":
+        return _encode_json(data, pretty=False)
+    if codec == "msgpack":
+        return _require(msgpack, "msgpack", codec).packb(data, use_bin_type=True)
+    if codec == "zstd":
+        compressor = _require(zstandard, "zstandard", codec).ZstdCompressor(level=3)
+        return compressor.compress(_encode_json(data, pretty=False))
+    raise ValueError(f"Unknown storage codec {codec!r}; expected one of {', '.join(CODECS)}")
+
+
+def sniff(raw: bytes) -> str:
+    """Codec a stored file was written with, from its first bytes"""
+    if raw.startswith(_ZSTD_MAGIC):
+        return "zstd"
+    head = raw.lstrip()[:1]
+    if not head or head in _JSON_START:
+        return "json"
+    return "msgpack"
+
+
+def decode(raw: bytes):
+    """Decode a stored document, whatever codec wrote it"""
+    codec = sniff(raw)
+    if codec == "zstd":
+        return decode(_require(zstandard, "zstandard", codec).ZstdDecompressor().decompress(raw))
+    if codec == "msgpack":
+        return _require(msgpack, "msgpack", codec).unpackb(raw, raw=False, strict_map_key=False)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def read_document(path: str):
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = decode(raw)
+    STORAGE_SECONDS.observe(time.perf_counter() - started, op="read", codec=sniff(raw))
+    return data
+
+
+def write_document(path: str, data, codec: str):
+    """Atomically replace path with data encoded by codec"""
+    with STORAGE_SECONDS.time(op="write", codec=codec):
+        encoded = encode(data, codec)
+        # One temp file per writing thread, so concurrent writes of a document cannot collide
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(encoded)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
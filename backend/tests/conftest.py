@@ -20,6 +20,20 @@ from campaign_schema import (
 )
 
 
+@pytest.fixture(autouse=True)
+def no_api_key(monkeypatch):
+    """Keep tests off the real model API; code paths fall back as they would without a key"""
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    """Provider failures in one test must not leave a breaker open for the next"""
+    import resilience
+
+    monkeypatch.setattr(resilience, "breakers", {name: resilience.CircuitBreaker(name) for name in resilience.breakers})
+
+
 @pytest.fixture
 def data_dir(tmp_path, monkeypatch):
     """Create temp data directory and patch config.DATA_DIR"""
@@ -132,8 +146,8 @@ def campaign_dir(data_dir, sample_content, sample_state):
         ("town.json", town),
         ("current_session.json", session),
         ("system.json", system),
-        ("campaign.json", sample_content.dict()),
-        ("state.json", sample_state.dict()),
+        ("campaign.json", sample_content.model_dump()),
+        ("state.json", sample_state.model_dump()),
     ]:
         with open(str(cdir / filename), "w") as f:
             json.dump(obj, f, indent=2)
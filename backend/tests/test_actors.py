@@ -0,0 +1,147 @@
+"""
+Tests for opt-in per-campaign actors holding session and roster in memory
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import config
+
+
+def _on_disk(campaign_dir, filename):
+    with open(campaign_dir / filename) as f:
+        return json.load(f)
+
+
+def _start(client):
+    client.post(
+        "/campaigns/test_campaign/session/start",
+        json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+    )
+
+
+def _roll(client, purpose="sneak"):
+    return client.post(
+        "/campaigns/test_campaign/dice/roll",
+        json={"dieType": "d20", "result": 12, "modifier": 1, "purpose": purpose},
+    )
+
+
+@pytest.fixture
+def actor_client(data_dir, monkeypatch):
+    """TestClient with actors enabled; the context manager runs startup/shutdown"""
+    from fastapi.testclient import TestClient
+    from main import app
+
+    monkeypatch.setattr(config, "CAMPAIGN_ACTORS", True)
+    monkeypatch.setattr(config, "CAMPAIGN_ACTOR_CHECKPOINT_SECONDS", 60)
+    with TestClient(app) as c:
+        yield c
+
+
+class TestActorMode:
+    def test_mutations_stay_in_memory_until_checkpoint(self, actor_client, campaign_dir):
+        _start(actor_client)
+        _roll(actor_client)
+
+        session = actor_client.get("/campaigns/test_campaign/session").json()
+        assert session["log"][-1]["purpose"] == "sneak"
+        # Nothing checkpointed yet: the file still holds the fixture's inactive session
+        assert _on_disk(campaign_dir, "current_session.json") == {"active": False}
+
+    def test_session_end_checkpoints(self, actor_client, campaign_dir):
+        _start(actor_client)
+        actor_client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"})
+
+        assert _on_disk(campaign_dir, "current_session.json") == {"active": False, "schema_version": 1}
+        roster = _on_disk(campaign_dir, "roster.json")
+        assert next(c for c in roster["characters"] if c["id"] == "char_001")["xp"] == 2
+
+    def test_shutdown_checkpoints(self, data_dir, campaign_dir, monkeypatch):
+        from fastapi.testclient import TestClient
+        from main import app
+
+        monkeypatch.setattr(config, "CAMPAIGN_ACTORS", True)
+        monkeypatch.setattr(config, "CAMPAIGN_ACTOR_CHECKPOINT_SECONDS", 60)
+        with TestClient(app) as c:
+            _start(c)
+            _roll(c)
+        assert _on_disk(campaign_dir, "current_session.json")["log"][-1]["purpose"] == "sneak"
+
+    def test_interval_checkpoint(self, actor_client, campaign_dir, monkeypatch):
+        monkeypatch.setattr(config, "CAMPAIGN_ACTOR_CHECKPOINT_SECONDS", 0.05)
+        actor_client.post("/campaigns/test_campaign/session/end", json={"outcome": "failed"})
+        _start(actor_client)
+        _roll(actor_client)
+        for _ in range(50):
+            if _on_disk(campaign_dir, "current_session.json").get("log"):
+                break
+            time.sleep(0.05)
+        assert _on_disk(campaign_dir, "current_session.json")["log"][-1]["purpose"] == "sneak"
+
+    def test_concurrent_rolls_are_serialized(self, actor_client, campaign_dir):
+        _start(actor_client)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: _roll(actor_client, f"roll {i}"), range(40)))
+        log = actor_client.get("/campaigns/test_campaign/session").json()["log"]
+        assert sorted(entry["purpose"] for entry in log) == sorted(f"roll {i}" for i in range(40))
+
+    def test_state_cache_follows_events(self, actor_client, campaign_dir):
+        _start(actor_client)
+        assert "find_the_scholar" not in actor_client.get("/campaigns/test_campaign/state").json()["beats_hit"]
+        actor_client.post(
+            "/campaigns/test_campaign/hit-beat",
+            json={"beat_id": "find_the_scholar", "facts_learned": [], "npcs_met": []},
+        )
+        assert "find_the_scholar" in actor_client.get("/campaigns/test_campaign/state").json()["beats_hit"]
+
+    def test_character_routes(self, actor_client, campaign_dir):
+        resp = actor_client.put("/campaigns/test_campaign/characters/char_001", json={"level": 2})
+        assert resp.json()["level"] == 2
+        assert actor_client.get("/campaigns/test_campaign/characters/char_001").json()["level"] == 2
+        assert actor_client.put("/campaigns/test_campaign/characters/nobody", json={}).status_code == 404
+
+    def test_update_character_can_change_id(self, actor_client, campaign_dir):
+        resp = actor_client.put("/campaigns/test_campaign/characters/char_001", json={"id": "char_pip"})
+        assert resp.status_code == 200
+        assert resp.json()["id"] == "char_pip"
+        assert actor_client.get("/campaigns/test_campaign/characters/char_pip").json()["name"] == "Pip"
+
+    def test_failed_mutation_still_checkpoints(self, actor_client, campaign_dir):
+        """A mutate that raises partway leaves memory changed, so the change must be written too"""
+        import campaign_actors
+
+        def half_done(doc: dict):
+            doc["characters"][0]["xp"] = 9
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            campaign_actors.update_doc("test_campaign", campaign_actors.ROSTER_FILE, half_done)
+        actor_client.post("/campaigns/test_campaign/session/end", json={"outcome": "failed"})
+        assert _on_disk(campaign_dir, "roster.json")["characters"][0]["xp"] == 9
+
+
+class TestDirectMode:
+    def test_concurrent_rolls_are_serialized(self, client, campaign_dir):
+        _start(client)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: _roll(client, f"roll {i}"), range(20)))
+        log = _on_disk(campaign_dir, "current_session.json")["log"]
+        assert len(log) == 20
+
+    def test_update_character_can_change_id(self, client, campaign_dir):
+        resp = client.put("/campaigns/test_campaign/characters/char_001", json={"id": "char_pip"})
+        assert resp.status_code == 200
+        assert resp.json()["id"] == "char_pip"
+
+    def test_returns_false_skips_the_copy(self, data_dir, campaign_dir):
+        import campaign_actors
+        assert campaign_actors.update_doc("test_campaign", campaign_actors.SESSION_FILE, lambda doc: None, returns=False) is None
+        assert campaign_actors.update_doc("test_campaign", campaign_actors.SESSION_FILE, lambda doc: None)["active"] is False
+
+    def test_roll_without_session_writes_nothing(self, client, data_dir):
+        _roll(client)
+        assert not (data_dir / "campaigns" / "test_campaign").exists()
@@ -0,0 +1,146 @@
+"""
+Tests for cancelling upstream calls when the client disconnects
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import ai_calls
+from ai_calls import claude_message, render_image
+from cancellation import Cancelled, CancelToken, SharedCancelToken, run_until_disconnect
+
+
+class FakeStream:
+    def __init__(self, chunks, on_chunk=None, headers=None):
+        self.chunks = chunks
+        self.on_chunk = on_chunk
+        self.consumed = 0
+        self.closed = False
+        self.response = SimpleNamespace(headers=headers or {})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    @property
+    def text_stream(self):
+        for chunk in self.chunks:
+            self.consumed += 1
+            if self.on_chunk:
+                self.on_chunk(self.consumed)
+            yield chunk
+
+    def get_final_message(self):
+        return SimpleNamespace(usage=SimpleNamespace(input_tokens=10, output_tokens=len(self.chunks)))
+
+
+def _fake_anthropic(monkeypatch, stream):
+    class Messages:
+        def stream(self, **kwargs):
+            return stream
+
+    class Client:
+        messages = Messages()
+
+        def __init__(self, **options):
+            pass
+
+    monkeypatch.setattr(ai_calls.anthropic, "Anthropic", Client)
+
+
+class TestUpstreamCalls:
+    def test_claude_stream_stops_with_partial_text(self, monkeypatch):
+        token = CancelToken()
+        stream = FakeStream(["The ", "heron ", "lands ", "softly."], on_chunk=lambda n: n == 2 and token.cancel())
+        _fake_anthropic(monkeypatch, stream)
+        with pytest.raises(Cancelled) as raised:
+            claude_message(token, model="m", max_tokens=10, messages=[])
+        assert raised.value.partial == "The heron "
+        assert stream.consumed == 2 and stream.closed
+
+    def test_claude_runs_to_completion_without_a_token(self, monkeypatch):
+        _fake_anthropic(monkeypatch, FakeStream(["All ", "done."]))
+        assert claude_message(model="m", max_tokens=10, messages=[]) == "All done."
+
+    def test_prediction_cancelled_upstream(self, monkeypatch):
+        token = CancelToken()
+
+        class Prediction:
+            status = "processing"
+            cancelled = False
+            polls = 0
+
+            def reload(self):
+                self.polls += 1
+                if self.polls == 2:
+                    token.cancel()
+
+            def cancel(self):
+                self.cancelled = True
+
+        prediction = Prediction()
+        monkeypatch.setattr(ai_calls, "PREDICTION_POLL_SECONDS", 0)
+        predictions = SimpleNamespace(create=lambda model, input: prediction)
+        monkeypatch.setattr(ai_calls, "replicate", SimpleNamespace(models=SimpleNamespace(predictions=predictions)))
+        with pytest.raises(Cancelled):
+            render_image({"prompt": "x"}, token)
+        assert prediction.cancelled
+
+    def test_shared_token_waits_for_every_request(self):
+        first, second = CancelToken(), CancelToken()
+        shared = SharedCancelToken(first)
+        shared.attach(second)
+        first.cancel()
+        assert not shared.cancelled
+        second.cancel()
+        assert shared.cancelled
+
+
+class TestDisconnect:
+    def test_disconnect_cancels_the_work(self):
+        class GoneRequest:
+            async def is_disconnected(self):
+                return True
+
+        def work(token):
+            for _ in range(500):
+                token.raise_if_cancelled()
+                time.sleep(0.01)
+            return "finished"
+
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(run_until_disconnect(GoneRequest(), work))
+        assert raised.value.status_code == 499
+
+    def test_interrupted_dm_turn_is_logged_as_partial(self, client, campaign_dir, monkeypatch):
+        import routes.dm_ai as dm_ai
+
+        def cut_off(token=None, **kwargs):
+            raise Cancelled("The heron turns toward")
+
+        monkeypatch.setattr(dm_ai, "claude_message", cut_off)
+        client.post(
+            "/campaigns/test_campaign/session/start",
+            json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+        )
+        resp = client.post("/campaigns/test_campaign/dm/message", json={"message": "I wave", "includeState": False})
+        assert resp.status_code == 499
+        dm_entry = client.get("/campaigns/test_campaign/session").json()["log"][-1]
+        assert dm_entry == {"type": "chat", "role": "dm", "content": "The heron turns toward", "interrupted": True}
+
+    def test_interrupted_prep_answer_is_kept(self, client, campaign_dir, monkeypatch):
+        import routes.dm_prep as dm_prep
+
+        def cut_off(token=None, **kwargs):
+            raise Cancelled("Consider opening with")
+
+        monkeypatch.setattr(dm_prep, "claude_message", cut_off)
+        assert client.post("/campaigns/test_campaign/dm-prep/message", json={"message": "Pacing?"}).status_code == 499
+        conversation = client.get("/campaigns/test_campaign/dm-prep").json()["conversation"]
+        assert conversation[-1] == {"role": "assistant", "content": "Consider opening with", "interrupted": True}
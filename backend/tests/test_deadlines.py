@@ -0,0 +1,116 @@
+"""
+Tests for the DM turn time budget
+"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import ai_calls
+import config
+from ai_calls import render_image
+from deadlines import Deadline, DeadlineExceeded
+from llm_scheduler import LLMScheduler, Priority
+
+
+@pytest.fixture
+def dm_turn(client, campaign_dir, monkeypatch):
+    """Start a session and stub the upstream calls; returns the render calls made"""
+    import routes.dm_ai as dm_ai
+
+    renders = []
+    monkeypatch.setattr(dm_ai, "claude_message", lambda token=None, **kwargs: "A heron lands. [SCENE: a heron on a mossy stump]")
+    monkeypatch.setattr(dm_ai, "craft_image_prompt", lambda description, *args: f"crafted {description}")
+
+    def render(input, token=None, deadline=None, **usage):
+        renders.append(input["prompt"])
+        return "https://replicate.example/1.webp"
+
+    monkeypatch.setattr(dm_ai, "render_image", render)
+    monkeypatch.setattr(dm_ai, "download_image", lambda url, *args: url)
+    client.post(
+        "/campaigns/test_campaign/session/start",
+        json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+    )
+    return renders
+
+
+def _send(client):
+    return client.post("/campaigns/test_campaign/dm/message", json={"message": "I look around", "includeState": False})
+
+
+class TestDMTurn:
+    def test_full_budget_runs_every_stage(self, client, dm_turn):
+        data = _send(client).json()
+        assert data["image_url"] == "https://replicate.example/1.webp"
+        assert data["degraded"] == []
+        assert dm_turn[0].endswith("crafted a heron on a mossy stump")
+
+    def test_short_budget_skips_prompt_crafting(self, client, dm_turn, monkeypatch):
+        import routes.dm_ai as dm_ai
+
+        monkeypatch.setattr(config, "DM_TURN_BUDGET_SECONDS", dm_ai.RENDER_SECONDS + 1)
+        data = _send(client).json()
+        assert data["degraded"] == ["image_prompt"]
+        assert data["image_url"]
+        assert dm_turn[0].endswith(", a heron on a mossy stump")
+
+    def test_shorter_budget_skips_the_illustration(self, client, dm_turn, monkeypatch):
+        monkeypatch.setattr(config, "DM_TURN_BUDGET_SECONDS", 1)
+        data = _send(client).json()
+        assert data == {"response": "A heron lands.", "image_url": None, "degraded": ["illustration"]}
+        assert dm_turn == []
+
+    def test_reply_cut_short_keeps_the_partial_text(self, client, dm_turn, monkeypatch):
+        import routes.dm_ai as dm_ai
+
+        def slow(token=None, **kwargs):
+            raise DeadlineExceeded("claude", "A heron lands on")
+
+        monkeypatch.setattr(dm_ai, "claude_message", slow)
+        data = _send(client).json()
+        assert data["response"] == "A heron lands on"
+        assert data["degraded"] == ["response"]
+        assert client.get("/campaigns/test_campaign/session").json()["log"][-1]["content"] == "A heron lands on"
+
+    def test_no_reply_in_time_is_a_504(self, client, dm_turn, monkeypatch):
+        import routes.dm_ai as dm_ai
+
+        def silent(token=None, **kwargs):
+            raise DeadlineExceeded("claude")
+
+        monkeypatch.setattr(dm_ai, "claude_message", silent)
+        assert _send(client).status_code == 504
+
+
+class TestStages:
+    def test_render_is_cancelled_when_the_budget_runs_out(self, monkeypatch):
+        monkeypatch.setattr(ai_calls, "PREDICTION_POLL_SECONDS", 0.01)
+
+        class Prediction:
+            status = "processing"
+            cancelled = False
+
+            def reload(self):
+                pass
+
+            def cancel(self):
+                self.cancelled = True
+
+        prediction = Prediction()
+        monkeypatch.setattr(ai_calls, "replicate", SimpleNamespace(
+            models=SimpleNamespace(predictions=SimpleNamespace(create=lambda **kwargs: prediction))
+        ))
+        with pytest.raises(DeadlineExceeded):
+            render_image({"prompt": "p"}, deadline=Deadline(0.1))
+        assert prediction.cancelled
+
+    def test_queued_call_gives_up_at_the_deadline(self):
+        scheduler = LLMScheduler(max_concurrency=1)
+        with scheduler.slot(Priority.INTERACTIVE, 1, 1):
+            started = time.monotonic()
+            with pytest.raises(DeadlineExceeded):
+                with scheduler.slot(Priority.INTERACTIVE, 1, 1, deadline=Deadline(0.2)):
+                    pass
+            assert time.monotonic() - started < 1
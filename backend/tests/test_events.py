@@ -0,0 +1,222 @@
+"""
+Tests for the campaign state event log, snapshots, time-travel reads, and rollback
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+import campaign_events
+import config
+from campaign_events import append_events, apply_event, load_state, list_events, last_seq
+from campaign_schema import CampaignState
+from models import BeatHitRequest
+from routes.campaign_content import hit_beat
+
+
+def _hit(client, beat_id, **kwargs):
+    return client.post(
+        "/campaigns/test_campaign/hit-beat",
+        json={"beat_id": beat_id, "facts_learned": kwargs.get("facts", []), "npcs_met": kwargs.get("npcs", [])},
+    )
+
+
+def _play_episode(client, outcome="victory"):
+    client.post(
+        "/campaigns/test_campaign/session/start",
+        json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+    )
+    client.post("/campaigns/test_campaign/session/end", json={"outcome": outcome})
+
+
+class TestReducer:
+    def test_events_apply_in_place(self):
+        state = CampaignState()
+        for event in [
+            {"type": "beat_hit", "data": {"beat_id": "a"}},
+            {"type": "beat_hit", "data": {"beat_id": "a"}},
+            {"type": "fact_learned", "data": {"fact": "x"}},
+            {"type": "npc_met", "data": {"npc_key": "pip"}},
+            {"type": "threat_advanced", "data": {"stage": 2}},
+            {"type": "episode_completed", "data": {"episodes_completed": 1}},
+            {"type": "xp_awarded", "data": {"character_id": "c", "amount": 2}},
+        ]:
+            state = apply_event(state, event)
+        assert state.beats_hit == ["a"]
+        assert state.facts_known == ["x"]
+        assert state.npcs["pip"].met is True
+        assert state.threat_stage == 2
+        assert state.episodes_completed == 1
+
+    def test_base_event_replaces_state(self):
+        state = CampaignState(beats_hit=["a"])
+        state = apply_event(state, {"type": "state_reset", "data": {"state": CampaignState().model_dump()}})
+        assert state.beats_hit == []
+
+
+class TestLog:
+    def test_no_log(self, data_dir):
+        assert load_state("c1") is None
+        assert last_seq("c1") == 0
+
+    def test_seeds_from_base_state(self, data_dir):
+        state, first_seq = append_events("c1", [{"type": "beat_hit", "data": {"beat_id": "a"}}],
+                                         base_state=CampaignState(threat_stage=3))
+        assert first_seq == 2
+        assert state.threat_stage == 3
+        assert state.beats_hit == ["a"]
+        assert [e["type"] for e in list_events("c1")] == ["state_initialized", "beat_hit"]
+
+    def test_snapshots_bound_replay(self, data_dir, monkeypatch):
+        monkeypatch.setattr(campaign_events, "SNAPSHOT_EVERY", 10)
+        for i in range(25):
+            append_events("c1", [{"type": "fact_learned", "data": {"fact": f"fact {i}"}}])
+        snapshots = os.listdir(str(data_dir / "campaigns" / "c1" / "snapshots"))
+        assert "state_00000010.json" in snapshots
+        assert "state_00000020.json" in snapshots
+        assert len(load_state("c1").facts_known) == 25
+        assert len(load_state("c1", as_of_seq=15).facts_known) == 15
+        assert [e["seq"] for e in list_events("c1", after_seq=20)] == [21, 22, 23, 24, 25]
+
+    def test_as_of_episode_skips_later_snapshots(self, data_dir, monkeypatch):
+        monkeypatch.setattr(campaign_events, "SNAPSHOT_EVERY", 3)
+        append_events("c1", [{"type": "fact_learned", "data": {"fact": "before"}}])
+        append_events("c1", [{"type": "episode_completed", "data": {"episodes_completed": 1}}])
+        for i in range(5):
+            append_events("c1", [{"type": "fact_learned", "data": {"fact": f"after {i}"}}])
+        assert load_state("c1", as_of_episode=1).facts_known == ["before"]
+        assert load_state("c1", as_of_episode=0).facts_known == []
+
+
+class TestStateRoutes:
+    @pytest.fixture(autouse=True)
+    def advance_episodes(self, monkeypatch):
+        monkeypatch.setattr(config, "ADVANCE_EPISODE_ON_SESSION_END", True)
+
+    def test_hit_beat_appends_events(self, client, campaign_dir):
+        resp = _hit(client, "find_the_scholar", facts=["Mossback hides a map"], npcs=["Bramblewick"])
+        assert resp.status_code == 200
+
+        events = client.get("/campaigns/test_campaign/events").json()
+        types = [e["type"] for e in events["events"]]
+        # First write seeds the log from the legacy state.json
+        assert types[0] == "state_initialized"
+        assert types[1:] == ["beat_hit", "fact_learned", "fact_learned", "npc_met"]
+        assert events["last_seq"] == 5
+
+        state = client.get("/campaigns/test_campaign/state").json()
+        assert "Mossback hides a map" in state["facts_known"]
+        assert state["npcs"]["bramblewick"]["met"] is True
+
+    def test_rollback_mistaken_beat(self, client, campaign_dir):
+        data = _hit(client, "find_the_scholar").json()
+        assert data["rollback_to"] == 1
+
+        resp = client.post("/campaigns/test_campaign/state/rollback", json={"to_seq": data["rollback_to"]})
+        assert resp.status_code == 200
+        state = client.get("/campaigns/test_campaign/state").json()
+        assert state["beats_hit"] == ["first_signs"]
+
+        # The rollback is itself an event, so the beat can be hit again
+        assert _hit(client, "find_the_scholar").status_code == 200
+
+    def test_concurrent_hits_of_one_beat(self, client, campaign_dir):
+        def hit(_):
+            try:
+                return hit_beat("test_campaign", BeatHitRequest(beat_id="find_the_scholar"))["rollback_to"]
+            except HTTPException as error:
+                return error.status_code
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(hit, range(8)))
+        assert sorted(results) == [1] + [400] * 7
+        types = [e["type"] for e in list_events("test_campaign")]
+        assert types.count("beat_hit") == 1
+
+    def test_rollback_unknown_seq(self, client, campaign_dir):
+        assert client.post("/campaigns/test_campaign/state/rollback", json={"to_seq": 1}).status_code == 404
+        _hit(client, "find_the_scholar")
+        assert client.post("/campaigns/test_campaign/state/rollback", json={"to_seq": 99}).status_code == 400
+
+    def test_session_end_completes_episode(self, client, campaign_dir):
+        _play_episode(client)
+        state = client.get("/campaigns/test_campaign/state").json()
+        assert state["episodes_completed"] == 3
+        # No beat hit during the episode, so the threat advances
+        assert state["threat_stage"] == 2
+
+        types = [e["type"] for e in client.get("/campaigns/test_campaign/events").json()["events"]]
+        assert types == ["state_initialized", "xp_awarded", "session_ended", "threat_advanced", "episode_completed"]
+
+    def test_session_end_leaves_episodes_by_default(self, client, campaign_dir, monkeypatch):
+        monkeypatch.setattr(config, "ADVANCE_EPISODE_ON_SESSION_END", False)
+        _play_episode(client)
+        state = client.get("/campaigns/test_campaign/state").json()
+        assert state["episodes_completed"] == 2
+        assert state["threat_stage"] == 1
+        types = [e["type"] for e in client.get("/campaigns/test_campaign/events").json()["events"]]
+        assert types == ["state_initialized", "xp_awarded", "session_ended"]
+
+    def test_beat_hit_holds_threat(self, client, campaign_dir):
+        client.post(
+            "/campaigns/test_campaign/session/start",
+            json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+        )
+        _hit(client, "find_the_scholar")
+        client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"})
+        assert client.get("/campaigns/test_campaign/state").json()["threat_stage"] == 1
+
+    def test_state_as_of_episode(self, client, campaign_dir):
+        _play_episode(client)
+        _hit(client, "find_the_scholar")
+        _play_episode(client)
+
+        before = client.get("/campaigns/test_campaign/state", params={"as_of_episode": 3}).json()
+        assert before["episodes_completed"] == 3
+        assert "find_the_scholar" not in before["beats_hit"]
+        now = client.get("/campaigns/test_campaign/state").json()
+        assert now["episodes_completed"] == 4
+        assert "find_the_scholar" in now["beats_hit"]
+
+    def test_as_of_episode_after_reset(self, client, campaign_dir):
+        _play_episode(client)
+        _play_episode(client)
+        client.post("/campaigns/test_campaign/state/reset")
+        for beat_id in ("first_signs", "find_the_scholar"):
+            client.post(
+                "/campaigns/test_campaign/session/start",
+                json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+            )
+            _hit(client, beat_id)
+            client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"})
+
+        now = client.get("/campaigns/test_campaign/state").json()
+        assert now["episodes_completed"] == 2
+        # A beat was hit in each episode since the reset, so the threat held
+        assert now["threat_stage"] == 0
+        first = client.get("/campaigns/test_campaign/state", params={"as_of_episode": 1}).json()
+        assert first["episodes_completed"] == 1
+        assert first["beats_hit"] == ["first_signs"]
+        assert client.get("/campaigns/test_campaign/state", params={"as_of_episode": 0}).json()["beats_hit"] == []
+
+    def test_as_of_episode_after_rollback(self, client, campaign_dir):
+        _play_episode(client)
+        client.post(
+            "/campaigns/test_campaign/session/start",
+            json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+        )
+        mistake = _hit(client, "find_the_scholar").json()
+        client.post("/campaigns/test_campaign/state/rollback", json={"to_seq": mistake["rollback_to"]})
+        client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"})
+
+        # The restore continues the timeline it came from, so episode 3 still ends where it did
+        third = client.get("/campaigns/test_campaign/state", params={"as_of_episode": 3}).json()
+        assert third["episodes_completed"] == 3
+        assert third["threat_stage"] == 2
+        now = client.get("/campaigns/test_campaign/state").json()
+        assert now["episodes_completed"] == 4
+        assert "find_the_scholar" not in now["beats_hit"]
+        # The rolled-back beat does not count, so the threat advanced again
+        assert now["threat_stage"] == 3
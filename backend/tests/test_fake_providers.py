@@ -0,0 +1,80 @@
+"""
+Tests for the fake Anthropic and Replicate servers, driven through the real SDK code paths
+"""
+
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+import ai_calls
+import config
+from deadlines import Deadline
+from fake_providers import FakeProviderSettings, create_app, image_bytes
+from llm_scheduler import LLMScheduler
+
+
+def _serve(settings: FakeProviderSettings):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(settings), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+@pytest.fixture
+def fake_providers(monkeypatch):
+    """Start a fake provider server and point the backend at it; yields a function to restart it with new settings"""
+    running = []
+
+    def start(**settings):
+        while running:
+            server, thread = running.pop()
+            server.should_exit = True
+            thread.join()
+        server, thread, url = _serve(FakeProviderSettings(first_token_ms=5, tokens_per_second=5000, render_ms=20, latency_sigma=0, **settings))
+        running.append((server, thread))
+        monkeypatch.setattr(config, "ANTHROPIC_BASE_URL", url)
+        monkeypatch.setattr(config, "REPLICATE_BASE_URL", url)
+        return url
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "fake")
+    monkeypatch.setattr(ai_calls, "PREDICTION_POLL_SECONDS", 0.01)
+    # Injected 429s pause the scheduler they are reported to; keep that out of the shared one
+    monkeypatch.setattr(ai_calls, "scheduler", LLMScheduler(max_concurrency=4))
+    start()
+    yield start
+    for server, thread in running:
+        server.should_exit = True
+        thread.join()
+
+
+class TestFakeProviders:
+    def test_streamed_claude_reply_with_usage(self, fake_providers):
+        kwargs = dict(model="claude-sonnet-4-20250514", max_tokens=30, system="You are the DM.",
+                      messages=[{"role": "user", "content": "I look around"}])
+        reply = ai_calls.claude_message(**kwargs)
+        assert len(reply.split()) >= 20
+        # The same request gets the same reply
+        assert ai_calls.claude_message(**kwargs) == reply
+
+    def test_render_and_download_are_deterministic(self, fake_providers):
+        url = ai_calls.render_image({"prompt": "a heron at dusk"})
+        content = ai_calls.fetch_bytes(url)
+        assert content == image_bytes("a heron at dusk", FakeProviderSettings().image_bytes)
+        assert content[:4] == b"RIFF" and content[8:12] == b"WEBP"
+        assert ai_calls.fetch_bytes(ai_calls.render_image({"prompt": "a heron at dusk"})) == content
+
+    def test_injected_rate_limits_reach_the_caller(self, fake_providers):
+        import anthropic
+
+        fake_providers(rate_limit_rate=1.0, retry_after_seconds=5)
+        with pytest.raises(anthropic.RateLimitError):
+            # The Retry-After outlasts the deadline, so the call is not retried
+            ai_calls.claude_message(deadline=Deadline(1), model="m", max_tokens=5, messages=[{"role": "user", "content": "hi"}])
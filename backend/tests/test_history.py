@@ -0,0 +1,126 @@
+"""
+Tests for the FTS5 history index and history routes
+"""
+
+import pytest
+
+from history_index import build_match_query, index_episode, search_history, indexed_episodes
+from play_memory import archive_session, reindex_history
+
+
+def _record(episode, log, images=None):
+    return {"episode": episode, "log": log, "images": images or []}
+
+
+@pytest.fixture
+def archived(campaign_dir):
+    """Two archived episodes for test_campaign"""
+    archive_session("test_campaign", {
+        "active": True,
+        "quest": "Cross the marsh",
+        "log": [
+            {"type": "chat", "role": "player", "content": "We hail the heron"},
+            {"type": "chat", "role": "dm", "content": "A grey heron named Greywing peers down at you."},
+            {"type": "roll", "die": "d20", "total": 14, "purpose": "persuade the heron", "threshold": "partial"},
+        ],
+        "images": [{"url": "/x.webp", "prompt": "a towering heron in misty reeds at dawn"}],
+    }, "victory")
+    archive_session("test_campaign", {
+        "active": True,
+        "quest": "Visit the mill",
+        "log": [
+            {"type": "chat", "role": "player", "content": "We knock on the mill door"},
+            {"type": "chat", "role": "dm", "content": "The miller, a stout otter, lets you in."},
+        ],
+    }, "retreat")
+    return campaign_dir
+
+
+class TestBuildMatchQuery:
+    def test_strips_stopwords_and_punctuation(self):
+        assert build_match_query("when did we meet the heron?") == '"meet" OR "heron"*'
+
+    def test_only_stopwords(self):
+        assert build_match_query("when did we?") is None
+
+    def test_quotes_fts_operators(self):
+        # NEAR is a plain word once quoted
+        assert build_match_query("heron NEAR") == '"heron" OR "near"*'
+
+
+class TestIndex:
+    def test_index_is_idempotent(self, data_dir):
+        record = _record(1, [{"type": "chat", "role": "dm", "content": "Hello there"}])
+        assert index_episode("c1", record) == 1
+        assert index_episode("c1", record) == 0
+        assert search_history("c1", "hello")["total"] == 1
+
+    def test_rolls_without_purpose_skipped(self, data_dir):
+        record = _record(1, [{"type": "roll", "die": "d6", "total": 3, "purpose": ""}])
+        assert index_episode("c1", record) == 0
+
+    def test_reindex_fills_gaps(self, archived):
+        import os
+        os.remove(str(archived / "history.db"))
+        assert reindex_history("test_campaign") == 2
+        assert indexed_episodes("test_campaign") == {1, 2}
+
+
+class TestSearch:
+    def test_ranked_results(self, archived):
+        result = search_history("test_campaign", "when did we meet the heron?")
+        assert result["total"] == 4
+        assert all(r["episode"] == 1 for r in result["results"])
+
+    def test_kind_filter(self, archived):
+        result = search_history("test_campaign", "heron", kind="scene")
+        assert result["total"] == 1
+        assert result["results"][0]["kind"] == "scene"
+
+    def test_prefix_match(self, archived):
+        result = search_history("test_campaign", "mil")
+        assert result["total"] == 2
+
+    def test_stemming(self, archived):
+        assert search_history("test_campaign", "knocking")["total"] == 1
+
+
+class TestHistoryRoutes:
+    def test_search_endpoint_paginates(self, client, archived):
+        first = client.get("/campaigns/test_campaign/history/search", params={"q": "heron", "limit": 2}).json()
+        second = client.get("/campaigns/test_campaign/history/search", params={"q": "heron", "limit": 2, "offset": 2}).json()
+        assert first["total"] == 4
+        assert len(first["results"]) == 2
+        assert len(second["results"]) == 2
+        seen = {(r["episode"], r["kind"], r["position"]) for r in first["results"] + second["results"]}
+        assert len(seen) == 4
+
+    def test_search_snippet_highlights(self, client, archived):
+        data = client.get("/campaigns/test_campaign/history/search", params={"q": "otter"}).json()
+        assert "<mark>otter</mark>" in data["results"][0]["snippet"]
+
+    def test_search_snippet_escapes_html(self, client, campaign_dir):
+        archive_session("test_campaign", {
+            "active": True,
+            "log": [{"type": "chat", "role": "player", "content": "<img src=x onerror=alert(1)> otter"}],
+        }, "victory")
+        snippet = client.get("/campaigns/test_campaign/history/search", params={"q": "otter"}).json()["results"][0]["snippet"]
+        assert "<img" not in snippet
+        assert "&lt;img" in snippet
+        assert "<mark>otter</mark>" in snippet
+
+    def test_search_unknown_campaign_creates_nothing(self, client, data_dir):
+        data = client.get("/campaigns/nope/history/search", params={"q": "heron"}).json()
+        assert data["total"] == 0
+        assert not (data_dir / "campaigns" / "nope").exists()
+
+    def test_search_requires_query(self, client, archived):
+        assert client.get("/campaigns/test_campaign/history/search").status_code == 422
+
+    def test_history_list(self, client, archived):
+        data = client.get("/campaigns/test_campaign/history").json()
+        assert [e["episode"] for e in data["episodes"]] == [1, 2]
+        assert data["episodes"][1]["quest"] == "Visit the mill"
+
+    def test_history_episode_404(self, client, archived):
+        assert client.get("/campaigns/test_campaign/history/9").status_code == 404
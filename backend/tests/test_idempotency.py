@@ -0,0 +1,131 @@
+"""
+Tests for Idempotency-Key handling on the model and image endpoints
+"""
+
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import config
+import idempotency
+from idempotency import run_idempotent
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(idempotency, "_scopes", {})
+
+
+@pytest.fixture
+def fake_flux(monkeypatch):
+    """Replicate stub that counts renders"""
+    import routes.dm_ai as dm_ai
+
+    calls = []
+
+    def render(input, token=None, **usage):
+        calls.append(input["prompt"])
+        return f"https://replicate.example/{len(calls)}.webp"
+
+    monkeypatch.setattr(dm_ai, "render_image", render)
+    monkeypatch.setattr(dm_ai, "download_image", lambda url, campaign_id=None, token=None: url)
+    return calls
+
+
+@pytest.fixture
+def fake_claude(monkeypatch):
+    """Anthropic stub that counts DM turns"""
+    import routes.dm_ai as dm_ai
+
+    calls = []
+
+    def reply(token=None, **kwargs):
+        calls.append(kwargs)
+        return f"The DM speaks ({len(calls)})."
+
+    monkeypatch.setattr(dm_ai, "claude_message", reply)
+    return calls
+
+
+def _image(client, key=None, prompt="a heron at dusk"):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post("/campaigns/test_campaign/image/generate", json={"prompt": prompt}, headers=headers)
+
+
+class TestRoutes:
+    def test_retry_replays_the_first_result(self, client, campaign_dir, fake_flux):
+        first = _image(client, "k1")
+        again = _image(client, "k1")
+        assert again.json() == first.json()
+        assert again.headers["Idempotent-Replayed"] == "true"
+        assert "Idempotent-Replayed" not in first.headers
+        assert len(fake_flux) == 1
+
+    def test_without_a_key_every_request_runs(self, client, campaign_dir, fake_flux):
+        _image(client)
+        _image(client)
+        assert len(fake_flux) == 2
+
+    def test_key_reused_for_another_request_is_rejected(self, client, campaign_dir, fake_flux):
+        _image(client, "k1")
+        assert _image(client, "k1", prompt="a different scene").status_code == 422
+        assert len(fake_flux) == 1
+
+    def test_replay_expires(self, client, campaign_dir, fake_flux, monkeypatch):
+        monkeypatch.setattr(config, "IDEMPOTENCY_TTL_SECONDS", 0)
+        _image(client, "k1")
+        _image(client, "k1")
+        assert len(fake_flux) == 2
+
+    def test_retried_dm_turn_is_logged_once(self, client, campaign_dir, fake_claude):
+        client.post(
+            "/campaigns/test_campaign/session/start",
+            json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+        )
+        body = {"message": "I look around", "includeState": False}
+        headers = {"Idempotency-Key": "turn-1"}
+        first = client.post("/campaigns/test_campaign/dm/message", json=body, headers=headers)
+        again = client.post("/campaigns/test_campaign/dm/message", json=body, headers=headers)
+        assert first.status_code == 200 and again.json() == first.json()
+        assert len(fake_claude) == 1
+        log = client.get("/campaigns/test_campaign/session").json()["log"]
+        assert [e["content"] for e in log if e.get("type") == "chat"] == ["I look around", "The DM speaks (1)."]
+
+
+class TestRunIdempotent:
+    def test_in_flight_duplicate_waits_for_the_original(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow(token):
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"answer": 42}
+
+        results = []
+        original = threading.Thread(target=lambda: results.append(run_idempotent("c", "k", "fp", slow)))
+        original.start()
+        started.wait(5)
+        duplicate = threading.Thread(target=lambda: results.append(run_idempotent("c", "k", "fp", slow)))
+        duplicate.start()
+        time.sleep(0.05)
+        release.set()
+        original.join(5)
+        duplicate.join(5)
+        assert calls == [1]
+        assert results == [{"answer": 42}, {"answer": 42}]
+
+    def test_failures_are_not_stored(self):
+        def fail(token):
+            raise HTTPException(status_code=500, detail="AI error")
+
+        with pytest.raises(HTTPException):
+            run_idempotent("c", "k", "fp", fail)
+        assert run_idempotent("c", "k", "fp", lambda token: "ok") == "ok"
+
+    def test_keys_are_scoped_per_campaign(self):
+        assert run_idempotent("a", "k", "fp", lambda token: "first") == "first"
+        assert run_idempotent("b", "k", "fp", lambda token: "second") == "second"
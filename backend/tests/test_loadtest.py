@@ -0,0 +1,58 @@
+"""
+Tests for the synthetic campaign generator and the load-test driver
+"""
+
+import asyncio
+
+import httpx
+
+from campaign_logic import load_campaign_content, load_campaign_state
+from helpers import load_campaign_json, load_json
+from loadtest.run import drive, percentile, regressions, report
+from loadtest.synthetic import MAX_CONTENT_ITEMS, write_campaign
+from play_memory import list_archived_episodes, recall_moments
+
+
+class TestSynthetic:
+    def test_campaign_is_valid_at_the_requested_size(self, data_dir):
+        write_campaign("synth", npcs=40, beats=7, roster=6, log_entries=120, notes=25, archived_episodes=2)
+        content = load_campaign_content("synth")
+        assert len(content.npcs) == MAX_CONTENT_ITEMS
+        assert len(content.beats) == 7
+        assert load_campaign_state("synth").beats_hit == ["beat_000", "beat_001"]
+        session = load_campaign_json("synth", "current_session.json")
+        assert len(session["log"]) == 120 and len(session["party"]) == 6
+        assert len(load_campaign_json("synth", "dm_prep.json")["author_notes"]) == 25
+        assert list_archived_episodes("synth") == [1, 2]
+        assert recall_moments("synth", "moss heron")
+        assert load_json("campaigns.json")["campaigns"][0]["id"] == "synth"
+
+    def test_same_seed_same_campaign(self, data_dir):
+        write_campaign("a", seed=3)
+        write_campaign("b", seed=3)
+        assert load_campaign_json("a", "campaign.json") == load_campaign_json("b", "campaign.json")
+
+
+class TestDriver:
+    def test_tables_play_every_route(self, data_dir, monkeypatch):
+        import routes.dm_ai as dm_ai
+        from main import app
+
+        monkeypatch.setattr(dm_ai, "claude_message", lambda token=None, **kwargs: "The mist parts.")
+        campaign_ids = [write_campaign(f"load_{n}", log_entries=20) for n in range(2)]
+        results = asyncio.run(drive(
+            "http://test", campaign_ids, tables=4, duration=0.5, think_seconds=0, seed=1,
+            transport=httpx.ASGITransport(app=app),
+        ))
+        summary = report(results, 0.5)
+        assert summary["total"]["requests"] == len(results) > 0
+        assert summary["total"]["errors"] == 0
+        assert "POST /campaigns/{campaign_id}/dice/roll" in summary
+
+    def test_report_percentiles_and_regressions(self):
+        assert percentile([10, 20, 30, 40], 50) == 20
+        assert percentile([10, 20, 30, 40], 99) == 40
+        summary = report([("GET /x", 200, 0.010)] * 19 + [("GET /x", 500, 1.0)], duration=2)
+        assert summary["GET /x"] == {"requests": 20, "errors": 1, "rps": 10.0, "p50_ms": 10.0, "p95_ms": 10.0, "p99_ms": 1000.0}
+        assert regressions(summary, {"GET /x": {"p95_ms": 5.0}}, 0.25) == ["GET /x: p95 5ms -> 10ms"]
+        assert regressions(summary, {"GET /x": {"p95_ms": 9.0}}, 0.25) == []
@@ -2,6 +2,8 @@
 Tests for pure logic functions in campaign_logic.py
 """
 
+import json
+
 import pytest
 from campaign_schema import (
     CampaignContent,
@@ -14,6 +16,7 @@ from campaign_logic import (
     check_beat_expiry,
     advance_threat,
     build_dm_context,
+    load_campaign_content,
 )
 
 
@@ -191,3 +194,39 @@ class TestBuildDmContext:
         beat_ids = [b["id"] for b in result["available_beats"]]
         # first_signs already hit, find_the_scholar should be available
         assert "find_the_scholar" in beat_ids
+
+
+class TestContentCache:
+    def test_unchanged_file_is_not_validated_again(self, data_dir, campaign_dir, monkeypatch):
+        import campaign_logic
+
+        first = load_campaign_content("test_campaign")
+        validations = []
+        real_adapter = campaign_logic.CONTENT_ADAPTER
+
+        class CountingAdapter:
+            def validate_python(self, data):
+                validations.append(1)
+                return real_adapter.validate_python(data)
+
+        monkeypatch.setattr(campaign_logic, "CONTENT_ADAPTER", CountingAdapter())
+        second = load_campaign_content("test_campaign")
+        assert validations == [] and second.name == first.name
+        # Each caller gets its own copy, nested lists and models included
+        original = (first.name, len(first.beats), first.npcs[0].name)
+        second.name = "Renamed"
+        second.beats.pop()
+        first.npcs[0].name = "Mutated"
+        third = load_campaign_content("test_campaign")
+        assert (third.name, len(third.beats), third.npcs[0].name) == original
+
+        data = json.loads((campaign_dir / "campaign.json").read_text())
+        data["name"] = "Edited on disk"
+        (campaign_dir / "campaign.json").write_text(json.dumps(data))
+        assert load_campaign_content("test_campaign").name == "Edited on disk"
+        assert validations == [1]
+
+    def test_deleted_file_is_not_served_from_cache(self, data_dir, campaign_dir):
+        assert load_campaign_content("test_campaign") is not None
+        (campaign_dir / "campaign.json").unlink()
+        assert load_campaign_content("test_campaign") is None
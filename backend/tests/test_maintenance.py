@@ -0,0 +1,65 @@
+"""
+Tests for the parallel maintenance runner
+"""
+
+import json
+
+import pytest
+
+import maintenance
+from maintenance import run_task, discover_campaigns, load_checkpoint
+
+
+def _quiet(_message):
+    pass
+
+
+@pytest.fixture
+def campaigns(data_dir, campaign_dir):
+    """test_campaign (unstamped fixture files) plus a second, empty campaign and a migration backup"""
+    (data_dir / "campaigns" / "second").mkdir()
+    (data_dir / "campaigns" / "test_campaign_backup_20240101_000000").mkdir()
+    return data_dir
+
+
+class TestRunner:
+    def test_discovery_skips_backups(self, campaigns):
+        assert discover_campaigns(str(campaigns)) == ["second", "test_campaign"]
+
+    def test_dry_run_writes_nothing(self, campaigns):
+        before = (campaigns / "campaigns" / "test_campaign" / "roster.json").read_text()
+        summary = run_task("upgrade-documents", str(campaigns), workers=2, dry_run=True, report=_quiet)
+        assert summary["done"] == 2
+        detail = next(r["detail"] for r in summary["results"] if r["campaign_id"] == "test_campaign")
+        assert detail.startswith("would upgrade")
+        assert (campaigns / "campaigns" / "test_campaign" / "roster.json").read_text() == before
+        assert not (campaigns / "maintenance").exists()
+
+    def test_upgrade_and_checkpoint(self, campaigns):
+        summary = run_task("upgrade-documents", str(campaigns), workers=2, report=_quiet)
+        assert summary["done"] == 2 and not summary["failed"]
+        roster = json.loads((campaigns / "campaigns" / "test_campaign" / "roster.json").read_text())
+        assert roster["schema_version"] == 1
+        assert load_checkpoint(str(campaigns), "upgrade-documents") == {"second", "test_campaign"}
+
+        # A second run resumes from the checkpoint and has nothing left to do
+        again = run_task("upgrade-documents", str(campaigns), workers=2, report=_quiet)
+        assert again["skipped"] == 2 and again["results"] == []
+        assert run_task("upgrade-documents", str(campaigns), workers=2, restart=True, report=_quiet)["done"] == 2
+
+    def test_failures_are_summarized_and_retried(self, campaigns, monkeypatch):
+        def flaky(campaign_id, dry_run):
+            if campaign_id == "second":
+                raise RuntimeError("disk on fire")
+            return "ok"
+
+        monkeypatch.setitem(maintenance.TASKS, "flaky", (flaky, "test task"))
+        summary = run_task("flaky", str(campaigns), workers=1, report=_quiet)
+        assert [f["campaign_id"] for f in summary["failed"]] == ["second"]
+        assert "disk on fire" in summary["failed"][0]["detail"]
+        # Failed campaigns are not checkpointed, so the next run tries them again
+        assert load_checkpoint(str(campaigns), "flaky") == {"test_campaign"}
+
+    def test_unknown_task(self, campaigns):
+        with pytest.raises(ValueError):
+            run_task("nope", str(campaigns), report=_quiet)
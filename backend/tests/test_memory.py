@@ -0,0 +1,168 @@
+"""
+Tests for session archiving, recaps, and past-moment recall
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import helpers
+import routes.sessions
+from play_memory import (
+    extract_moments,
+    archive_session,
+    recall_moments,
+    list_archived_episodes,
+    load_archived_session,
+    get_latest_recap,
+    generate_recap,
+)
+from dm_context_builder import format_play_memory_for_dm
+
+
+def _played_session(client):
+    client.post(
+        "/campaigns/test_campaign/session/start",
+        json={"quest": "Find the heron", "location": "The marsh", "partyIds": ["char_001"]},
+    )
+    # Write log entries directly; the DM route needs a live API key
+    session = helpers.load_campaign_json("test_campaign", "current_session.json")
+    session["log"] = [
+        {"type": "chat", "role": "player", "content": "We wade toward the old heron on the reeds"},
+        {"type": "chat", "role": "dm", "content": "The heron Greywing lifts one leg and eyes you warily."},
+        {"type": "roll", "die": "d20", "result": 16, "modifier": 0, "total": 16, "purpose": "calm the heron", "threshold": "success"},
+        {"type": "chat", "role": "player", "content": "Pip offers a shiny acorn"},
+        {"type": "chat", "role": "dm", "content": "Greywing accepts and promises to guide you past the bog."},
+    ]
+    helpers.save_campaign_json("test_campaign", "current_session.json", session)
+
+
+class TestExtractMoments:
+    def test_pairs_player_and_dm(self):
+        session = {"log": [
+            {"type": "chat", "role": "player", "content": "Hello"},
+            {"type": "chat", "role": "dm", "content": "Welcome"},
+        ]}
+        moments = extract_moments(session)
+        assert len(moments) == 1
+        assert moments[0]["text"] == "Player: Hello\nDM: Welcome"
+
+    def test_rolls_are_moments(self):
+        session = {"log": [
+            {"type": "roll", "die": "d20", "total": 12, "purpose": "sneak", "threshold": "partial"},
+        ]}
+        moments = extract_moments(session)
+        assert moments[0]["kind"] == "roll"
+        assert "sneak" in moments[0]["text"]
+
+
+class TestArchive:
+    def test_end_session_archives_log(self, client, campaign_dir):
+        _played_session(client)
+        resp = client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"})
+        assert resp.json()["archived_episode"] == 1
+
+        record = load_archived_session("test_campaign", 1)
+        assert record["quest"] == "Find the heron"
+        assert len(record["log"]) == 5
+
+    def test_background_recap_falls_back_without_model(self, client, campaign_dir):
+        _played_session(client)
+        client.post("/campaigns/test_campaign/session/end", json={"outcome": "retreat"})
+
+        record = load_archived_session("test_campaign", 1)
+        assert record["recap"]
+        assert "Find the heron" in record["recap"]
+
+    def test_inactive_session_not_archived(self, client, campaign_dir):
+        resp = client.post("/campaigns/test_campaign/session/end", json={"outcome": "failed"})
+        assert resp.json()["archived_episode"] is None
+        assert list_archived_episodes("test_campaign") == []
+
+    def test_episodes_numbered_sequentially(self, client, campaign_dir):
+        for _ in range(2):
+            _played_session(client)
+            client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"})
+        assert list_archived_episodes("test_campaign") == [1, 2]
+
+    def test_retried_archive_reuses_episode(self, data_dir):
+        session = {"active": True, "quest": "Retry", "log": []}
+        first = archive_session("test_campaign", session, "victory")
+        again = archive_session("test_campaign", {**session, "archived_episode": first["episode"]}, "victory")
+        assert again["episode"] == first["episode"]
+        assert list_archived_episodes("test_campaign") == [1]
+
+    def test_concurrent_archives_get_distinct_episodes(self, data_dir):
+        sessions = [{"active": True, "quest": f"Quest {n}", "log": []} for n in range(8)]
+        with ThreadPoolExecutor(8) as pool:
+            episodes = [record["episode"] for record in pool.map(lambda s: archive_session("test_campaign", s, "victory"), sessions)]
+        assert sorted(episodes) == list(range(1, 9))
+        assert list_archived_episodes("test_campaign") == list(range(1, 9))
+
+    def test_end_retried_after_failed_archive_awards_xp_once(self, client, campaign_dir, monkeypatch):
+        _played_session(client)
+        real_archive = routes.sessions.archive_session
+
+        def failing_archive(*args):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(routes.sessions, "archive_session", failing_archive)
+        with pytest.raises(OSError):
+            client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"})
+        monkeypatch.setattr(routes.sessions, "archive_session", real_archive)
+        assert client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"}).json()["archived_episode"] == 1
+
+        roster = helpers.load_campaign_json("test_campaign", "roster.json")
+        assert next(c for c in roster["characters"] if c["id"] == "char_001")["xp"] == 2
+
+    def test_latest_recap_reads_recap_file(self, data_dir):
+        for quest in ("Cross the marsh", "Visit the mill"):
+            record = archive_session("test_campaign", {"active": True, "quest": quest, "log": []}, "victory")
+            generate_recap("test_campaign", record["episode"])
+        latest = get_latest_recap("test_campaign")
+        assert latest["episode"] == 2
+        assert "Visit the mill" in latest["recap"]
+        # Archives are not read once recaps.json exists
+        (data_dir / "campaigns" / "test_campaign" / "archive" / "episode_002.json").unlink()
+        assert get_latest_recap("test_campaign")["episode"] == 2
+
+
+class TestRecall:
+    def test_recall_finds_relevant_moment(self, client, campaign_dir):
+        _played_session(client)
+        client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"})
+
+        moments = recall_moments("test_campaign", "where did we meet greywing", limit=3)
+        assert moments
+        assert "Greywing" in moments[0]["text"]
+        assert moments[0]["episode"] == 1
+
+    def test_recall_respects_limit(self, client, campaign_dir):
+        _played_session(client)
+        client.post("/campaigns/test_campaign/session/end", json={"outcome": "victory"})
+
+        assert len(recall_moments("test_campaign", "heron greywing acorn bog", limit=1)) == 1
+
+    def test_recall_empty_archive(self, data_dir):
+        assert recall_moments("nobody", "heron") == []
+
+    def test_unmatched_query_returns_nothing(self, data_dir):
+        archive_session("test_campaign", {"active": True, "log": [
+            {"type": "chat", "role": "player", "content": "We rest at the inn"},
+        ]}, "victory")
+        assert recall_moments("test_campaign", "dragon") == []
+
+
+class TestFormatPlayMemory:
+    def test_empty(self):
+        assert format_play_memory_for_dm([], None) == ""
+
+    def test_truncates_long_moments(self):
+        section = format_play_memory_for_dm(
+            [{"episode": 2, "kind": "chat", "text": "x" * 1000}],
+            {"episode": 2, "recap": "They found the heron."},
+            max_moment_chars=50,
+        )
+        assert "episode 2" in section
+        assert "They found the heron." in section
+        assert "x" * 51 not in section
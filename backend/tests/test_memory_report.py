@@ -0,0 +1,71 @@
+"""
+Tests for memory introspection: cache sizes, live object counts and tracemalloc diffs
+"""
+
+import pytest
+
+import config
+import memory_report
+
+ADMIN = {"X-Weave-Admin-Token": "s3cret"}
+
+# Held at module level so the allocation outlives the request that measures it
+_retained: list = []
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+    yield
+    _retained.clear()
+    if memory_report.tracemalloc.is_tracing():
+        memory_report.stop_tracing()
+
+
+class TestReport:
+    def test_deep_size_follows_containers_but_not_shared_objects(self):
+        small, _ = memory_report.deep_sizeof({"a": [1]})
+        large, complete = memory_report.deep_sizeof({"a": ["x" * 10_000]})
+        assert complete and large - small > 10_000
+        # Classes and functions are shared, so holding one costs only the reference
+        assert memory_report.deep_sizeof([memory_report])[0] < 200
+
+    def test_overview_counts_models_and_sizes_caches(self, client, campaign_dir):
+        client.get("/campaigns/test_campaign/content")
+        client.get("/campaigns/test_campaign/search?q=heron")
+        report = client.get("/admin/memory", headers=ADMIN).json()
+
+        assert report["objects"]["CampaignContent"] >= 1
+        assert report["caches"]["content"]["entries"] >= 1
+        assert report["caches"]["content"]["bytes"] > 1000
+        assert report["caches"]["search_index"]["entries"] >= 1
+        assert {"campaign_actors", "idempotency", "metric_series", "request_profiles"} <= set(report["caches"])
+
+    def test_counts_session_documents(self):
+        session = {"party": [], "log": [{"type": "chat"}], "enemies": [], "active": True}
+        _retained.append(session)
+        assert memory_report.object_counts()["session document"] >= 1
+
+
+class TestTracemalloc:
+    def test_diff_points_at_the_allocating_line(self, client):
+        assert client.post("/admin/memory/snapshots", headers=ADMIN).status_code == 409
+        client.post("/admin/memory/tracemalloc", json={"frames": 1}, headers=ADMIN)
+        base = client.post("/admin/memory/snapshots", headers=ADMIN).json()["id"]
+        _retained.extend(bytearray(1024) for _ in range(2000))
+        head = client.post("/admin/memory/snapshots", headers=ADMIN).json()["id"]
+
+        sites = client.get(f"/admin/memory/diff?base={base}&head={head}", headers=ADMIN).json()["sites"]
+        assert "test_memory_report.py" in sites[0]["site"]
+        assert sites[0]["bytes_diff"] > 2_000_000 and sites[0]["count_diff"] >= 2000
+
+        by_file = client.get(f"/admin/memory/snapshots/{head}?group_by=filename", headers=ADMIN).json()["top"]
+        assert any(entry["site"].endswith("test_memory_report.py") for entry in by_file)
+        assert client.get(f"/admin/memory/diff?base=999&head={head}", headers=ADMIN).status_code == 404
+
+        client.delete("/admin/memory/tracemalloc", headers=ADMIN)
+        assert not client.get("/admin/memory", headers=ADMIN).json()["tracemalloc"]["tracing"]
+
+    def test_admin_only(self, client):
+        assert client.get("/admin/memory").status_code == 403
+        assert client.post("/admin/memory/tracemalloc", json={}).status_code == 403
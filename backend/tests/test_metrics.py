@@ -0,0 +1,123 @@
+"""
+Tests for the Prometheus metrics endpoint and request stage timings
+"""
+
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+import ai_calls
+import config
+import metrics
+from campaign_logic import load_campaign_content
+from metrics import CACHE_LOOKUPS, LLM_TOKENS, REQUEST_SECONDS, STAGE_SECONDS, Counter, Histogram
+
+DM_ROUTE = "/campaigns/{campaign_id}/dm/message"
+
+
+@pytest.fixture
+def dm_turn(client, campaign_dir, monkeypatch):
+    import routes.dm_ai as dm_ai
+
+    monkeypatch.setattr(dm_ai, "claude_message", lambda token=None, **kwargs: "A heron lands.")
+    client.post(
+        "/campaigns/test_campaign/session/start",
+        json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+    )
+
+
+def _send(client):
+    return client.post("/campaigns/test_campaign/dm/message", json={"message": "I wave", "includeState": False})
+
+
+class TestExposition:
+    def test_counter_and_histogram_format(self, monkeypatch):
+        monkeypatch.setattr(metrics, "_metrics", [])
+        monkeypatch.setattr(metrics, "_collectors", [])
+        calls = Counter("test_calls_total", "Calls", ("kind",))
+        latency = Histogram("test_seconds", "Latency", ("route",), buckets=(0.1, 1))
+        calls.inc(kind='say "hi"')
+        calls.inc(2, kind='say "hi"')
+        latency.observe(0.5, route="/x")
+        metrics.register_collector(lambda: [("test_up", "gauge", "Up", [({}, 1)])])
+
+        assert metrics.render().splitlines() == [
+            "# HELP test_calls_total Calls",
+            "# TYPE test_calls_total counter",
+            'test_calls_total{kind="say \\"hi\\""} 3',
+            "# HELP test_seconds Latency",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{route="/x",le="0.1"} 0',
+            'test_seconds_bucket{route="/x",le="1"} 1',
+            'test_seconds_bucket{route="/x",le="+Inf"} 1',
+            'test_seconds_sum{route="/x"} 0.5',
+            'test_seconds_count{route="/x"} 1',
+            "# HELP test_up Up",
+            "# TYPE test_up gauge",
+            "test_up 1",
+        ]
+
+    def test_endpoint_serves_app_metrics(self, client, campaign_dir):
+        client.get("/campaigns/test_campaign/session")
+        resp = client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'weave_request_seconds_count{method="GET",route="/campaigns/{campaign_id}/session",status="200"}' in resp.text
+        assert 'weave_provider_breaker_state{provider="anthropic",state="closed"} 1' in resp.text
+        assert "weave_llm_concurrency_window" in resp.text
+
+
+class TestStages:
+    def test_dm_turn_records_its_stages(self, client, dm_turn):
+        before = {s: STAGE_SECONDS.count(route=DM_ROUTE, stage=s) for s in ("load", "recall", "claude", "save")}
+        requests_before = REQUEST_SECONDS.count(method="POST", route=DM_ROUTE, status=200)
+        assert _send(client).status_code == 200
+        for name, count in before.items():
+            assert STAGE_SECONDS.count(route=DM_ROUTE, stage=name) == count + 1
+        assert REQUEST_SECONDS.count(method="POST", route=DM_ROUTE, status=200) == requests_before + 1
+
+    def test_slow_requests_log_their_breakdown(self, client, dm_turn, monkeypatch, caplog):
+        monkeypatch.setattr(config, "SLOW_REQUEST_SECONDS", 0)
+        with caplog.at_level(logging.WARNING, logger="weave.slow_requests"):
+            _send(client)
+        line = json.loads([r.getMessage() for r in caplog.records if r.name == "weave.slow_requests"][-1])
+        assert line["route"] == DM_ROUTE
+        assert line["status"] == 200
+        assert {"load", "claude", "save"} <= set(line["stages"])
+
+
+class TestRecording:
+    def test_claude_tokens_by_model(self, monkeypatch):
+        class Stream:
+            response = SimpleNamespace(headers={})
+            text_stream = iter(["Hello"])
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                pass
+
+            def get_final_message(self):
+                return SimpleNamespace(usage=SimpleNamespace(
+                    input_tokens=120, output_tokens=7, cache_read_input_tokens=100, cache_creation_input_tokens=None,
+                ))
+
+        monkeypatch.setattr(ai_calls.anthropic, "Anthropic", lambda **options: SimpleNamespace(
+            messages=SimpleNamespace(stream=lambda **kwargs: Stream())
+        ))
+        before = {kind: LLM_TOKENS.value(model="metrics-test", kind=kind) for kind in ("input", "output", "cache_read")}
+        ai_calls.claude_message(model="metrics-test", max_tokens=10, messages=[])
+        assert LLM_TOKENS.value(model="metrics-test", kind="input") == before["input"] + 120
+        assert LLM_TOKENS.value(model="metrics-test", kind="output") == before["output"] + 7
+        assert LLM_TOKENS.value(model="metrics-test", kind="cache_read") == before["cache_read"] + 100
+
+    def test_content_cache_hits_are_counted(self, campaign_dir):
+        hits = CACHE_LOOKUPS.value(cache="content", result="hit")
+        misses = CACHE_LOOKUPS.value(cache="content", result="miss")
+        load_campaign_content("test_campaign")
+        load_campaign_content("test_campaign")
+        assert CACHE_LOOKUPS.value(cache="content", result="miss") == misses + 1
+        assert CACHE_LOOKUPS.value(cache="content", result="hit") == hits + 1
@@ -0,0 +1,118 @@
+"""
+Tests for schema version stamps and the migration registry
+"""
+
+import json
+import os
+
+import pytest
+
+import schema_migrations
+from schema_migrations import migration, upgrade_document, stamp_document, current_version
+from campaign_events import append_events, load_state, list_events
+from campaign_logic import load_campaign_content, save_campaign_state
+from campaign_schema import CampaignState, EXAMPLE_CAMPAIGN
+
+
+def _on_disk(campaign_dir, filename):
+    with open(campaign_dir / filename) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def scratch_type(monkeypatch):
+    """A throwaway document type whose migrations vanish after the test"""
+    monkeypatch.setattr(schema_migrations, "_MIGRATIONS", dict(schema_migrations._MIGRATIONS))
+    return "scratch"
+
+
+class TestRegistry:
+    def test_steps_run_in_order_from_stored_version(self, scratch_type):
+        calls = []
+
+        @migration(scratch_type, 2)
+        def to_v2(data):
+            calls.append(2)
+            return {**data, "b": data["a"] * 2}
+
+        @migration(scratch_type, 1)
+        def to_v1(data):
+            calls.append(1)
+            return {**data, "a": 1}
+
+        data, upgraded = upgrade_document(scratch_type, {})
+        assert upgraded and calls == [1, 2]
+        assert data == {"a": 1, "b": 2, "schema_version": 2}
+
+        calls.clear()
+        data, upgraded = upgrade_document(scratch_type, {"a": 5, "schema_version": 1})
+        assert calls == [2] and data["b"] == 10
+
+    def test_current_and_newer_documents_untouched(self, scratch_type):
+        migration(scratch_type, 1)(lambda data: {**data, "touched": True})
+        doc = {"x": 1, "schema_version": 1}
+        assert upgrade_document(scratch_type, doc) == (doc, False)
+        newer = {"x": 1, "schema_version": 9}
+        assert upgrade_document(scratch_type, newer) == (newer, False)
+
+    def test_duplicate_version_rejected(self, scratch_type):
+        migration(scratch_type, 1)(lambda data: data)
+        with pytest.raises(ValueError):
+            migration(scratch_type, 1)(lambda data: data)
+
+
+class TestStoredDocuments:
+    def test_legacy_campaign_upgraded_and_saved_once(self, data_dir, campaign_dir):
+        legacy = {k: v for k, v in EXAMPLE_CAMPAIGN.items() if k != "beats"}
+        legacy["anchor_runs"] = [
+            {"id": b["id"], "goal": b["description"], "reveal": b["revelation"], "trigger": {"type": "start"}}
+            for b in EXAMPLE_CAMPAIGN["beats"]
+        ]
+        (campaign_dir / "campaign.json").write_text(json.dumps(legacy))
+
+        content = load_campaign_content("test_campaign")
+        assert content is not None and content.beats
+        saved = _on_disk(campaign_dir, "campaign.json")
+        assert saved["schema_version"] == current_version("campaign")
+        assert "anchor_runs" not in saved
+
+        mtime = os.path.getmtime(campaign_dir / "campaign.json")
+        load_campaign_content("test_campaign")
+        assert os.path.getmtime(campaign_dir / "campaign.json") == mtime
+
+    def test_event_log_records_and_payloads_stamped(self, data_dir, campaign_dir):
+        save_campaign_state("test_campaign", CampaignState(threat_stage=2), "state_reset")
+        append_events("test_campaign", [{"type": "beat_hit", "data": {"beat_id": "first_signs"}}])
+        events = list_events("test_campaign")
+        assert all(e["schema_version"] == current_version("event") for e in events)
+        assert events[0]["data"]["state"]["schema_version"] == current_version("state")
+        assert load_state("test_campaign").threat_stage == 2
+
+    def test_unstamped_log_still_loads(self, data_dir, campaign_dir):
+        log = campaign_dir / "events.jsonl"
+        state = CampaignState(threat_stage=3).model_dump()
+        log.write_text(
+            json.dumps({"seq": 1, "type": "state_initialized", "episode": -1, "batch": 1, "data": {"state": state}}) + "\n"
+            + json.dumps({"seq": 2, "type": "beat_hit", "episode": 0, "batch": 2, "data": {"beat_id": "x"}}) + "\n"
+        )
+        loaded = load_state("test_campaign")
+        assert loaded.threat_stage == 3 and loaded.beats_hit == ["x"]
+
+    def test_session_and_roster_stamped_on_write(self, client, campaign_dir):
+        client.post(
+            "/campaigns/test_campaign/session/start",
+            json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+        )
+        client.put("/campaigns/test_campaign/characters/char_001", json={"level": 2})
+        assert _on_disk(campaign_dir, "current_session.json")["schema_version"] == 1
+        assert _on_disk(campaign_dir, "roster.json")["schema_version"] == 1
+        # Clients never see the stamp
+        assert "schema_version" not in client.get("/campaigns/test_campaign/session").json()
+
+    def test_draft_upgraded_before_saving(self, client, campaign_dir):
+        content = _on_disk(campaign_dir, "campaign.json")
+        wrapped = {"content": content, "system": {}, "schema_version": 99}
+        client.post("/campaigns/test_campaign/draft", json={"content": wrapped})
+        saved = _on_disk(campaign_dir, "draft.json")
+        assert saved["name"] == content["name"]
+        assert saved["schema_version"] == stamp_document("draft", {})["schema_version"]
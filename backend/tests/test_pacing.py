@@ -0,0 +1,86 @@
+"""
+Tests for the Monte Carlo pacing simulator and route
+"""
+
+from campaign_schema import CampaignContent, CampaignState, EXAMPLE_CAMPAIGN
+from pacing_simulator import simulate_pacing
+
+
+def _content(**beat_overrides):
+    data = {**EXAMPLE_CAMPAIGN, "beats": [dict(b) for b in EXAMPLE_CAMPAIGN["beats"]]}
+    for beat in data["beats"]:
+        beat.update(beat_overrides.get(beat["id"], {}))
+    return CampaignContent(**data)
+
+
+class TestSimulator:
+    def test_default_runs_summarize(self, sample_content):
+        # Wall-clock speed is checked by benchmarks/pacing.py, not here
+        result = simulate_pacing(sample_content, runs=20000, seed=1)
+        total = result["finale_rate"] + result["threat_maxed_rate"] + result["unfinished_rate"]
+        assert abs(total - 1.0) < 1e-3
+        assert result["threat_stage_probability"][0] == 1.0
+
+    def test_seeded_runs_repeat(self, sample_content):
+        assert simulate_pacing(sample_content, runs=500, seed=7) == simulate_pacing(sample_content, runs=500, seed=7)
+
+    def test_no_beats_hit_maxes_threat(self, sample_content):
+        result = simulate_pacing(sample_content, runs=200, hit_chance=0.0, seed=1)
+        assert result["finale_rate"] == 0.0
+        assert result["threat_maxed_rate"] == 1.0
+        # Five stages: the threat reaches the last one after four episodes
+        assert result["episodes_to_threat_max"]["histogram"] == {4: 1.0}
+
+    def test_always_hitting_reaches_finale(self, sample_content):
+        result = simulate_pacing(sample_content, runs=500, hit_chance=1.0, seed=1)
+        assert result["finale_rate"] == 1.0
+        # first_signs, find_the_scholar, then the finale or the lost patrol first
+        assert set(result["episodes_to_finale"]["histogram"]) <= {3, 4}
+
+    def test_beat_closing_before_unlock_is_flagged(self):
+        content = _content(the_lost_patrol={"unlocked_by": "episode:3", "closes_after_episodes": 2})
+        result = simulate_pacing(content, runs=500, seed=1)
+        patrol = next(b for b in result["beats"] if b["id"] == "the_lost_patrol")
+        assert patrol["never_available_rate"] == 1.0
+        assert patrol["hit_rate"] == 0.0
+        assert any("closes after episode 2 but unlocks after episode 3" in w for w in result["warnings"])
+
+    def test_expiry_rate(self):
+        content = _content(the_lost_patrol={"closes_after_episodes": 3})
+        result = simulate_pacing(content, runs=2000, hit_chance=0.3, seed=1)
+        patrol = next(b for b in result["beats"] if b["id"] == "the_lost_patrol")
+        assert patrol["expiry_rate"] > 0
+
+    def test_start_state(self, sample_content):
+        state = CampaignState(beats_hit=["first_signs", "find_the_scholar"], episodes_completed=2, threat_stage=3)
+        result = simulate_pacing(sample_content, runs=500, hit_chance=1.0, start_state=state, seed=1)
+        assert result["finale_rate"] == 1.0
+        assert set(result["episodes_to_finale"]["histogram"]) <= {3, 4}
+
+
+class TestPacingRoute:
+    def test_simulate_saved_content(self, client, campaign_dir):
+        resp = client.post("/campaigns/test_campaign/pacing/simulate", json={"runs": 1000, "seed": 1})
+        assert resp.status_code == 200
+        assert resp.json()["runs"] == 1000
+
+    def test_simulate_draft(self, client, data_dir):
+        draft = {**EXAMPLE_CAMPAIGN}
+        resp = client.post("/campaigns/new/pacing/simulate", json={"content": draft, "runs": 500})
+        assert resp.status_code == 200
+        assert len(resp.json()["beats"]) == len(draft["beats"])
+
+    def test_invalid_draft_400(self, client, data_dir):
+        resp = client.post("/campaigns/new/pacing/simulate", json={"content": {"name": "x"}})
+        assert resp.status_code == 400
+
+    def test_missing_content_404(self, client, data_dir):
+        assert client.post("/campaigns/nope/pacing/simulate", json={}).status_code == 404
+
+    def test_from_current_state(self, client, campaign_dir):
+        # sample_state is at threat stage 1
+        data = client.post(
+            "/campaigns/test_campaign/pacing/simulate",
+            json={"runs": 500, "hit_chance": 0.0, "from_current_state": True, "seed": 1},
+        ).json()
+        assert data["episodes_to_threat_max"]["histogram"] == {"5": 1.0}
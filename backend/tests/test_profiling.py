@@ -0,0 +1,127 @@
+"""
+Tests for the sampling profiler: per-request profiles, continuous per-route
+sampling, and the admin gate in front of both
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import config
+import profiling
+from profiling import ProfilingMiddleware
+
+ADMIN = {"X-Weave-Admin-Token": "s3cret"}
+PROFILE = {**ADMIN, "X-Weave-Profile": "1"}
+
+
+def _busy_sync_work(seconds: float):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+async def _busy_async_work(seconds: float):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+    await asyncio.sleep(0)
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/sync/{n}")
+    def sync_route(n: int):
+        _busy_sync_work(0.15)
+        return {"n": n}
+
+    @app.get("/async")
+    async def async_route():
+        await _busy_async_work(0.15)
+        return {}
+
+    @app.get("/thread")
+    async def to_thread_route():
+        await asyncio.to_thread(_busy_sync_work, 0.15)
+        return {}
+
+    return app
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(profiling, "_profiles", profiling.OrderedDict())
+    yield
+    profiling.stop_continuous()
+
+
+def _folded(profile) -> str:
+    return profiling.folded(profile.stacks)
+
+
+class TestRequestProfiles:
+    @pytest.mark.parametrize("path,function", [
+        ("/sync/1", "_busy_sync_work"),
+        ("/async", "_busy_async_work"),
+        ("/thread", "_busy_sync_work"),
+    ])
+    def test_samples_land_on_the_request_that_ran_them(self, path, function):
+        response = TestClient(_app()).get(path, headers=PROFILE)
+        profile = profiling.get_profile(response.headers["x-weave-profile-id"])
+        assert profile.samples > 5
+        assert f"tests.test_profiling.{function}" in _folded(profile)
+        assert profile.status == 200 and profile.route in ("/sync/{n}", "/async", "/thread")
+
+    def test_query_flag_and_admin_gate(self, monkeypatch):
+        client = TestClient(_app())
+        assert "x-weave-profile-id" in client.get("/sync/1?weave_profile=1", headers=ADMIN).headers
+        assert "x-weave-profile-id" not in client.get("/sync/1", headers={"X-Weave-Profile": "1"}).headers
+        monkeypatch.setattr(config, "ADMIN_TOKEN", "")
+        assert "x-weave-profile-id" not in client.get("/sync/1", headers=PROFILE).headers
+
+    def test_admin_routes_serve_flamegraphs(self, client, campaign_dir):
+        assert client.get("/admin/profiles").status_code == 403
+        assert client.get("/admin/profiles", headers={"X-Weave-Admin-Token": "wrong"}).status_code == 403
+
+        profile_id = client.get("/campaigns/test_campaign/dm-context", headers=PROFILE).headers["x-weave-profile-id"]
+        [listed] = client.get("/admin/profiles", headers=ADMIN).json()["profiles"]
+        assert listed["id"] == profile_id and listed["route"] == "/campaigns/{campaign_id}/dm-context"
+
+        svg = client.get(f"/admin/profiles/{profile_id}", headers=ADMIN)
+        assert svg.headers["content-type"] == "image/svg+xml" and svg.text.startswith("<svg")
+        assert client.get(f"/admin/profiles/{profile_id}?format=folded", headers=ADMIN).status_code == 200
+        assert client.get("/admin/profiles/nope", headers=ADMIN).status_code == 404
+
+
+class TestContinuous:
+    def test_stacks_add_up_per_route(self):
+        client = TestClient(_app())
+        profiling.start_continuous(interval_ms=2)
+        for n in range(3):
+            client.get(f"/sync/{n}")
+        client.get("/async")
+
+        routes = profiling.continuous_summary()["routes"]
+        assert routes["/sync/{n}"]["samples"] > routes["/async"]["samples"] > 0
+        assert routes["/sync/{n}"]["top"][0][0] == "tests.test_profiling._busy_sync_work"
+        merged = profiling.folded(profiling.continuous_stacks())
+        assert "/sync/{n};" in merged and "/async;" in merged
+
+    def test_admin_start_and_stop(self, client):
+        assert client.post("/admin/profiling/continuous", json={"interval_ms": 5}, headers=ADMIN).json()["running"]
+        client.get("/campaigns")
+        assert client.get("/admin/profiling/flamegraph", headers=ADMIN).status_code == 200
+        client.delete("/admin/profiling/continuous", headers=ADMIN)
+        assert client.get("/admin/profiling/routes", headers=ADMIN).json() == {"running": False, "routes": {}}
+
+
+def test_flamegraph_svg_nests_frames():
+    svg = profiling.flamegraph_svg(profiling.Counter({"a;b": 3, "a;c": 1}), "t")
+    assert svg.count("<rect") == 3
+    assert "a (4 samples, 100.0%)" in svg and "b (3 samples, 75.0%)" in svg
@@ -0,0 +1,162 @@
+"""
+Tests for provider retries and circuit breakers
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import anthropic
+import httpx
+import pytest
+
+import ai_calls
+import resilience
+from resilience import CircuitBreaker, ProviderUnavailable, with_retries
+
+REQUEST = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+
+
+def _status_error(cls, status):
+    return cls("upstream said no", response=httpx.Response(status, request=REQUEST), body=None)
+
+
+def _failing(*errors, result="ok"):
+    """A call that raises each error in turn, then returns result"""
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    call.calls = calls
+    return call
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "_sleep", lambda seconds, token: None)
+
+
+class TestRetries:
+    def test_transient_errors_are_retried(self):
+        call = _failing(_status_error(anthropic.InternalServerError, 529), anthropic.APIConnectionError(request=REQUEST))
+        assert with_retries("anthropic", call) == "ok"
+        assert len(call.calls) == 3
+        assert resilience.snapshot()["anthropic"]["state"] == "closed"
+        assert resilience.snapshot()["anthropic"]["retries_total"] == 2
+
+    def test_concurrent_retries_are_all_counted(self):
+        calls = [_failing(anthropic.APIConnectionError(request=REQUEST)) for _ in range(200)]
+        with ThreadPoolExecutor(16) as pool:
+            assert set(pool.map(lambda call: with_retries("anthropic", call), calls)) == {"ok"}
+        assert resilience.snapshot()["anthropic"]["retries_total"] == 200
+
+    def test_request_errors_are_not_retried(self):
+        call = _failing(_status_error(anthropic.BadRequestError, 400))
+        with pytest.raises(anthropic.BadRequestError):
+            with_retries("anthropic", call)
+        assert len(call.calls) == 1
+        assert resilience.snapshot()["anthropic"]["consecutive_failures"] == 0
+
+    def test_gives_up_after_max_attempts(self):
+        error = _status_error(anthropic.InternalServerError, 500)
+        call = _failing(*[error] * resilience.MAX_ATTEMPTS)
+        with pytest.raises(anthropic.InternalServerError):
+            with_retries("anthropic", call)
+        assert len(call.calls) == resilience.MAX_ATTEMPTS
+
+    def test_streamed_reply_is_not_repeated(self, monkeypatch):
+        calls = []
+
+        class Stream:
+            response = SimpleNamespace(headers={})
+
+            def __enter__(self):
+                calls.append(1)
+                return self
+
+            def __exit__(self, *exc):
+                pass
+
+            @property
+            def text_stream(self):
+                yield "The heron "
+                raise anthropic.APIConnectionError(request=REQUEST)
+
+        monkeypatch.setattr(ai_calls.anthropic, "Anthropic", lambda **options: SimpleNamespace(
+            messages=SimpleNamespace(stream=lambda **kwargs: Stream())
+        ))
+        with pytest.raises(anthropic.APIConnectionError):
+            ai_calls.claude_message(model="m", max_tokens=10, messages=[])
+        assert len(calls) == 1
+
+
+class TestBreaker:
+    def test_opens_after_repeated_failures_and_recovers(self):
+        breaker = CircuitBreaker("replicate", failures=2, reset_seconds=60)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        assert not breaker.available
+        with pytest.raises(ProviderUnavailable):
+            breaker.before_call()
+
+        breaker.reset_seconds = 0
+        breaker.before_call()  # the half-open trial
+        with pytest.raises(ProviderUnavailable):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.snapshot()["state"] == "closed"
+
+    def test_rate_limits_do_not_open_it(self):
+        error = _status_error(anthropic.RateLimitError, 429)
+        for _ in range(resilience.BREAKER_FAILURES):
+            with pytest.raises(anthropic.RateLimitError):
+                with_retries("anthropic", _failing(*[error] * resilience.MAX_ATTEMPTS))
+        assert resilience.snapshot()["anthropic"]["state"] == "closed"
+
+
+class TestRoutes:
+    @pytest.fixture
+    def session(self, client, campaign_dir, monkeypatch):
+        import routes.dm_ai as dm_ai
+
+        renders = []
+        monkeypatch.setattr(dm_ai, "claude_message", lambda token=None, **kwargs: "A heron lands. [SCENE: a heron]")
+        monkeypatch.setattr(dm_ai, "render_image", lambda input, *args: renders.append(input) or "https://r.example/1.webp")
+        monkeypatch.setattr(dm_ai, "download_image", lambda url, *args: url)
+        client.post(
+            "/campaigns/test_campaign/session/start",
+            json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+        )
+        return renders
+
+    def _open(self, provider):
+        breaker = resilience.breakers[provider]
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+    def test_open_image_breaker_skips_the_illustration(self, client, session):
+        self._open("replicate")
+        data = client.post("/campaigns/test_campaign/dm/message", json={"message": "Hi", "includeState": False}).json()
+        assert data["response"] == "A heron lands."
+        assert data["degraded"] == ["illustration"]
+        assert session == []
+
+    def test_open_model_breaker_fails_fast(self, client, campaign_dir, monkeypatch):
+        import routes.dm_ai as dm_ai
+
+        self._open("anthropic")
+        monkeypatch.setattr(dm_ai, "claude_message", ai_calls.claude_message)
+        resp = client.post("/campaigns/test_campaign/dm/message", json={"message": "Hi", "includeState": False})
+        assert resp.status_code == 503
+        assert int(resp.headers["Retry-After"]) > 0
+
+    def test_status_reports_breakers(self, client):
+        self._open("replicate")
+        data = client.get("/status/providers").json()
+        assert data["providers"]["replicate"]["state"] == "open"
+        assert data["providers"]["anthropic"]["state"] == "closed"
+        assert "window" in data["llm_scheduler"]
@@ -0,0 +1,119 @@
+"""
+Tests for the Claude call scheduler
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import anthropic
+import pytest
+
+import ai_calls
+from cancellation import Cancelled, CancelToken
+from deadlines import Deadline
+from llm_scheduler import LLMScheduler, Priority
+
+
+def _hold(scheduler, priority, started, release, order=None, name=None):
+    """Take a slot in a thread and keep it until release is set"""
+    def run():
+        with scheduler.slot(priority, 1, 1):
+            if order is not None:
+                order.append(name)
+            started.set()
+            release.wait(5)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def _wait_for_waiters(scheduler, count):
+    deadline = time.monotonic() + 5
+    while sum(scheduler.snapshot()["waiting"].values()) < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+class TestAdmission:
+    def test_interactive_calls_jump_the_queue(self):
+        scheduler = LLMScheduler(max_concurrency=1)
+        busy, release = threading.Event(), threading.Event()
+        holder = _hold(scheduler, Priority.AUTHORING, busy, release)
+        busy.wait(5)
+
+        order = []
+        waiters = []
+        for priority in (Priority.BACKGROUND, Priority.AUTHORING, Priority.INTERACTIVE):
+            waiters.append(_hold(scheduler, priority, threading.Event(), release, order, priority.name))
+            _wait_for_waiters(scheduler, len(waiters))
+        release.set()
+        for thread in [holder] + waiters:
+            thread.join(5)
+        assert order == ["INTERACTIVE", "AUTHORING", "BACKGROUND"]
+
+    def test_last_slot_is_kept_for_interactive_calls(self):
+        scheduler = LLMScheduler(max_concurrency=2)
+        busy, release = threading.Event(), threading.Event()
+        holder = _hold(scheduler, Priority.BACKGROUND, busy, release)
+        busy.wait(5)
+
+        token = CancelToken()
+        threading.Timer(0.3, token.cancel).start()
+        with pytest.raises(Cancelled):
+            with scheduler.slot(Priority.AUTHORING, 1, 1, token):
+                pass
+        with scheduler.slot(Priority.INTERACTIVE, 1, 1):
+            assert scheduler.snapshot()["in_flight"] == 2
+        release.set()
+        holder.join(5)
+        assert scheduler.snapshot()["waiting"] == {"interactive": 0, "authoring": 0, "background": 0}
+
+
+class TestFeedback:
+    def test_rate_limits_halve_the_window_and_successes_grow_it_back(self):
+        scheduler = LLMScheduler(max_concurrency=4)
+        scheduler.on_rate_limited()
+        scheduler.on_rate_limited()
+        assert scheduler.snapshot()["window"] == 1
+        for _ in range(20):
+            with scheduler.slot(Priority.INTERACTIVE, 1, 1) as slot:
+                slot.observe(usage=SimpleNamespace(input_tokens=1, output_tokens=1))
+        assert scheduler.snapshot()["window"] == 4
+
+    def test_headers_size_the_token_buckets(self):
+        scheduler = LLMScheduler(max_concurrency=4)
+        scheduler.observe_headers({
+            "anthropic-ratelimit-input-tokens-limit": "60000",
+            "anthropic-ratelimit-input-tokens-remaining": "100",
+            "anthropic-ratelimit-output-tokens-limit": "6000",
+        })
+        assert scheduler.input_bucket.capacity == 60000
+        assert scheduler.snapshot()["input_tokens_available"] < 200
+
+        # Not enough input tokens left: the call waits until cancelled
+        token = CancelToken()
+        threading.Timer(0.3, token.cancel).start()
+        with pytest.raises(Cancelled):
+            with scheduler.slot(Priority.INTERACTIVE, 5000, 100, token):
+                pass
+
+    def test_claude_message_reports_429s(self, monkeypatch):
+        scheduler = LLMScheduler(max_concurrency=4)
+        monkeypatch.setattr(ai_calls, "scheduler", scheduler)
+        response = httpx.Response(429, headers={"retry-after": "2"}, request=httpx.Request("POST", "https://api.anthropic.com"))
+
+        class Messages:
+            def stream(self, **kwargs):
+                raise anthropic.RateLimitError("rate limited", response=response, body=None)
+
+        monkeypatch.setattr(ai_calls.anthropic, "Anthropic", lambda **options: SimpleNamespace(messages=Messages()))
+        # The 2s retry-after does not fit in the deadline, so there is no retry
+        with pytest.raises(anthropic.RateLimitError):
+            ai_calls.claude_message(deadline=Deadline(1), model="m", max_tokens=10, messages=[{"role": "user", "content": "hi"}])
+        snapshot = scheduler.snapshot()
+        assert snapshot["rate_limited_total"] == 1
+        assert snapshot["window"] == 2
+        assert snapshot["paused_seconds"] > 1
+        assert snapshot["in_flight"] == 0
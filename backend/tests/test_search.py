@@ -0,0 +1,157 @@
+"""
+Tests for the campaign content/notes search index and routes
+"""
+
+import pytest
+
+from campaign_schema import DMPrepData, DMPrepNote
+from content_index import CampaignSearchIndex
+
+
+def _note(note_id, content, category="general", related_to=None):
+    return DMPrepNote(id=note_id, content=content, category=category, related_to=related_to, created_at="2024-01-01T00:00:00Z")
+
+
+@pytest.fixture
+def index(sample_content):
+    idx = CampaignSearchIndex()
+    idx.set_content(sample_content)
+    idx.set_notes(DMPrepData(
+        author_notes=[
+            _note("n1", "Bramblewick speaks in clipped whispers", "voice", "Bramblewick"),
+            _note("n2", "Slow down before the shrine reveal", "pacing", "heart_of_the_rot"),
+        ],
+        pinned=[_note("p1", "Thornfeather is ashamed, not villainous", "secret", "Captain Thornfeather")],
+    ))
+    return idx
+
+
+class TestCampaignSearchIndex:
+    def test_prefix_match(self, index):
+        ids = [r["id"] for r in index.search("brambl")]
+        assert "npc:Bramblewick" in ids
+        assert "note:n1" in ids
+
+    def test_title_match_ranks_first(self, index):
+        assert index.search("bramblewick")[0]["id"] == "npc:Bramblewick"
+
+    def test_all_terms_must_match(self, index):
+        ids = [r["id"] for r in index.search("shrine reveal")]
+        assert ids == ["note:n2"]
+
+    def test_kind_filter(self, index):
+        results = index.search("blight", kind="beat")
+        assert results
+        assert all(r["kind"] == "beat" for r in results)
+
+    def test_category_filter(self, index):
+        results = index.search("", category="voice")
+        assert [r["id"] for r in results] == ["note:n1"]
+
+    def test_related_to_filter_case_insensitive(self, index):
+        ids = {r["id"] for r in index.search("", related_to="bramblewick")}
+        assert ids == {"npc:Bramblewick", "note:n1"}
+
+    def test_hints_indexed(self, index):
+        results = index.search("creature fleeing", kind="hint")
+        assert results[0]["related_to"] == "first_signs"
+
+    def test_notes_sync_is_incremental(self, index):
+        index.set_notes(DMPrepData(author_notes=[_note("n1", "Bramblewick hums to his beetles", "voice", "Bramblewick")]))
+        assert index.search("whispers") == []
+        assert [r["id"] for r in index.search("beetles")] == ["note:n1"]
+        assert index.search("", kind="pin") == []
+
+    def test_removed_terms_leave_no_postings(self, index):
+        index.set_notes(DMPrepData())
+        assert "whispers" not in index.postings
+        assert "whispers" not in index.terms
+
+
+class TestSearchRoutes:
+    def test_search_content(self, client, campaign_dir):
+        data = client.get("/campaigns/test_campaign/search", params={"q": "thorn"}).json()
+        assert data["total"] >= 1
+        assert data["results"][0]["related_to"] == "Captain Thornfeather"
+
+    def test_unknown_campaign_is_not_cached(self, client, campaign_dir):
+        import content_index
+        assert client.get("/campaigns/no_such_campaign/search", params={"q": "thorn"}).status_code == 404
+        assert client.get("/campaigns/no_such_campaign/dm-prep/notes").json()["total"] == 0
+        assert "no_such_campaign" not in content_index._indexes
+
+    def test_index_updates_on_note_create_and_delete(self, client, campaign_dir):
+        client.get("/campaigns/test_campaign/search", params={"q": "lantern"})  # build index
+        note = client.post(
+            "/campaigns/test_campaign/dm-prep/note",
+            json={"content": "Keep the lantern lit in the hollow", "category": "reminder"},
+        ).json()
+        data = client.get("/campaigns/test_campaign/dm-prep/notes", params={"q": "lant"}).json()
+        assert [n["id"] for n in data["notes"]] == [note["id"]]
+
+        client.delete(f"/campaigns/test_campaign/dm-prep/note/{note['id']}")
+        data = client.get("/campaigns/test_campaign/dm-prep/notes", params={"q": "lant"}).json()
+        assert data["total"] == 0
+
+    def test_index_updates_on_content_save(self, client, campaign_dir):
+        from campaign_schema import EXAMPLE_CAMPAIGN
+        import copy
+        client.get("/campaigns/test_campaign/search", params={"q": "x"})  # build index
+        content = copy.deepcopy(EXAMPLE_CAMPAIGN)
+        content["npcs"][0]["name"] = "Quillon"
+        client.put("/campaigns/test_campaign/content", json={"content": content})
+        assert client.get("/campaigns/test_campaign/search", params={"q": "quill"}).json()["total"] == 1
+
+    def test_legacy_campaign_migrates_while_indexing(self, campaign_dir):
+        """Loading migrates and saves a legacy campaign, which re-enters the index hooks"""
+        import json
+        import threading
+        from campaign_schema import EXAMPLE_CAMPAIGN
+        from content_index import get_campaign_index
+
+        legacy = {k: v for k, v in EXAMPLE_CAMPAIGN.items() if k != "beats"}
+        legacy["anchor_runs"] = [
+            {"id": b["id"], "goal": b["description"], "reveal": b["revelation"], "trigger": {"type": "start"}}
+            for b in EXAMPLE_CAMPAIGN["beats"]
+        ]
+        (campaign_dir / "campaign.json").write_text(json.dumps(legacy))
+
+        results = []
+        worker = threading.Thread(target=lambda: results.append(get_campaign_index("test_campaign")), daemon=True)
+        worker.start()
+        worker.join(timeout=5)
+        assert results, "get_campaign_index deadlocked"
+        assert results[0].search("bramblewick")
+        assert "beats" in json.loads((campaign_dir / "campaign.json").read_text())
+
+    def test_notes_pinned_filter(self, client, campaign_dir):
+        client.post("/campaigns/test_campaign/dm-prep/note", json={"content": "Rain sets the mood"})
+        client.post("/campaigns/test_campaign/dm-prep/pin", json={"content": "Rain means the heron is near"})
+        data = client.get("/campaigns/test_campaign/dm-prep/notes", params={"q": "rain", "pinned": True}).json()
+        assert data["total"] == 1
+        assert data["notes"][0]["pinned"] is True
+
+    def test_dm_prep_conversation_limit(self, client, campaign_dir):
+        import helpers
+        helpers.save_campaign_json("test_campaign", "dm_prep.json", {
+            "conversation": [{"role": "user", "content": str(i)} for i in range(6)],
+        })
+        data = client.get("/campaigns/test_campaign/dm-prep", params={"conversation_limit": 2}).json()
+        assert data["conversation_total"] == 6
+        assert [m["content"] for m in data["conversation"]] == ["4", "5"]
+
+        data = client.get("/campaigns/test_campaign/dm-prep", params={"include_conversation": False}).json()
+        assert data["conversation"] == []
+
+    def test_empty_query_lists_notes_oldest_first(self, client, campaign_dir):
+        for content in ("First note", "Second note", "Third note"):
+            client.post("/campaigns/test_campaign/dm-prep/note", json={"content": content})
+        notes = client.get("/campaigns/test_campaign/dm-prep/notes").json()["notes"]
+        assert [n["content"] for n in notes] == ["First note", "Second note", "Third note"]
+
+    def test_dm_prep_get_does_not_rewrite_each_time(self, client, campaign_dir):
+        import os
+        client.get("/campaigns/test_campaign/dm-prep")
+        mtime = os.path.getmtime(campaign_dir / "dm_prep.json")
+        client.get("/campaigns/test_campaign/dm-prep")
+        assert os.path.getmtime(campaign_dir / "dm_prep.json") == mtime
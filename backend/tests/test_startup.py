@@ -0,0 +1,55 @@
+"""
+Tests for startup cost: what `import main` loads, and the lazily loaded modules
+"""
+
+import sys
+
+import pytest
+
+import lazy_imports
+from benchmarks import startup
+from lazy_imports import LazyModule
+
+
+@pytest.fixture
+def fake_sdk(tmp_path, monkeypatch):
+    """A module nothing has imported yet, removed from sys.modules afterwards"""
+    (tmp_path / "weave_fake_sdk.py").write_text("VERSION = '1.0'\n\nclass Client:\n    pass\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(lazy_imports, "_registered", [])
+    yield "weave_fake_sdk"
+    sys.modules.pop("weave_fake_sdk", None)
+
+
+def test_import_main_stays_within_budget():
+    modules = startup.loaded_modules()
+    assert "main" in modules
+    assert not set(startup.LAZY_MODULES) & modules
+    assert len(modules) <= startup.MODULE_BUDGET
+
+
+def test_lazy_module_imports_on_first_attribute(fake_sdk, monkeypatch):
+    sdk = LazyModule(fake_sdk)
+    assert not sdk.loaded and fake_sdk not in sys.modules
+
+    assert sdk.VERSION == "1.0"
+    assert sdk.loaded and sdk.Client is sys.modules[fake_sdk].Client
+
+    # Patching through the stand-in patches the real module, as with a plain import
+    monkeypatch.setattr(sdk, "Client", "patched")
+    assert sys.modules[fake_sdk].Client == "patched"
+
+
+def test_prewarm_imports_registered_modules(fake_sdk):
+    LazyModule(fake_sdk)
+    LazyModule("weave_no_such_sdk")
+    lazy_imports.start_prewarm().join(timeout=10)
+    assert fake_sdk in sys.modules
+
+
+def test_importtime_parse():
+    imports = startup.measure_imports("lazy_imports")
+    names = [name for name, _, _, _ in imports]
+    assert names[-1] == "lazy_imports"
+    name, self_seconds, cumulative, depth = imports[-1]
+    assert depth == 0 and cumulative >= self_seconds >= 0
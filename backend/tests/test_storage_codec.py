@@ -0,0 +1,76 @@
+"""
+Tests for the storage codecs behind helpers.load/save_campaign_json
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import config
+import storage_codec
+from storage_codec import codec_for, decode, encode, sniff
+from helpers import load_campaign_json, save_campaign_json
+
+DOC = {"name": "Rotwood", "npcs": {"pip": {"met": True}}, "facts": ["a", "ü"], "stage": 2, "note": None}
+
+
+def _available_codecs():
+    codecs = ["pretty", "json"]
+    if storage_codec.msgpack is not None:
+        codecs.append("msgpack")
+    if storage_codec.zstandard is not None:
+        codecs.append("zstd")
+    return codecs
+
+
+class TestCodecs:
+    @pytest.mark.parametrize("codec", _available_codecs())
+    def test_round_trip_and_sniff(self, codec):
+        raw = encode(DOC, codec)
+        assert decode(raw) == DOC
+        assert sniff(raw) == ("json" if codec == "pretty" else codec)
+
+    def test_compact_is_smaller_than_pretty(self):
+        assert len(encode(DOC, "json")) < len(encode(DOC, "pretty"))
+
+    def test_stdlib_pretty_files_still_load(self):
+        assert decode(json.dumps(DOC, indent=2).encode()) == DOC
+
+    def test_unknown_codec(self):
+        with pytest.raises(ValueError):
+            encode(DOC, "xml")
+
+    def test_missing_package_is_reported(self, monkeypatch):
+        monkeypatch.setattr(storage_codec, "msgpack", None)
+        with pytest.raises(RuntimeError, match="msgpack"):
+            encode(DOC, "msgpack")
+        with pytest.raises(RuntimeError, match="msgpack"):
+            decode(b"\x81\xa4name")
+
+    def test_overrides_match_file_names(self, monkeypatch):
+        monkeypatch.setattr(config, "STORAGE_CODEC", "json")
+        monkeypatch.setattr(config, "STORAGE_CODEC_OVERRIDES", "current_session.json=zstd, archive/*=msgpack")
+        assert codec_for("current_session.json") == "zstd"
+        assert codec_for("archive/episode_001.json") == "msgpack"
+        assert codec_for("campaign.json") == "json"
+
+
+class TestHelpers:
+    def test_switching_codec_keeps_old_files_readable(self, campaign_dir, monkeypatch):
+        before = load_campaign_json("test_campaign", "roster.json")
+        monkeypatch.setattr(config, "STORAGE_CODEC", "json")
+        assert load_campaign_json("test_campaign", "roster.json") == before
+
+        save_campaign_json("test_campaign", "roster.json", before)
+        raw = (campaign_dir / "roster.json").read_bytes()
+        assert b"\n" not in raw
+        assert load_campaign_json("test_campaign", "roster.json") == before
+
+    def test_concurrent_writes_of_one_document(self, campaign_dir):
+        docs = [{**DOC, "stage": n} for n in range(16)]
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda doc: save_campaign_json("test_campaign", "state.json", doc), docs))
+        assert load_campaign_json("test_campaign", "state.json") in docs
+        assert not [name for name in os.listdir(campaign_dir) if name.endswith(".tmp")]
@@ -0,0 +1,118 @@
+"""
+Tests for recording and replaying DM turn traces
+"""
+
+import glob
+from types import SimpleNamespace
+
+import pytest
+
+import ai_calls
+import config
+import turn_traces
+from turn_traces import anonymize_trace, compare, load_trace, replay_trace
+
+
+class _Stream:
+    response = SimpleNamespace(headers={})
+
+    def __init__(self, text):
+        self.text_stream = iter([text])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def get_final_message(self):
+        return SimpleNamespace(usage=SimpleNamespace(input_tokens=900, output_tokens=20))
+
+
+@pytest.fixture
+def recorded_turn(client, campaign_dir, tmp_path, monkeypatch):
+    """Play one illustrated DM turn with faked providers while recording; returns the trace"""
+    import routes.dm_ai as dm_ai
+
+    replies = iter(["A heron lands. [SCENE: a heron on a mossy stump]", "a grey heron at dusk"])
+    monkeypatch.setattr(ai_calls.anthropic, "Anthropic", lambda **options: SimpleNamespace(
+        messages=SimpleNamespace(stream=lambda **kwargs: _Stream(next(replies)))
+    ))
+    prediction = SimpleNamespace(status="succeeded", output=["https://replicate.example/1.webp"])
+    monkeypatch.setattr(ai_calls, "replicate", SimpleNamespace(
+        models=SimpleNamespace(predictions=SimpleNamespace(create=lambda **kwargs: prediction))
+    ))
+    monkeypatch.setattr(dm_ai, "download_image", lambda url, *args: url)
+    client.post(
+        "/campaigns/test_campaign/session/start",
+        json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+    )
+
+    monkeypatch.setattr(config, "RECORD_TRACES_DIR", str(tmp_path / "traces"))
+    resp = client.post("/campaigns/test_campaign/dm/message", json={"message": "I look around", "includeState": False})
+    assert resp.status_code == 200
+    monkeypatch.setattr(config, "RECORD_TRACES_DIR", "")
+    [path] = glob.glob(str(tmp_path / "traces" / "test_campaign" / "*-dm_message-*.json.gz"))
+    return load_trace(path)
+
+
+class TestRecording:
+    def test_trace_holds_documents_calls_and_response(self, recorded_turn):
+        assert recorded_turn["request"]["message"] == "I look around"
+        assert {"system.json", "current_session.json", "campaign.json"} <= set(recorded_turn["documents"])
+        # Before the turn: the player's message is not in the log yet
+        assert recorded_turn["documents"]["current_session.json"]["log"] == []
+        assert [c["provider"] for c in recorded_turn["calls"]] == ["anthropic", "anthropic", "replicate"]
+        dm_call = recorded_turn["calls"][0]
+        assert dm_call["feature"] == "dm_turn"
+        assert dm_call["request"]["messages"][-1]["content"] == "I look around"
+        assert dm_call["usage"]["input_tokens"] == 900
+        assert recorded_turn["response"]["response"] == "A heron lands."
+        assert recorded_turn["status"] == 200
+
+    def test_nothing_is_recorded_when_off(self, client, campaign_dir, monkeypatch):
+        import routes.dm_ai as dm_ai
+
+        def write_trace(*args):
+            raise AssertionError("recorded while off")
+
+        monkeypatch.setattr(turn_traces, "write_trace", write_trace)
+        monkeypatch.setattr(dm_ai, "claude_message", lambda token=None, **kwargs: "Hello.")
+        client.post(
+            "/campaigns/test_campaign/session/start",
+            json={"quest": "Test", "location": "Here", "partyIds": ["char_001"]},
+        )
+        assert client.post("/campaigns/test_campaign/dm/message", json={"message": "Hi"}).status_code == 200
+
+
+class TestReplay:
+    def test_replay_reproduces_the_turn(self, recorded_turn):
+        replayed = replay_trace(recorded_turn, latency=False)
+        assert replayed["status"] == 200
+        assert replayed["response"]["response"] == "A heron lands."
+        result = compare(recorded_turn, replayed)
+        assert not result["prompts_changed"]
+        assert result["replayed"]["prompt_tokens"] == result["recorded"]["prompt_tokens"]
+        assert result["replayed"]["claude_calls"] == 2
+
+    def test_replay_reports_a_smaller_prompt(self, recorded_turn, monkeypatch):
+        import routes.dm_ai as dm_ai
+
+        monkeypatch.setattr(dm_ai, "build_rules_reference", lambda system_config: "")
+        result = compare(recorded_turn, replay_trace(recorded_turn, latency=False))
+        assert result["prompts_changed"]
+        assert result["replayed"]["prompt_tokens"] < result["recorded"]["prompt_tokens"]
+
+    def test_anonymized_trace_keeps_its_shape(self, recorded_turn):
+        anonymized = anonymize_trace(recorded_turn, salt="s")
+        message = anonymized["request"]["message"]
+        assert message != "I look around" and len(message) == len("I look around")
+        dm_reply = anonymized["calls"][0]["response"]
+        assert "[SCENE:" in dm_reply
+        roster = anonymized["documents"]["roster.json"]["characters"][0]
+        assert roster["id"] == "char_001"
+        assert roster["name"] != "Pip" and len(roster["name"]) == 3
+
+        replayed = replay_trace(anonymized, latency=False)
+        assert replayed["status"] == 200
+        assert turn_traces.summarize(replayed)["claude_calls"] == 2
@@ -0,0 +1,92 @@
+"""
+Tests for the per-campaign usage ledger and its rollups
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import ai_calls
+import usage_ledger
+from helpers import load_campaign_json
+from usage_ledger import read_ledger, rebuild_rollups, record, record_claude, record_render, usage_summary
+
+SONNET = "claude-sonnet-4-20250514"
+
+
+def _usage(input_tokens, output_tokens, cache_read=0):
+    return SimpleNamespace(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cache_read_input_tokens=cache_read,
+        cache_creation_input_tokens=None,
+    )
+
+
+class TestLedger:
+    def test_calls_roll_up_by_feature(self, campaign_dir):
+        record_claude("test_campaign", "dm_turn", SONNET, _usage(1_000_000, 0), 2.0)
+        record_claude("test_campaign", "dm_turn", SONNET, _usage(0, 100_000, cache_read=1_000_000), 1.0)
+        record_render("test_campaign", "illustration", ai_calls.FLUX_MODEL, 1.5)
+
+        lines = read_ledger("test_campaign")
+        assert len(lines) == 3
+        assert lines[0]["in"] == 1_000_000 and lines[0]["ms"] == 2000
+
+        summary = usage_summary("test_campaign")
+        dm = summary["by_feature"]["dm_turn"]
+        assert dm["calls"] == 2
+        assert dm["input_tokens"] == 1_000_000
+        assert dm["cache_read_tokens"] == 1_000_000
+        # $3 input + $1.50 output + $0.30 cache reads
+        assert dm["estimated_cost_usd"] == pytest.approx(4.80)
+        assert summary["by_feature"]["illustration"]["images"] == 1
+        assert summary["totals"]["calls"] == 3
+        assert summary["totals"]["estimated_cost_usd"] == pytest.approx(4.803)
+
+    def test_since_filters_days(self, campaign_dir):
+        record("test_campaign", {"at": "2026-01-01T10:00:00Z", "feature": "recap", "model": SONNET, "in": 10, "out": 5, "ms": 1})
+        record("test_campaign", {"at": "2026-02-01T10:00:00Z", "feature": "recap", "model": SONNET, "in": 20, "out": 5, "ms": 1})
+        assert list(usage_summary("test_campaign")["by_day"]) == ["2026-01-01", "2026-02-01"]
+        assert usage_summary("test_campaign", since="2026-01-15")["totals"]["input_tokens"] == 20
+
+    def test_rollups_rebuild_from_the_ledger(self, campaign_dir):
+        record_claude("test_campaign", "dm_prep", SONNET, _usage(300, 40), 0.5)
+        record_render("test_campaign", "image", ai_calls.FLUX_MODEL, 1.0)
+        incremental = load_campaign_json("test_campaign", usage_ledger.ROLLUPS_FILE)
+        assert rebuild_rollups("test_campaign") == incremental
+
+    def test_calls_without_a_campaign_are_not_recorded(self, data_dir):
+        record_claude(None, "generate_fields", SONNET, _usage(1, 1), 0.1)
+        record_claude("no_such_campaign", "generate_fields", SONNET, _usage(1, 1), 0.1)
+        assert read_ledger("no_such_campaign") == []
+
+
+class TestRecording:
+    def test_claude_message_records_for_its_campaign(self, campaign_dir, monkeypatch):
+        class Stream:
+            response = SimpleNamespace(headers={})
+            text_stream = iter(["Hi"])
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                pass
+
+            def get_final_message(self):
+                return SimpleNamespace(usage=_usage(42, 3))
+
+        monkeypatch.setattr(ai_calls.anthropic, "Anthropic", lambda **options: SimpleNamespace(
+            messages=SimpleNamespace(stream=lambda **kwargs: Stream())
+        ))
+        ai_calls.claude_message(campaign_id="test_campaign", feature="dm_turn", model=SONNET, max_tokens=10, messages=[])
+        [entry] = read_ledger("test_campaign")
+        assert (entry["feature"], entry["model"], entry["in"], entry["out"]) == ("dm_turn", SONNET, 42, 3)
+
+    def test_usage_endpoint(self, client, campaign_dir):
+        record_claude("test_campaign", "dm_turn", SONNET, _usage(100, 10), 1.0)
+        data = client.get("/campaigns/test_campaign/usage").json()
+        assert data["totals"]["input_tokens"] == 100
+        assert set(data) == {"totals", "by_feature", "by_day"}
+        assert client.get("/campaigns/test_campaign/usage?since=yesterday").status_code == 422
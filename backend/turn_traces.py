@@ -0,0 +1,403 @@
+"""
+Record-and-replay of AI-backed requests, for measuring prompt and latency changes
+
+Recording (opt-in with WEAVE_RECORD_TRACES_DIR): each DM turn, prep coach
+message and campaign field generation writes one gzip-compressed JSON trace to
+<dir>/<campaign_id>/, holding
+
+    request     the route's request body
+    documents   every campaign document the request could read, as it was before the call
+    calls       each completed Claude call (request, reply, usage), Flux render and image
+                download, with its duration
+    response    what the route returned (or its status if it failed), and the total seconds
+
+Replay runs traces against the current code in a temporary DATA_DIR, with a
+stub provider serving the recorded replies (after their recorded latency,
+unless --no-latency), and reports how prompt size, build time (everything but
+provider calls) and end-to-end latency changed. Caches start cold in a replay,
+so compare build times between two replays rather than with the recording.
+
+Usage, from backend/:
+    python turn_traces.py replay TRACE_OR_DIR... [--no-latency] [--json PATH]
+    python turn_traces.py anonymize IN OUT [--salt SALT]
+
+Anonymizing scrambles every word of free text into a same-length stand-in,
+consistently across the trace, so prompts keep their size. Identifiers,
+lowercase single-word values (ids, enums, model names), URLs, timestamps and
+ALL-CAPS tags such as [SCENE: ...] are kept, so documents still validate and
+replies still parse.
+"""
+
+import argparse
+import contextlib
+import contextvars
+import functools
+import glob
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import re
+import secrets
+import sys
+import tempfile
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+import config
+import helpers
+from storage_codec import read_document
+
+TRACE_VERSION = 1
+
+# kind -> (recorded worker(campaign_id, request, token=None), request model)
+REPLAYERS: dict = {}
+# Modules whose workers register themselves with @recorded
+_REPLAY_MODULES = ("routes.dm_ai", "routes.dm_prep", "routes.generate")
+
+# Campaign subdirectories that are not documents a request reads
+_SKIPPED_DIRS = {"images", "usage"}
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+_current: contextvars.ContextVar = contextvars.ContextVar("weave_turn_trace", default=None)
+
+
+# === Recording ===
+
+class TraceRecorder:
+    def __init__(self, kind: str, campaign_id: str, request: dict, documents: dict):
+        self.trace = {
+            "version": TRACE_VERSION,
+            "kind": kind,
+            "campaign_id": campaign_id,
+            "recorded_at": datetime.utcnow().isoformat() + "Z",
+            "request": request,
+            "documents": documents,
+            "calls": [],
+        }
+
+    def call(self, provider: str, seconds: float, **details):
+        self.trace["calls"].append({"provider": provider, "seconds": round(seconds, 4), **details})
+
+
+def capture(provider: str, seconds: float, **details):
+    """Add a completed upstream call to the trace being recorded, if any (see ai_calls.py)"""
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.call(provider, seconds, **details)
+
+
+def snapshot_documents(campaign_id: str) -> dict:
+    """Every stored document of a campaign, by path relative to its directory"""
+    from campaign_actors import ROSTER_FILE, SESSION_FILE, actors_enabled, read_doc
+
+    root = helpers.get_campaign_dir(campaign_id)
+    documents = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(dirpath, root)
+        dirnames[:] = [d for d in dirnames if os.path.normpath(os.path.join(relative_dir, d)) not in _SKIPPED_DIRS]
+        for name in sorted(filenames):
+            if not name.endswith(".json"):
+                continue
+            filename = os.path.normpath(os.path.join(relative_dir, name)).replace(os.sep, "/")
+            try:
+                documents[filename] = read_document(os.path.join(dirpath, name))
+            except (OSError, ValueError, RuntimeError):
+                continue
+    if actors_enabled():
+        # The files may be behind what the actors hold in memory
+        for filename in (SESSION_FILE, ROSTER_FILE):
+            documents[filename] = read_doc(campaign_id, filename)
+    return documents
+
+
+def write_trace(trace: dict, directory: str) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(directory, trace["campaign_id"], f"{stamp}-{trace['kind']}-{uuid.uuid4().hex[:8]}.json.gz")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(trace, f, separators=(",", ":"), default=str)
+    return path
+
+
+def load_trace(path: str) -> dict:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _run_recorded(recorder: TraceRecorder, fn: Callable):
+    """Run fn with recorder capturing its calls; fills in the response, status and seconds"""
+    context_token = _current.set(recorder)
+    started = time.perf_counter()
+    try:
+        result = fn()
+        recorder.trace.update(status=200, response=result)
+        return result
+    except Exception as e:
+        recorder.trace["status"] = getattr(e, "status_code", 500)
+        raise
+    finally:
+        recorder.trace["seconds"] = round(time.perf_counter() - started, 4)
+        _current.reset(context_token)
+
+
+def recorded(kind: str, request_model):
+    """
+    Record calls of the decorated worker(campaign_id, request, token=None) as
+    traces of kind while WEAVE_RECORD_TRACES_DIR is set, and make it replayable
+    """
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def worker(campaign_id: str, request, token=None):
+            directory = config.RECORD_TRACES_DIR
+            if not directory or _current.get() is not None:
+                return fn(campaign_id, request, token)
+            recorder = TraceRecorder(kind, campaign_id, request.model_dump(), snapshot_documents(campaign_id))
+            try:
+                return _run_recorded(recorder, lambda: fn(campaign_id, request, token))
+            finally:
+                try:
+                    write_trace(recorder.trace, directory)
+                except OSError as e:
+                    print(f"Could not write {kind} trace: {e}")
+
+        if kind in REPLAYERS:
+            raise ValueError(f"Duplicate trace kind {kind}")
+        REPLAYERS[kind] = (worker, request_model)
+        return worker
+    return decorate
+
+
+# === Replay ===
+
+class _StubProvider:
+    """Serves a trace's recorded replies, in order per provider, in place of Anthropic, Replicate and image hosts"""
+
+    def __init__(self, calls: list, latency: bool = True):
+        self.latency = latency
+        self.queues = {
+            provider: deque(call for call in calls if call["provider"] == provider)
+            for provider in ("anthropic", "replicate", "download")
+        }
+
+    def _next(self, provider: str) -> dict:
+        queue = self.queues[provider]
+        # Calls the current code makes beyond the recording get an empty reply
+        call = queue.popleft() if queue else {"seconds": 0}
+        if self.latency:
+            time.sleep(call.get("seconds", 0))
+        return call
+
+    def anthropic(self, **options):
+        return SimpleNamespace(messages=SimpleNamespace(stream=self._stream))
+
+    @contextlib.contextmanager
+    def _stream(self, **kwargs):
+        call = self._next("anthropic")
+        recorded_usage = call.get("usage") or {}
+        usage = SimpleNamespace(**{field: recorded_usage.get(field, 0) for field in USAGE_FIELDS})
+        yield SimpleNamespace(
+            response=SimpleNamespace(headers={}),
+            text_stream=iter([call.get("response", "")]),
+            get_final_message=lambda: SimpleNamespace(usage=usage),
+        )
+
+    def _predict(self, model: str, input: dict):
+        call = self._next("replicate")
+        output = [call["output"]] if call.get("output") else []
+        return SimpleNamespace(status="succeeded", output=output, error=None, reload=lambda: None, cancel=lambda: None)
+
+    @contextlib.contextmanager
+    def _download(self, method: str, url: str, **kwargs):
+        call = self._next("download")
+        yield SimpleNamespace(raise_for_status=lambda: None, iter_bytes=lambda: iter([b"\0" * call.get("bytes", 0)]))
+
+    def replicate(self):
+        return SimpleNamespace(models=SimpleNamespace(predictions=SimpleNamespace(create=self._predict)))
+
+
+@contextlib.contextmanager
+def _patched(target, name: str, value):
+    original = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield
+    finally:
+        setattr(target, name, original)
+
+
+@contextlib.contextmanager
+def _replay_environment(data_dir: str, stub: _StubProvider):
+    """Point storage at data_dir and the provider SDKs at stub"""
+    import ai_calls
+
+    images_dir = os.path.join(data_dir, "images")
+    os.makedirs(images_dir, exist_ok=True)
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(_patched(config, "DATA_DIR", data_dir))
+        stack.enter_context(_patched(helpers, "DATA_DIR", data_dir))
+        stack.enter_context(_patched(config, "IMAGES_DIR", images_dir))
+        stack.enter_context(_patched(config, "RECORD_TRACES_DIR", ""))
+        stack.enter_context(_patched(config, "REPLICATE_BASE_URL", ""))
+        stack.enter_context(_patched(ai_calls.anthropic, "Anthropic", stub.anthropic))
+        stack.enter_context(_patched(ai_calls, "replicate", stub.replicate()))
+        stack.enter_context(_patched(ai_calls.httpx, "stream", stub._download))
+        yield
+
+
+def replay_trace(trace: dict, latency: bool = True) -> dict:
+    """Run a recorded request against the current code; returns the trace it would record now"""
+    for module in _REPLAY_MODULES:
+        importlib.import_module(module)
+    if trace["kind"] not in REPLAYERS:
+        raise ValueError(f"Unknown trace kind {trace['kind']}")
+    worker, request_model = REPLAYERS[trace["kind"]]
+    campaign_id = trace["campaign_id"]
+    request = request_model(**trace["request"])
+
+    with tempfile.TemporaryDirectory() as data_dir, _replay_environment(data_dir, _StubProvider(trace["calls"], latency)):
+        for filename, document in trace["documents"].items():
+            helpers.save_campaign_json(campaign_id, filename, document)
+        if any(filename.startswith("archive/episode_") for filename in trace["documents"]):
+            from play_memory import reindex_history
+            reindex_history(campaign_id)
+
+        recorder = TraceRecorder(trace["kind"], campaign_id, trace["request"], {})
+        try:
+            _run_recorded(recorder, lambda: worker(campaign_id, request))
+        except Exception:
+            pass  # the status is in the trace
+    return recorder.trace
+
+
+def summarize(trace: dict) -> dict:
+    """Prompt size and time split of a (recorded or replayed) trace"""
+    from llm_scheduler import estimate_input_tokens
+
+    claude = [call for call in trace["calls"] if call["provider"] == "anthropic"]
+    provider_seconds = sum(call["seconds"] for call in trace["calls"])
+    return {
+        "status": trace.get("status"),
+        "claude_calls": len(claude),
+        "prompt_tokens": sum(
+            estimate_input_tokens(call["request"].get("system"), call["request"].get("messages", []))
+            for call in claude
+        ),
+        "build_ms": round(max(trace.get("seconds", 0) - provider_seconds, 0) * 1000, 1),
+        "end_to_end_ms": round(trace.get("seconds", 0) * 1000, 1),
+    }
+
+
+def compare(trace: dict, replayed: dict) -> dict:
+    before = [call["request"] for call in trace["calls"] if call["provider"] == "anthropic"]
+    after = [call["request"] for call in replayed["calls"] if call["provider"] == "anthropic"]
+    return {
+        "kind": trace["kind"],
+        "campaign_id": trace["campaign_id"],
+        "recorded": summarize(trace),
+        "replayed": summarize(replayed),
+        "prompts_changed": before != after,
+    }
+
+
+# === Anonymizing ===
+
+_WORD = re.compile(r"[A-Za-z]+")
+# Values kept as they are: identifiers and enums, URLs and paths, timestamps
+_KEPT = re.compile(r"^(?:[a-z0-9_.:/-]*|https?://\S+|\d{4}-\d\d-\d\d\S*)$")
+
+
+def _scramble_word(word: str, salt: str) -> str:
+    if len(word) > 1 and word.isupper():
+        return word
+    digest = hashlib.shake_256((salt + word.lower()).encode()).digest(len(word))
+    letters = [chr(ord("a") + byte % 26) for byte in digest]
+    return "".join(letter.upper() if char.isupper() else letter for char, letter in zip(word, letters))
+
+
+def _anonymize(value, salt: str):
+    if isinstance(value, dict):
+        return {key: _anonymize(item, salt) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_anonymize(item, salt) for item in value]
+    if isinstance(value, str) and not _KEPT.match(value):
+        return _WORD.sub(lambda m: _scramble_word(m.group(), salt), value)
+    return value
+
+
+def anonymize_trace(trace: dict, salt: Optional[str] = None) -> dict:
+    """A copy of trace with its free text scrambled (see the module docstring)"""
+    salt = salt if salt is not None else secrets.token_hex(8)
+    anonymized = {
+        key: value if key in ("version", "kind", "campaign_id", "recorded_at") else _anonymize(value, salt)
+        for key, value in trace.items()
+    }
+    anonymized["anonymized"] = True
+    return anonymized
+
+
+# === CLI ===
+
+def _trace_paths(paths: list) -> list:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(glob.glob(os.path.join(path, "**", "*.json.gz"), recursive=True)))
+        else:
+            found.append(path)
+    return found
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return f"{before:g} -> {after:g}"
+    return f"{before:g} -> {after:g} ({(after - before) / before:+.1%})"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay or anonymize recorded request traces")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay = sub.add_parser("replay", help="Run traces against the current code and report the differences")
+    replay.add_argument("traces", nargs="+", help="Trace files or directories of them")
+    replay.add_argument("--no-latency", action="store_true", help="Serve recorded replies without their recorded latency")
+    replay.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+    anonymize = sub.add_parser("anonymize", help="Write a copy of a trace with its free text scrambled")
+    anonymize.add_argument("source")
+    anonymize.add_argument("destination")
+    anonymize.add_argument("--salt", help="Reuse a salt to scramble several traces the same way")
+    args = parser.parse_args(argv)
+
+    if args.command == "anonymize":
+        trace = anonymize_trace(load_trace(args.source), args.salt)
+        with gzip.open(args.destination, "wt", encoding="utf-8") as f:
+            json.dump(trace, f, separators=(",", ":"))
+        return 0
+
+    report = []
+    for path in _trace_paths(args.traces):
+        trace = load_trace(path)
+        result = {"trace": path, **compare(trace, replay_trace(trace, latency=not args.no_latency))}
+        report.append(result)
+        before, after = result["recorded"], result["replayed"]
+        print(f"{os.path.basename(path)} ({result['kind']}, status {before['status']} -> {after['status']})")
+        print(f"  prompt tokens  {_change(before['prompt_tokens'], after['prompt_tokens'])}"
+              f"{'' if result['prompts_changed'] else ' (prompts identical)'}")
+        print(f"  build ms       {_change(before['build_ms'], after['build_ms'])}")
+        print(f"  end-to-end ms  {_change(before['end_to_end_ms'], after['end_to_end_ms'])}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    # Workers register with the importable module, not __main__
+    import turn_traces
+    sys.exit(turn_traces.main())
@@ -0,0 +1,162 @@
+"""
+Per-campaign usage ledger: Claude tokens and Flux renders, with daily rollups
+
+Every Claude call and Flux render made for a campaign appends one compact
+line to usage/ledger.jsonl:
+
+    {"at": "2026-10-19T20:14:03Z", "feature": "dm_turn", "model": "claude-sonnet-4-20250514",
+     "in": 5120, "out": 310, "cache_read": 0, "cache_write": 0, "ms": 6230}
+
+and adds it to usage/rollups.json, which keeps totals by day and feature so
+GET /campaigns/{id}/usage never rereads the ledger. The rollups can be
+rebuilt from the ledger (rebuild_rollups). Costs are estimates from the list
+prices below, not billing data.
+
+Features: dm_turn, image_prompt, illustration (renders for DM turns), image
+(renders from the image endpoint), dm_prep, generate_fields, recap.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+from helpers import get_campaign_dir, load_campaign_json, save_campaign_json
+from memory_report import register_cache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+LEDGER_FILE = os.path.join("usage", "ledger.jsonl")
+ROLLUPS_FILE = os.path.join("usage", "rollups.json")
+
+# USD per million tokens: (input, output, cache read, cache write), by model name prefix
+CLAUDE_PRICES = {
+    "claude-sonnet-4": (3.00, 15.00, 0.30, 3.75),
+    "claude-3-5-haiku": (0.80, 4.00, 0.08, 1.00),
+}
+# USD per image
+IMAGE_PRICES = {
+    "black-forest-labs/flux-schnell": 0.003,
+}
+
+_locks: dict = {}
+_locks_guard = threading.Lock()
+
+_COUNTERS = ("calls", "input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens", "images", "latency_ms")
+
+
+def _campaign_lock(campaign_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(campaign_id, threading.Lock())
+
+
+def _empty_totals() -> dict:
+    totals = {name: 0 for name in _COUNTERS}
+    totals["estimated_cost_usd"] = 0.0
+    return totals
+
+
+def estimate_cost(entry: dict) -> float:
+    model = entry.get("model", "")
+    if entry.get("images"):
+        return entry["images"] * IMAGE_PRICES.get(model, 0.0)
+    for prefix, prices in CLAUDE_PRICES.items():
+        if model.startswith(prefix):
+            tokens = (entry.get("in", 0), entry.get("out", 0), entry.get("cache_read", 0), entry.get("cache_write", 0))
+            return sum(count * price for count, price in zip(tokens, prices)) / 1_000_000
+    return 0.0
+
+
+def _add(totals: dict, entry: dict):
+    totals["calls"] += 1
+    totals["input_tokens"] += entry.get("in", 0)
+    totals["output_tokens"] += entry.get("out", 0)
+    totals["cache_read_tokens"] += entry.get("cache_read", 0)
+    totals["cache_write_tokens"] += entry.get("cache_write", 0)
+    totals["images"] += entry.get("images", 0)
+    totals["latency_ms"] += entry.get("ms", 0)
+    totals["estimated_cost_usd"] = round(totals["estimated_cost_usd"] + estimate_cost(entry), 6)
+
+
+def _apply(rollups: dict, entry: dict):
+    day = rollups.setdefault("days", {}).setdefault(entry["at"][:10], {})
+    _add(day.setdefault(entry["feature"], _empty_totals()), entry)
+
+
+def record(campaign_id: Optional[str], entry: dict):
+    """Append a usage entry (feature, model, token counts or images, ms) for a campaign, if there is one"""
+    if not campaign_id or not os.path.isdir(get_campaign_dir(campaign_id)):
+        return
+    entry = {"at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z", **entry}
+    path = os.path.join(get_campaign_dir(campaign_id), LEDGER_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # The ledger's file lock also serializes the rollup update across worker processes
+    with _campaign_lock(campaign_id), open(path, "ab") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        f.write((json.dumps(entry, separators=(",", ":")) + "\n").encode())
+        f.flush()
+        rollups = load_campaign_json(campaign_id, ROLLUPS_FILE)
+        _apply(rollups, entry)
+        save_campaign_json(campaign_id, ROLLUPS_FILE, rollups)
+
+
+def record_claude(campaign_id: Optional[str], feature: str, model: str, usage, seconds: float):
+    record(campaign_id, {
+        "feature": feature,
+        "model": model,
+        "in": getattr(usage, "input_tokens", 0) or 0,
+        "out": getattr(usage, "output_tokens", 0) or 0,
+        "cache_read": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_write": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        "ms": round(seconds * 1000),
+    })
+
+
+def record_render(campaign_id: Optional[str], feature: str, model: str, seconds: float):
+    record(campaign_id, {"feature": feature, "model": model, "images": 1, "ms": round(seconds * 1000)})
+
+
+def read_ledger(campaign_id: str) -> list:
+    path = os.path.join(get_campaign_dir(campaign_id), LEDGER_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def rebuild_rollups(campaign_id: str) -> dict:
+    """Recompute usage/rollups.json from the ledger"""
+    rollups = {}
+    with _campaign_lock(campaign_id):
+        for entry in read_ledger(campaign_id):
+            _apply(rollups, entry)
+        save_campaign_json(campaign_id, ROLLUPS_FILE, rollups)
+    return rollups
+
+
+def usage_summary(campaign_id: str, since: Optional[str] = None) -> dict:
+    """Totals overall, by feature and by day (optionally from the `since` date, YYYY-MM-DD, on)"""
+    days = load_campaign_json(campaign_id, ROLLUPS_FILE).get("days", {})
+    if since:
+        days = {day: features for day, features in days.items() if day >= since}
+
+    totals = _empty_totals()
+    by_feature = {}
+    by_day = {}
+    for day, features in sorted(days.items()):
+        day_totals = by_day[day] = _empty_totals()
+        for feature, counts in features.items():
+            for target in (totals, by_feature.setdefault(feature, _empty_totals()), day_totals):
+                for name in _COUNTERS:
+                    target[name] += counts.get(name, 0)
+                target["estimated_cost_usd"] = round(target["estimated_cost_usd"] + counts.get("estimated_cost_usd", 0), 6)
+    return {"totals": totals, "by_feature": by_feature, "by_day": by_day}
+
+
+register_cache("usage_ledger_locks", lambda: dict(_locks))
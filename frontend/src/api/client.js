@@ -1,10 +1,19 @@
 export const API_BASE = '/api'
 
+// idempotent: send an Idempotency-Key and retry once if the connection drops.
+// The server replays (or waits for) the original request instead of running it twice.
 export async function apiFetch(path, options = {}) {
-  const res = await fetch(`${API_BASE}${path}`, {
-    headers: { 'Content-Type': 'application/json', ...options.headers },
-    ...options,
-  })
+  const { idempotent, ...rest } = options
+  const headers = { 'Content-Type': 'application/json', ...rest.headers }
+  if (idempotent) headers['Idempotency-Key'] = crypto.randomUUID()
+  const request = () => fetch(`${API_BASE}${path}`, { ...rest, headers })
+  let res
+  try {
+    res = await request()
+  } catch (err) {
+    if (!idempotent) throw err
+    res = await request()
+  }
   return res.json()
 }
 
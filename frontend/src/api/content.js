@@ -36,11 +36,19 @@ export const hitBeat = (campaignId, data) =>
 export const generateFields = (campaignId, payload) =>
   apiFetch(`/campaigns/${campaignId}/generate-fields`, {
     method: 'POST',
+    idempotent: true,
     body: JSON.stringify(payload),
   })
 
 export const generateFieldsStandalone = (payload) =>
   apiFetch('/generate-fields', {
     method: 'POST',
+    idempotent: true,
     body: JSON.stringify(payload),
   })
+
+export const simulatePacing = (campaignId, options = {}) =>
+  apiFetch(`/campaigns/${campaignId}/pacing/simulate`, {
+    method: 'POST',
+    body: JSON.stringify(options),
+  })
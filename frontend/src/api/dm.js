@@ -3,5 +3,6 @@ import { apiFetch } from './client'
 export const sendDMMessage = (campaignId, data) =>
   apiFetch(`/campaigns/${campaignId}/dm/message`, {
     method: 'POST',
+    idempotent: true,
     body: JSON.stringify(data),
   })
@@ -6,6 +6,7 @@ export const fetchDMPrep = (campaignId) =>
 export const sendPrepMessage = (campaignId, message) =>
   apiFetch(`/campaigns/${campaignId}/dm-prep/message`, {
     method: 'POST',
+    idempotent: true,
     body: JSON.stringify({ message }),
   })
 
@@ -41,3 +42,6 @@ export const clearConversation = (campaignId) =>
   apiFetch(`/campaigns/${campaignId}/dm-prep/conversation`, {
     method: 'DELETE',
   })
+
+export const searchPrepNotes = (campaignId, params = {}) =>
+  apiFetch(`/campaigns/${campaignId}/dm-prep/notes?${new URLSearchParams(params)}`)
@@ -3,5 +3,6 @@ import { apiFetch } from './client'
 export const generateImage = (campaignId, data) =>
   apiFetch(`/campaigns/${campaignId}/image/generate`, {
     method: 'POST',
+    idempotent: true,
     body: JSON.stringify(data),
   })
@@ -89,7 +89,8 @@ function ChatWindow({ session, onSessionUpdate, onRefreshSession }) {
         .filter(entry => entry.type === 'chat')
         .map(entry => ({
           role: entry.role,
-          content: entry.content
+          content: entry.content,
+          interrupted: entry.interrupted
         }))
       setMessages(chatMessages)
     }
@@ -120,7 +121,7 @@ function ChatWindow({ session, onSessionUpdate, onRefreshSession }) {
       })
 
       if (data.response) {
-        setMessages(prev => [...prev, { role: 'dm', content: data.response }])
+        setMessages(prev => [...prev, { role: 'dm', content: data.response, degraded: data.degraded }])
       }
 
       // If there's an image, refresh session to update ImagePanel
@@ -173,6 +174,9 @@ function ChatWindow({ session, onSessionUpdate, onRefreshSession }) {
         {messages.map((msg, i) => (
           <div key={i} className={`chat-message ${msg.role}`}>
             {msg.role === 'dm' ? renderMarkdown(msg.content) : msg.content}
+            {msg.interrupted && <em style={{ color: '#999' }}> (cut off when the page was closed)</em>}
+            {msg.degraded?.includes('response') && <em style={{ color: '#999' }}> (cut short to keep the turn on time)</em>}
+            {msg.degraded?.includes('illustration') && <em style={{ color: '#999' }}> (no illustration this turn: out of time)</em>}
             {msg.role === 'dm' && (
               <button
                 className={`speak-btn ${speakingIndex === i ? 'speaking' : ''}`}
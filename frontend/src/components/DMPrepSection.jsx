@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import PrepCoachChat from './PrepCoachChat'
-import { fetchDMPrep, createPrepNote, updatePrepNote, deletePrepNote, pinInsight, deletePin } from '../api/dmPrep'
+import { fetchDMPrep, createPrepNote, updatePrepNote, deletePrepNote, pinInsight, deletePin, searchPrepNotes } from '../api/dmPrep'
 
 const NOTE_CATEGORIES = [
   { value: 'general', label: 'General' },
@@ -22,11 +22,39 @@ function DMPrepSection({ campaignId, npcs = [], locations = [], beats = [] }) {
   const [noteCategory, setNoteCategory] = useState('general')
   const [noteRelatedTo, setNoteRelatedTo] = useState('')
 
+  // Note search: ids of matching notes, best first (null when not searching)
+  const [noteQuery, setNoteQuery] = useState('')
+  const [matchingNoteIds, setMatchingNoteIds] = useState(null)
+
   // Fetch prep data on mount
   useEffect(() => {
     fetchPrepData()
   }, [campaignId])
 
+  useEffect(() => {
+    if (!noteQuery.trim()) {
+      setMatchingNoteIds(null)
+      return
+    }
+    let cancelled = false
+    const timer = setTimeout(async () => {
+      try {
+        const data = await searchPrepNotes(campaignId, { q: noteQuery.trim(), pinned: false })
+        if (!cancelled) setMatchingNoteIds(data.notes.map(n => n.id))
+      } catch (err) {
+        console.error('Failed to search notes:', err)
+      }
+    }, 250)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [campaignId, noteQuery, prepData?.author_notes])
+
+  const visibleNotes = matchingNoteIds === null
+    ? prepData?.author_notes || []
+    : matchingNoteIds.map(id => prepData?.author_notes?.find(n => n.id === id)).filter(Boolean)
+
   const fetchPrepData = async () => {
     try {
       const data = await fetchDMPrep(campaignId)
@@ -256,9 +284,20 @@ function DMPrepSection({ campaignId, npcs = [], locations = [], beats = [] }) {
             </div>
           )}
 
-          {prepData?.author_notes?.length > 0 ? (
+          {prepData?.author_notes?.length > 0 && (
+            <input
+              type="search"
+              className="notes-search"
+              value={noteQuery}
+              onChange={e => setNoteQuery(e.target.value)}
+              placeholder="Search notes..."
+              style={{ width: '100%', marginBottom: '1rem' }}
+            />
+          )}
+
+          {visibleNotes.length > 0 ? (
             <div className="notes-list">
-              {prepData.author_notes.map(note => (
+              {visibleNotes.map(note => (
                 <div key={note.id} className="note-card">
                   <div className="note-header">
                     <span className={`note-category cat-${note.category}`}>
@@ -278,7 +317,9 @@ function DMPrepSection({ campaignId, npcs = [], locations = [], beats = [] }) {
             </div>
           ) : (
             <p className="text-muted text-center" style={{ padding: '2rem' }}>
-              No notes yet. Add notes to help DMs run your campaign.
+              {matchingNoteIds !== null
+                ? 'No notes match your search.'
+                : 'No notes yet. Add notes to help DMs run your campaign.'}
             </p>
           )}
         </div>